@@ -1,15 +1,47 @@
 
+import asyncio
 import random
+import numpy as np
+from concurrent.futures import Executor
 from datetime import datetime
-from typing import Dict, List, Any, Optional
+from typing import Callable, Dict, List, Any, Mapping, Optional, Tuple
 from abc import ABC, abstractmethod
 from ..models.entities import StoreDNA, Partner, EcommerceStage
 from ..services.dna_service import DNAService
 from ..services.scoring_service import ScoringService
+from ..services.repository import EcosystemRepository
+from ..services.partner_catalog import PartnerCatalog
+from ..services.store_table import StoreTable
+from ..services.market_aggregates import HIGH_REVENUE_THRESHOLD, LOW_CONVERSION_THRESHOLD
+from ..agents.execution import AgentExecutor, AgentTask, Intermediate
+
+# Seções do resultado das análises completas, na ordem de saída
+ANALYSIS_SECTIONS = ["master_agent_results", "specialist_results", "partner_results", "market_intelligence"]
+
+# Níveis de adequação parceiro×loja e o score mínimo de medium e high
+FIT_LEVELS = ("low", "medium", "high")
+FIT_THRESHOLDS = np.array([0.4, 0.7])
+
+# Componentes de score usados nas avaliações dos agentes de parceiros
+EVALUATION_COMPONENTS = ("compatibility_score", "segment_match", "size_match")
+
+def compile_store_table(scoring_service: ScoringService, stores: List[StoreDNA]) -> StoreTable:
+    """Tabela colunar com as features das lojas"""
+    store_table = StoreTable(capacity=max(1, len(stores)))
+    for store_dna in stores:
+        store_table.upsert(scoring_service.compile_store_features(store_dna))
+    return store_table
+
+def store_rows(store_table: StoreTable, stores: List[StoreDNA]) -> np.ndarray:
+    """Linhas da tabela de cada loja da lista (para alinhar vetores de scores à lista)"""
+    return np.array([store_table.row_of(store_dna.store_id) for store_dna in stores], dtype=np.int64)
 
 class BaseAgent(ABC):
     """Classe base para todos os agentes"""
 
+    cpu_bound = False  # Agentes CPU-bound podem rodar no pool de processos do AgentExecutor
+    inputs: Tuple[str, ...] = ()  # Intermediários do pipeline lidos do contexto (opcionais)
+
     def __init__(self, agent_id: str, name: str):
         self.agent_id = agent_id
         self.name = name
@@ -21,6 +53,27 @@ class BaseAgent(ABC):
         """Executa uma ação baseada no contexto"""
         pass
 
+    async def execute_action_async(
+        self,
+        context: Dict[str, Any],
+        executor: Optional[Executor] = None
+    ) -> Dict[str, Any]:
+        """Variante assíncrona de execute_action
+
+        Por padrão executa execute_action em `executor` (ou no executor padrão do
+        loop), mantendo o event loop livre; agentes baratos podem sobrescrevê-la.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, self.execute_action, context)
+
+    def process_context(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        """Parte (serializável) do contexto enviada quando o agente roda em outro processo"""
+        return context
+
+    def intermediates(self) -> List[Intermediate]:
+        """Intermediários que o agente sabe calcular (saídas compartilháveis no pipeline)"""
+        return []
+
     def log_action(self, action: str, details: Dict[str, Any]):
         """Registra ação executada"""
         self.last_action = {
@@ -32,11 +85,10 @@ class BaseAgent(ABC):
 class MasterStoreAgent(BaseAgent):
     """Agente Mestre da Loja - orquestra ações para uma loja específica"""
 
-    def __init__(self, store_id: str):
+    def __init__(self, store_id: str, dna_service: Optional[DNAService] = None):
         super().__init__(f"master_{store_id}", f"Master Agent - Store {store_id}")
         self.store_id = store_id
-        self.dna_service = DNAService()
-        self.scoring_service = ScoringService()
+        self.dna_service = dna_service or DNAService()
 
     def execute_action(self, context: Dict[str, Any]) -> Dict[str, Any]:
         """Orquestra análise completa da loja"""
@@ -45,11 +97,16 @@ class MasterStoreAgent(BaseAgent):
         if not store_dna:
             return {"error": f"Store DNA not found for {self.store_id}"}
 
-        # Analisa maturidade atual
-        maturity = self.dna_service.analyze_store_maturity(self.store_id)
+        analysis = context.get("analysis")
+        if analysis is not None and analysis.store_id == self.store_id:
+            # Reaproveita a análise já calculada na requisição
+            maturity, gaps = analysis.maturity, analysis.gaps
+        else:
+            # Analisa maturidade atual
+            maturity = self.dna_service.analyze_store_maturity(self.store_id)
 
-        # Identifica gaps
-        gaps = self.dna_service.identify_gaps(self.store_id)
+            # Identifica gaps
+            gaps = self.dna_service.gaps_from_maturity(maturity)
 
         # Gera insights
         insights = self._generate_insights(store_dna, maturity, gaps)
@@ -163,34 +220,83 @@ class SpecialistAgent(BaseAgent):
 class PartnerAgent(BaseAgent):
     """Agente de Parceiro - representa conhecimento sobre soluções de um parceiro"""
 
-    def __init__(self, partner: Partner):
+    cpu_bound = True  # Pontua todas as lojas do contexto
+    inputs = ("partner_scores",)
+
+    def __init__(self, partner: Partner, scoring_service: Optional[ScoringService] = None):
         super().__init__(f"partner_{partner.partner_id}", f"Partner Agent - {partner.name}")
         self.partner = partner
+        self.scoring_service = scoring_service or ScoringService()
+
+    def process_context(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        process_context = {"stores": context.get("stores", [])}
+        partner_scores = context.get("partner_scores")
+        if partner_scores is not None and self.partner.partner_id in partner_scores:
+            # Envia só a coluna deste parceiro
+            process_context["partner_scores"] = {
+                self.partner.partner_id: partner_scores[self.partner.partner_id]
+            }
+        return process_context
 
     def execute_action(self, context: Dict[str, Any]) -> Dict[str, Any]:
         """Avalia adequação do parceiro para lojas específicas"""
         stores = context.get("stores", [])
-        scoring_service = ScoringService()
 
+        # Vetor de scores das lojas já calculado no pipeline, ou uma passada vetorizada aqui
+        scores = (context.get("partner_scores") or {}).get(self.partner.partner_id)
+        if scores is None:
+            store_table = compile_store_table(self.scoring_service, stores)
+            rows = store_rows(store_table, stores)
+            scores = {name: values[rows] for name, values in self.score_stores(store_table).items()}
+
+        return self.evaluate(
+            [store_dna.store_id for store_dna in stores],
+            {store_dna.store_id: store_dna for store_dna in stores},
+            scores
+        )
+
+    def score_stores(self, store_table: StoreTable) -> Dict[str, np.ndarray]:
+        """Scores do parceiro contra todas as lojas da tabela, numa única chamada vetorizada"""
+        scores = self.scoring_service.score_catalog_row_against_stores(
+            PartnerCatalog([self.partner]), 0, store_table
+        )
+        return {name: scores[name] for name in EVALUATION_COMPONENTS}
+
+    def evaluate(
+        self,
+        store_ids: List[str],
+        stores: Mapping[str, StoreDNA],
+        scores: Dict[str, np.ndarray],
+        offset: int = 0,
+        limit: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Monta a avaliação a partir dos vetores de scores (alinhados a `store_ids`)
+
+        O resumo por nível de adequação vem de operações sobre os vetores; só as
+        lojas da página [offset, offset + limit) viram dicts de avaliação.
+        """
+        compatibility = scores["compatibility_score"]
+        levels = np.digitize(compatibility, FIT_THRESHOLDS)
+        histogram = np.bincount(levels, minlength=len(FIT_LEVELS))
+
+        start = max(offset, 0)
+        stop = len(store_ids) if limit is None else min(len(store_ids), start + max(limit, 0))
         evaluations = []
 
-        for store_dna in stores:
-            compatibility = scoring_service.calculate_compatibility_score(
-                store_dna, self.partner
-            )
-
+        for i in range(start, stop):
+            store_dna = stores[store_ids[i]]
             evaluation = {
                 "store_id": store_dna.store_id,
                 "store_name": store_dna.name,
-                "compatibility_score": compatibility.total_score,
-                "fit_level": self._determine_fit_level(compatibility.total_score),
+                "compatibility_score": float(compatibility[i]),
+                "fit_level": FIT_LEVELS[levels[i]],
                 "key_matches": []
             }
 
             # Adiciona detalhes dos matches
-            if compatibility.segment_match > 0.8:
+            if scores["segment_match"][i] > 0.8:
                 evaluation["key_matches"].append("Segmento ideal")
-            if compatibility.size_match > 0.8:
+            if scores["size_match"][i] > 0.8:
                 evaluation["key_matches"].append("Tamanho adequado")
 
             evaluations.append(evaluation)
@@ -201,48 +307,95 @@ class PartnerAgent(BaseAgent):
             "partner_name": self.partner.name,
             "evaluations": evaluations,
             "summary": {
-                "total_stores_analyzed": len(stores),
-                "high_fit_stores": len([e for e in evaluations if e["fit_level"] == "high"]),
-                "medium_fit_stores": len([e for e in evaluations if e["fit_level"] == "medium"])
-            }
+                "total_stores_analyzed": len(store_ids),
+                "high_fit_stores": int(histogram[2]),
+                "medium_fit_stores": int(histogram[1]),
+                "low_fit_stores": int(histogram[0])
+            },
+            "pagination": {"offset": start, "limit": limit, "total": len(store_ids)}
         }
 
         self.log_action("partner_evaluation", result)
         return result
 
-    def _determine_fit_level(self, score: float) -> str:
-        """Determina nível de adequação"""
-        if score >= 0.7:
-            return "high"
-        elif score >= 0.4:
-            return "medium"
-        else:
-            return "low"
-
 class MarketIntelligenceAgent(BaseAgent):
     """Agente de Inteligência de Mercado - analisa o ecossistema como um todo"""
 
-    def __init__(self):
+    inputs = ("segment_distribution", "size_distribution", "partner_coverage")
+
+    def __init__(self, repository: Optional[EcosystemRepository] = None):
         super().__init__("market_intelligence", "Market Intelligence Agent")
+        self.repository = repository
+
+    def intermediates(self) -> List[Intermediate]:
+        return [
+            Intermediate("segment_distribution", self.segment_distribution),
+            Intermediate("size_distribution", self.size_distribution),
+            Intermediate("partner_coverage", self.partner_coverage)
+        ]
+
+    def segment_distribution(self, context: Dict[str, Any]) -> Dict[str, int]:
+        """Lojas por segmento (agregados do repositório ou lojas do contexto)"""
+        if self.repository is not None:
+            with self.repository.lock:
+                return self.repository.market_aggregates.segment_distribution()
+        return self._analyze_segment_distribution(context.get("stores", []))
+
+    def size_distribution(self, context: Dict[str, Any]) -> Dict[str, int]:
+        """Lojas por tamanho (agregados do repositório ou lojas do contexto)"""
+        if self.repository is not None:
+            with self.repository.lock:
+                return self.repository.market_aggregates.size_distribution()
+        return self._analyze_size_distribution(context.get("stores", []))
+
+    def partner_coverage(self, context: Dict[str, Any]) -> Dict[str, int]:
+        """Parceiros por categoria (agregados do repositório ou parceiros do contexto)"""
+        if self.repository is not None:
+            with self.repository.lock:
+                return self.repository.market_aggregates.partner_coverage()
+        return self._analyze_partner_coverage(context.get("partners", []))
 
     def execute_action(self, context: Dict[str, Any]) -> Dict[str, Any]:
         """Analisa tendências e oportunidades de mercado"""
-        stores = context.get("stores", [])
-        partners = context.get("partners", [])
+        # Distribuições já calculadas no pipeline, ou calculadas aqui
+        segment_distribution = context.get("segment_distribution")
+        if segment_distribution is None:
+            segment_distribution = self.segment_distribution(context)
+        size_distribution = context.get("size_distribution")
+        if size_distribution is None:
+            size_distribution = self.size_distribution(context)
+        partner_coverage = context.get("partner_coverage")
+        if partner_coverage is None:
+            partner_coverage = self.partner_coverage(context)
+
+        # Cada loja tem um segmento e cada parceiro uma categoria
+        total_stores = sum(segment_distribution.values())
+        total_partners = sum(partner_coverage.values())
+
+        if self.repository is not None:
+            # Contadores de oportunidade mantidos a cada escrita
+            with self.repository.lock:
+                aggregates = self.repository.market_aggregates
+                high_revenue_count = aggregates.high_revenue_stores
+                low_conversion_count = aggregates.low_conversion_stores
+        else:
+            stores = context.get("stores", [])
+            high_revenue_count = len([s for s in stores if s.monthly_revenue > HIGH_REVENUE_THRESHOLD])
+            low_conversion_count = len([s for s in stores if s.conversion_rate < LOW_CONVERSION_THRESHOLD])
 
         # Análise de mercado
         market_analysis = {
             "agent_id": self.agent_id,
             "market_overview": {
-                "total_stores": len(stores),
-                "total_partners": len(partners),
+                "total_stores": total_stores,
+                "total_partners": total_partners,
                 "analysis_date": datetime.now()
             },
-            "segment_distribution": self._analyze_segment_distribution(stores),
-            "size_distribution": self._analyze_size_distribution(stores),
-            "partner_coverage": self._analyze_partner_coverage(partners),
-            "market_gaps": self._identify_market_gaps(stores, partners),
-            "growth_opportunities": self._identify_growth_opportunities(stores)
+            "segment_distribution": segment_distribution,
+            "size_distribution": size_distribution,
+            "partner_coverage": partner_coverage,
+            "market_gaps": self._identify_market_gaps(partner_coverage, total_partners),
+            "growth_opportunities": self._identify_growth_opportunities(high_revenue_count, low_conversion_count)
         }
 
         self.log_action("market_analysis", market_analysis)
@@ -272,13 +425,11 @@ class MarketIntelligenceAgent(BaseAgent):
             coverage[category] = coverage.get(category, 0) + 1
         return coverage
 
-    def _identify_market_gaps(self, stores: List[StoreDNA], partners: List[Partner]) -> List[str]:
+    def _identify_market_gaps(self, coverage: Dict[str, int], total_partners: int) -> List[str]:
         """Identifica lacunas no mercado"""
         gaps = []
 
         # Verifica se há categorias com poucos parceiros
-        coverage = self._analyze_partner_coverage(partners)
-        total_partners = len(partners)
 
         for stage in EcommerceStage:
             stage_partners = coverage.get(stage.value, 0)
@@ -287,43 +438,65 @@ class MarketIntelligenceAgent(BaseAgent):
 
         return gaps
 
-    def _identify_growth_opportunities(self, stores: List[StoreDNA]) -> List[Dict[str, Any]]:
-        """Identifica oportunidades de crescimento"""
+    def _identify_growth_opportunities(
+        self,
+        high_revenue_count: int,
+        low_conversion_count: int
+    ) -> List[Dict[str, Any]]:
+        """Identifica oportunidades de crescimento a partir das lojas de alto potencial"""
         opportunities = []
 
-        # Analisa stores com alto potencial
-        high_revenue_stores = [s for s in stores if s.monthly_revenue > 50000]
-        low_conversion_stores = [s for s in stores if s.conversion_rate < 0.02]
-
-        if high_revenue_stores:
+        if high_revenue_count:
             opportunities.append({
                 "type": "premium_services",
-                "description": f"{len(high_revenue_stores)} lojas com alto faturamento para serviços premium",
-                "potential_stores": len(high_revenue_stores)
+                "description": f"{high_revenue_count} lojas com alto faturamento para serviços premium",
+                "potential_stores": high_revenue_count
             })
 
-        if low_conversion_stores:
+        if low_conversion_count:
             opportunities.append({
                 "type": "conversion_optimization", 
-                "description": f"{len(low_conversion_stores)} lojas com baixa conversão para CRO",
-                "potential_stores": len(low_conversion_stores)
+                "description": f"{low_conversion_count} lojas com baixa conversão para CRO",
+                "potential_stores": low_conversion_count
             })
 
         return opportunities
 
 class AgentOrchestrator:
-    """Orquestrador dos agentes - coordena ações dos diferentes agentes"""
-
-    def __init__(self):
+    """Orquestrador dos agentes - coordena ações dos diferentes agentes
+
+    As análises rodam como um pipeline: os agentes declaram em `inputs` os
+    intermediários que consomem (scores das lojas por parceiro, distribuições
+    do mercado), que são calculados uma vez por execução e compartilhados.
+
+    Consistência de leitura: as tarefas, o contexto dos especialistas e o
+    conjunto de parceiros pontuados são fixados sob o lock do repositório antes
+    do envio aos pools, de modo que escritas concorrentes não mudam quem
+    participa de uma execução já iniciada. Cada agregado de mercado é lido sob
+    o mesmo lock; valores lidos em momentos distintos da execução (ex.: o DNA
+    lido pelo agente mestre) podem já refletir escritas posteriores ao início.
+    Nas variantes assíncronas o lock (um RLock bloqueante) só é tomado em
+    threads do executor, nunca no event loop.
+    """
+
+    def __init__(
+        self,
+        dna_service: Optional[DNAService] = None,
+        executor: Optional[AgentExecutor] = None,
+        scoring_service: Optional[ScoringService] = None
+    ):
+        self.dna_service = dna_service or DNAService()
+        self.executor = executor or AgentExecutor()  # Paralelismo e timeouts das análises
+        self.scoring_service = scoring_service or ScoringService()  # Pesos usados pelos agentes
         self.agents = {}
         self.master_agents = {}  # Por store_id
         self.specialist_agents = {}  # Por especialidade
         self.partner_agents = {}  # Por partner_id
-        self.market_agent = MarketIntelligenceAgent()
+        self.market_agent = MarketIntelligenceAgent(self.dna_service.repository)
 
     def register_master_agent(self, store_id: str) -> MasterStoreAgent:
         """Registra agente mestre para uma loja"""
-        agent = MasterStoreAgent(store_id)
+        agent = MasterStoreAgent(store_id, self.dna_service)
         self.master_agents[store_id] = agent
         self.agents[agent.agent_id] = agent
         return agent
@@ -337,35 +510,183 @@ class AgentOrchestrator:
 
     def register_partner_agent(self, partner: Partner) -> PartnerAgent:
         """Registra agente de parceiro"""
-        agent = PartnerAgent(partner)
+        agent = PartnerAgent(partner, self.scoring_service)
         self.partner_agents[partner.partner_id] = agent
         self.agents[agent.agent_id] = agent
         return agent
 
+    def unregister_partner_agent(self, partner_id: str) -> Optional[PartnerAgent]:
+        """Remove agente de parceiro"""
+        agent = self.partner_agents.pop(partner_id, None)
+        if agent:
+            self.agents.pop(agent.agent_id, None)
+        return agent
+
     def execute_full_analysis(self, context: Dict[str, Any]) -> Dict[str, Any]:
-        """Executa análise completa usando todos os agentes"""
-        results = {
-            "orchestration_id": f"orch_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
-            "executed_at": datetime.now(),
-            "master_agent_results": {},
-            "specialist_results": {},
-            "partner_results": {},
-            "market_intelligence": {}
-        }
+        """Executa análise completa usando todos os agentes (em paralelo, via executor)"""
+        return self._run(self._full_analysis_tasks, context)
+
+    async def execute_full_analysis_async(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        """Variante assíncrona de execute_full_analysis (cancelável)"""
+        return await self._run_async(self._full_analysis_tasks, context)
+
+    def execute_store_analysis(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        """Executa a análise completa restrita à loja context["store_id"]
+
+        Roda apenas o agente mestre da loja, os especialistas das áreas de foco
+        (gaps do contexto de análise, se houver) com os parceiros da sua categoria
+        e os agentes de parceiros avaliando só essa loja. O custo não depende do
+        número de lojas do ecossistema.
+        """
+        context = self._store_scope(context)
+        results = self._run(self._store_analysis_tasks, context)
+        results["scope"] = context["store_id"]
+        return results
+
+    async def execute_store_analysis_async(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        """Variante assíncrona de execute_store_analysis (cancelável)"""
+        # A leitura da loja pode esperar pelo lock do repositório: fora do event loop
+        loop = asyncio.get_running_loop()
+        context = await loop.run_in_executor(None, self._store_scope, context)
+        results = await self._run_async(self._store_analysis_tasks, context)
+        results["scope"] = context["store_id"]
+        return results
+
+    def _store_scope(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        """Contexto com apenas a loja analisada em `stores`"""
+        store_dna = self.dna_service.get_store_dna(context["store_id"])
+        return dict(context, stores=[store_dna] if store_dna else [])
 
-        # Executa agentes mestres
+    def _full_analysis_tasks(self, context: Dict[str, Any]) -> List[AgentTask]:
+        tasks: List[AgentTask] = []
+
+        # Agentes mestres
         for store_id, agent in self.master_agents.items():
-            results["master_agent_results"][store_id] = agent.execute_action(context)
+            tasks.append(("master_agent_results", store_id, agent, context))
 
-        # Executa agentes especialistas
+        # Agentes especialistas
         for specialty, agent in self.specialist_agents.items():
-            results["specialist_results"][specialty] = agent.execute_action(context)
+            tasks.append(("specialist_results", specialty, agent, context))
 
-        # Executa agentes de parceiros
+        # Agentes de parceiros
+        for partner_id, agent in self.partner_agents.items():
+            tasks.append(("partner_results", partner_id, agent, context))
+
+        # Inteligência de mercado
+        tasks.append(("market_intelligence", None, self.market_agent, context))
+        return tasks
+
+    def _store_analysis_tasks(self, context: Dict[str, Any]) -> List[AgentTask]:
+        store_id = context["store_id"]
+        repository = self.dna_service.repository
+        tasks: List[AgentTask] = []
+
+        # 1. Agente mestre da loja
+        master_agent = self.master_agents.get(store_id)
+        if master_agent:
+            tasks.append(("master_agent_results", store_id, master_agent, context))
+
+        # 2. Especialistas das áreas de foco, com os parceiros da categoria via índice
+        analysis = context.get("analysis")
+        stages = analysis.focus_areas() if analysis is not None else list(EcommerceStage)
+        for stage in stages:
+            agent = self.specialist_agents.get(stage.value)
+            if agent:
+                specialist_context = dict(context, partners=repository.partners_by("category", stage))
+                tasks.append(("specialist_results", stage.value, agent, specialist_context))
+
+        # 3. Parceiros avaliando apenas a loja (context["stores"], via _store_scope)
         for partner_id, agent in self.partner_agents.items():
-            results["partner_results"][partner_id] = agent.execute_action(context)
+            tasks.append(("partner_results", partner_id, agent, context))
+
+        # 4. Inteligência de mercado (agregados do repositório)
+        tasks.append(("market_intelligence", None, self.market_agent, context))
+        return tasks
 
-        # Executa inteligência de mercado
-        results["market_intelligence"] = self.market_agent.execute_action(context)
+    def _run(self, tasks: Callable[[Dict[str, Any]], List[AgentTask]], context: Dict[str, Any]) -> Dict[str, Any]:
+        task_list, run_context = self._snapshot(tasks, context)
+        results = self._new_results()
+        results.update(self.executor.run(task_list, ANALYSIS_SECTIONS, self.intermediates(), run_context))
+        return results
 
+    async def _run_async(
+        self,
+        tasks: Callable[[Dict[str, Any]], List[AgentTask]],
+        context: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        # O snapshot segura o lock do repositório (bloqueante): roda no executor, nunca no loop
+        loop = asyncio.get_running_loop()
+        task_list, run_context = await loop.run_in_executor(None, self._snapshot, tasks, context)
+        results = self._new_results()
+        results.update(await self.executor.run_async(task_list, ANALYSIS_SECTIONS, self.intermediates(), run_context))
         return results
+
+    def _snapshot(
+        self,
+        tasks: Callable[[Dict[str, Any]], List[AgentTask]],
+        context: Dict[str, Any]
+    ) -> Tuple[List[AgentTask], Dict[str, Any]]:
+        """Monta as tarefas e o contexto da execução sob o lock do repositório
+
+        O contexto da execução leva em `scored_partners` os parceiros das
+        tarefas de parceiros, lidos por _partner_scores.
+        """
+        with self.dna_service.repository.lock:
+            task_list = tasks(context)
+        scored_partners = [agent.partner for section, _, agent, _ in task_list if section == "partner_results"]
+        return task_list, dict(context, scored_partners=scored_partners)
+
+    def intermediates(self) -> Dict[str, Intermediate]:
+        """Intermediários disponíveis ao pipeline: os do orquestrador e os dos agentes"""
+        nodes = [Intermediate("partner_scores", self._partner_scores)] + self.market_agent.intermediates()
+        return {node.name: node for node in nodes}
+
+    def _store_features(self, context: Dict[str, Any]) -> StoreTable:
+        """Features colunares das lojas do contexto"""
+        return compile_store_table(self.scoring_service, context.get("stores", []))
+
+    def _partner_scores(self, context: Dict[str, Any]) -> Dict[str, Dict[str, np.ndarray]]:
+        """Vetor de scores das lojas do contexto para cada parceiro com agente
+
+        Os parceiros são os fixados em context["scored_partners"] (ver _snapshot),
+        ou os agentes registrados no momento da chamada. No escopo da loja os
+        vetores saem dos scores do contexto de análise (context["analysis"]), que
+        já pontuou a loja contra o catálogo; só parceiros ausentes deles (ex.:
+        adicionados depois) e as lojas do escopo do ecossistema são pontuados aqui,
+        numa única passada vetorizada loja×parceiro. Os vetores seguem a ordem de
+        context["stores"] (mesmos valores do caminho escalar).
+        """
+        partners = context.get("scored_partners")
+        if partners is None:
+            partners = [agent.partner for agent in list(self.partner_agents.values())]
+        stores = context.get("stores", [])
+
+        vectors: Dict[str, Dict[str, np.ndarray]] = {}
+        analysis = context.get("analysis")
+        if analysis is not None and [store_dna.store_id for store_dna in stores] == [analysis.store_id]:
+            rows = {partner_id: row for row, partner_id in enumerate(analysis.partner_ids)}
+            for partner in partners:
+                row = rows.get(partner.partner_id)
+                if row is not None:
+                    vectors[partner.partner_id] = {
+                        name: analysis.scores[name][row:row + 1] for name in EVALUATION_COMPONENTS
+                    }
+
+        missing = [partner for partner in partners if partner.partner_id not in vectors]
+        if missing:
+            store_table = self._store_features(context)
+            catalog = PartnerCatalog(missing)
+            scores = self.scoring_service.score_catalog_rows_against_stores(
+                catalog, np.arange(len(catalog)), store_table
+            )
+            rows = store_rows(store_table, stores)
+            for partner_id, column in catalog.index.items():
+                vectors[partner_id] = {name: scores[name][rows, column] for name in EVALUATION_COMPONENTS}
+
+        return {partner.partner_id: vectors[partner.partner_id] for partner in partners}
+
+    def _new_results(self) -> Dict[str, Any]:
+        return {
+            "orchestration_id": f"orch_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
+            "executed_at": datetime.now()
+        }
@@ -0,0 +1,333 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError, ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Tarefa: (seção do resultado, chave na seção ou None para o valor da seção, agente, contexto)
+AgentTask = Tuple[str, Optional[str], Any, Dict[str, Any]]
+
+@dataclass(frozen=True)
+class Intermediate:
+    """Valor intermediário de uma execução, calculado uma vez e compartilhado
+
+    `compute(contexto, *valores das entradas)` roda no pool de threads assim que
+    as entradas (outros intermediários) ficam prontas. Os agentes que listam
+    `name` em `inputs` recebem o valor no contexto, sob a mesma chave.
+    """
+    name: str
+    compute: Callable[..., Any]
+    inputs: Tuple[str, ...] = ()
+
+def _execute_agent(agent: Any, context: Dict[str, Any]) -> Dict[str, Any]:
+    return agent.execute_action(context)
+
+def _compute_intermediate(node: Intermediate, context: Dict[str, Any], values: List[Any]) -> Any:
+    try:
+        return node.compute(context, *values)
+    except Exception as e:
+        raise RuntimeError(f"Intermediate {node.name} failed: {e}") from e
+
+def _with_inputs(context: Dict[str, Any], names: List[str], values: List[Any]) -> Dict[str, Any]:
+    return dict(context, **dict(zip(names, values))) if names else context
+
+class AgentExecutor:
+    """Executa agentes independentes em paralelo
+
+    Agentes com `cpu_bound = True` (ex.: PartnerAgent) vão para um pool de
+    processos quando `process_workers` > 0, recebendo apenas o contexto de
+    `process_context` (serializável); os demais vão para um pool de threads.
+    Com max_workers=1 e sem processos, tudo roda em sequência na thread atual.
+
+    `timeout` (segundos) vale por agente, contado do envio ao pool: o agente que
+    estoura recebe um resultado de erro (threads não são interrompidas, apenas
+    deixam de ser aguardadas). Os resultados saem na ordem das tarefas,
+    independentemente da ordem de conclusão.
+
+    run_async é a variante para o event loop: aguarda os agentes com
+    asyncio.gather (execute_action_async, que por padrão delega ao pool de
+    threads) e, se a tarefa que o chama for cancelada, cancela todos eles.
+
+    Com `intermediates`, a execução vira um DAG: os intermediários listados em
+    `agent.inputs` (e suas próprias entradas) são calculados uma única vez, em
+    ordem topológica, e cada nó parte assim que suas entradas terminam, de modo
+    que ramos independentes correm em paralelo. Entradas sem intermediário
+    registrado são lidas do próprio contexto. Nesse modo o timeout de um agente
+    inclui a espera pelas entradas; se um intermediário falha, os agentes que
+    dependem dele recebem o erro.
+
+    Os pools são criados sob demanda, sob um lock, e podem ser compartilhados
+    por execuções concorrentes. O executor não tira cópia do estado lido pelos
+    agentes: quem monta as tarefas fixa o que cada uma enxerga (ver
+    AgentOrchestrator).
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        process_workers: int = 0,
+        timeout: Optional[float] = None
+    ):
+        self.max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+        self.process_workers = process_workers
+        self.timeout = timeout
+        self._threads: Optional[ThreadPoolExecutor] = None
+        self._processes: Optional[ProcessPoolExecutor] = None
+        self._pools_lock = threading.Lock()
+
+    def run(
+        self,
+        tasks: List[AgentTask],
+        sections: List[str],
+        intermediates: Optional[Dict[str, Intermediate]] = None,
+        context: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Executa as tarefas e monta {seção: {chave: resultado}} (ou {seção: resultado})
+
+        `context` é o contexto da execução passado aos intermediários.
+        """
+        results: Dict[str, Any] = {section: {} for section in sections}
+        intermediates = intermediates or {}
+        order = self.plan(tasks, intermediates)
+
+        if self.max_workers == 1 and not self.process_workers:
+            values: Dict[str, Any] = {}
+            for name in order:
+                node = intermediates[name]
+                try:
+                    values[name] = _compute_intermediate(node, context, [values[i] for i in node.inputs])
+                except Exception as e:
+                    values[name] = e
+            for section, key, agent, task_context in tasks:
+                names = self._inputs(agent, intermediates)
+                failed = next((values[n] for n in names if isinstance(values[n], Exception)), None)
+                if failed is not None:
+                    result = {"agent_id": agent.agent_id, "error": str(failed)}
+                else:
+                    result = self._run_inline(agent, _with_inputs(task_context, names, [values[n] for n in names]))
+                self._store(results, section, key, result)
+            return results
+
+        # 1. Intermediários, cada um enviado ao pool quando suas entradas terminam
+        futures: Dict[str, Future] = {}
+        for name in order:
+            node = intermediates[name]
+            futures[name] = self._after(
+                [futures[i] for i in node.inputs],
+                lambda values, node=node: self._thread_pool().submit(_compute_intermediate, node, context, values)
+            )
+
+        # 2. Agentes, idem
+        submitted: List[Tuple[str, Optional[str], Any, Future, float]] = []
+        for section, key, agent, task_context in tasks:
+            names = self._inputs(agent, intermediates)
+            future = self._after(
+                [futures[n] for n in names],
+                lambda values, agent=agent, task_context=task_context, names=names: self._submit_agent(
+                    agent, _with_inputs(task_context, names, values)
+                )
+            )
+            submitted.append((section, key, agent, future, time.monotonic()))
+
+        for section, key, agent, future, submitted_at in submitted:
+            self._store(results, section, key, self._wait(agent, future, submitted_at))
+        return results
+
+    async def run_async(
+        self,
+        tasks: List[AgentTask],
+        sections: List[str],
+        intermediates: Optional[Dict[str, Intermediate]] = None,
+        context: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Como run, mas sem bloquear o event loop (agentes aguardados com asyncio.gather)"""
+        results: Dict[str, Any] = {section: {} for section in sections}
+        intermediates = intermediates or {}
+
+        pending: Dict[str, asyncio.Future] = {}
+        for name in self.plan(tasks, intermediates):
+            node = intermediates[name]
+            pending[name] = asyncio.ensure_future(
+                self._await_intermediate(node, context, [pending[i] for i in node.inputs])
+            )
+
+        try:
+            outcomes = await asyncio.gather(*[
+                self._await_agent(agent, task_context, {
+                    name: pending[name] for name in self._inputs(agent, intermediates)
+                })
+                for _, _, agent, task_context in tasks
+            ])
+        finally:
+            for future in pending.values():
+                future.cancel()
+
+        for (section, key, _, _), result in zip(tasks, outcomes):
+            self._store(results, section, key, result)
+        return results
+
+    def plan(self, tasks: List[AgentTask], intermediates: Dict[str, Intermediate]) -> List[str]:
+        """Intermediários necessários às tarefas, em ordem topológica (ValueError se houver ciclo)"""
+        order: List[str] = []
+        state: Dict[str, bool] = {}  # False: em visita, True: concluído
+
+        def visit(name: str):
+            if state.get(name):
+                return
+            if name in state:
+                raise ValueError(f"Cycle in agent pipeline at intermediate {name}")
+            state[name] = False
+            for dependency in intermediates[name].inputs:
+                visit(dependency)
+            state[name] = True
+            order.append(name)
+
+        for _, _, agent, _ in tasks:
+            for name in self._inputs(agent, intermediates):
+                visit(name)
+        return order
+
+    def _inputs(self, agent: Any, intermediates: Dict[str, Intermediate]) -> List[str]:
+        return [name for name in getattr(agent, "inputs", ()) if name in intermediates]
+
+    def _submit_agent(self, agent: Any, context: Dict[str, Any]) -> Future:
+        if getattr(agent, "cpu_bound", False) and self.process_workers:
+            return self._process_pool().submit(_execute_agent, agent, agent.process_context(context))
+        return self._thread_pool().submit(_execute_agent, agent, context)
+
+    def _after(self, dependencies: List[Future], submit: Callable[[List[Any]], Future]) -> Future:
+        """Future de submit(valores das dependências), chamado quando todas terminam
+
+        Não ocupa threads esperando: o envio parte do callback da última dependência.
+        Se alguma falhar, o future resultante falha com a mesma exceção.
+        """
+        if not dependencies:
+            return submit([])
+
+        result: Future = Future()
+        remaining = [len(dependencies)]
+        lock = threading.Lock()
+
+        def on_done(_):
+            with lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            if result.cancelled():
+                return
+            try:
+                inner = submit([dependency.result() for dependency in dependencies])
+            except BaseException as e:
+                self._settle(result, exception=e)
+                return
+            inner.add_done_callback(forward)
+
+        def forward(inner: Future):
+            if inner.cancelled():
+                result.cancel()
+            elif inner.exception() is not None:
+                self._settle(result, exception=inner.exception())
+            else:
+                self._settle(result, inner.result())
+
+        for dependency in dependencies:
+            dependency.add_done_callback(on_done)
+        return result
+
+    def _settle(self, future: Future, value: Any = None, exception: Optional[BaseException] = None):
+        try:
+            if exception is not None:
+                future.set_exception(exception)
+            else:
+                future.set_result(value)
+        except InvalidStateError:
+            pass  # Cancelado por timeout enquanto esperava
+
+    async def _await_intermediate(
+        self,
+        node: Intermediate,
+        context: Optional[Dict[str, Any]],
+        dependencies: List[asyncio.Future]
+    ) -> Any:
+        # shield: cancelar um dependente não cancela o intermediário compartilhado
+        values = [await asyncio.shield(dependency) for dependency in dependencies]
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._thread_pool(), _compute_intermediate, node, context, values)
+
+    async def _await_agent(
+        self,
+        agent: Any,
+        context: Dict[str, Any],
+        inputs: Optional[Dict[str, asyncio.Future]] = None
+    ) -> Dict[str, Any]:
+        try:
+            return await asyncio.wait_for(self._agent_coroutine(agent, context, inputs or {}), self.timeout)
+        except asyncio.TimeoutError:
+            return {"agent_id": agent.agent_id, "error": f"Agent timed out after {self.timeout}s"}
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            return {"agent_id": agent.agent_id, "error": str(e)}
+
+    async def _agent_coroutine(
+        self,
+        agent: Any,
+        context: Dict[str, Any],
+        inputs: Dict[str, asyncio.Future]
+    ) -> Dict[str, Any]:
+        values = [await asyncio.shield(future) for future in inputs.values()]
+        context = _with_inputs(context, list(inputs), values)
+
+        if getattr(agent, "cpu_bound", False) and self.process_workers:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._process_pool(), _execute_agent, agent, agent.process_context(context)
+            )
+        return await agent.execute_action_async(context, self._thread_pool())
+
+    def shutdown(self):
+        """Encerra os pools (recriados sob demanda na próxima execução)"""
+        with self._pools_lock:
+            pools = (self._threads, self._processes)
+            self._threads = self._processes = None
+        for pool in pools:
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+
+    def _wait(self, agent: Any, future: Future, submitted_at: float) -> Dict[str, Any]:
+        timeout = None
+        if self.timeout is not None:
+            timeout = max(0.0, submitted_at + self.timeout - time.monotonic())
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError:
+            future.cancel()
+            return {"agent_id": agent.agent_id, "error": f"Agent timed out after {self.timeout}s"}
+        except Exception as e:
+            return {"agent_id": agent.agent_id, "error": str(e)}
+
+    def _run_inline(self, agent: Any, context: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            return agent.execute_action(context)
+        except Exception as e:
+            return {"agent_id": agent.agent_id, "error": str(e)}
+
+    def _store(self, results: Dict[str, Any], section: str, key: Optional[str], result: Dict[str, Any]):
+        if key is None:
+            results[section] = result
+        else:
+            results[section][key] = result
+
+    def _thread_pool(self) -> ThreadPoolExecutor:
+        with self._pools_lock:
+            if self._threads is None:
+                self._threads = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="orion-agent")
+            return self._threads
+
+    def _process_pool(self) -> ProcessPoolExecutor:
+        with self._pools_lock:
+            if self._processes is None:
+                self._processes = ProcessPoolExecutor(max_workers=self.process_workers)
+            return self._processes
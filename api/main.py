@@ -1,19 +1,38 @@
 
-from fastapi import FastAPI, HTTPException
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Dict, List, Optional, Any
-from datetime import datetime
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Literal, Optional, Any
+from datetime import datetime, timedelta
+import asyncio
+import json
 import sys
 import os
+import uuid
 
 # Adiciona o diretório pai ao path para importar os módulos
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
 from models.entities import StoreSegment, StoreSize, EcommerceStage
-from services.recommendation_service import OrionOrchestrator
+from services.recommendation_service import (
+    OrionOrchestrator, BULK_CHUNK_SIZE, SCORE_MATRIX_DTYPE, SCORE_MATRIX_MEMORY_BUDGET, SUB_SCORE_DTYPE
+)
+from services.repository import EcosystemRepository
+from services.persistence import SQLiteBackend
+from services.recommendation_table import MATERIALIZED_TOP_N, MAX_STALENESS_SECONDS
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Mantém o recálculo das recomendações materializadas enquanto a API estiver no ar"""
+    task = asyncio.create_task(_refresh_recommendations_periodically())
+    yield
+    task.cancel()
 
 app = FastAPI(
+    lifespan=lifespan,
     title="Projeto Órion - API",
     description="API do Sistema Inteligente de Orquestração de E-commerce",
     version="1.0.0"
@@ -28,8 +47,75 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Instância global do orquestrador
-orchestrator = OrionOrchestrator()
+# Instância global do orquestrador (persistida em SQLite se ORION_DB_PATH estiver definido)
+DB_PATH = os.environ.get("ORION_DB_PATH")
+# Matriz de scores: float64/float32/float16/uint8 e orçamento em bytes (0 = sem limite)
+MATRIX_DTYPE = os.environ.get("ORION_MATRIX_DTYPE", SCORE_MATRIX_DTYPE)
+MATRIX_MEMORY_BUDGET = int(os.environ.get("ORION_MATRIX_MEMORY_BUDGET", SCORE_MATRIX_MEMORY_BUDGET))
+# Tensor de sub-scores: com ele, PUT /scoring/weights só recombina (float64/float32/float16)
+KEEP_SUB_SCORES = os.environ.get("ORION_KEEP_SUB_SCORES", "").lower() in ("1", "true", "yes")
+SUB_SCORE_TENSOR_DTYPE = os.environ.get("ORION_SUB_SCORE_DTYPE", SUB_SCORE_DTYPE)
+orchestrator = OrionOrchestrator(
+    EcosystemRepository(SQLiteBackend(DB_PATH)) if DB_PATH else None,
+    matrix_dtype=MATRIX_DTYPE,
+    memory_budget=MATRIX_MEMORY_BUDGET or None,
+    keep_sub_scores=KEEP_SUB_SCORES,
+    sub_score_dtype=SUB_SCORE_TENSOR_DTYPE
+)
+
+# Tabela materializada de recomendações e seu recálculo em segundo plano
+recommendation_table = orchestrator.recommendation_service.recommendation_table
+recommendation_table.top_n = int(os.environ.get("ORION_MATERIALIZED_TOP_N", MATERIALIZED_TOP_N))
+recommendation_table.max_staleness = timedelta(
+    seconds=float(os.environ.get("ORION_MAX_STALENESS_SECONDS", MAX_STALENESS_SECONDS))
+)
+REFRESH_INTERVAL_SECONDS = float(os.environ.get("ORION_REFRESH_INTERVAL_SECONDS", 5))
+REFRESH_BATCH_SIZE = 100  # Lojas recalculadas por vez (cada lote segura o lock do repositório)
+PARTNER_ANALYSIS_PAGE_SIZE = 50  # Avaliações por página em /partners/{id}/analysis
+PARTNER_ANALYSIS_MAX_PAGE_SIZE = 1000  # Maior `limit` aceito nessa rota
+DISCONNECT_POLL_SECONDS = 0.5  # Intervalo de verificação de cliente desconectado em rotas longas
+
+async def _refresh_recommendations_periodically():
+    """Recalcula as recomendações materializadas pendentes, em lotes pequenos, fora do event loop"""
+    service = orchestrator.recommendation_service
+    while True:
+        while await asyncio.to_thread(service.refresh_materialized, REFRESH_BATCH_SIZE):
+            pass
+        await asyncio.sleep(REFRESH_INTERVAL_SECONDS)
+
+async def _cancel_on_disconnect(request: Request, coroutine: Any) -> Any:
+    """Aguarda a corrotina, cancelando-a se o cliente desconectar antes do fim"""
+    task = asyncio.ensure_future(coroutine)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                raise HTTPException(status_code=499, detail="Client disconnected")
+    finally:
+        task.cancel()
+
+# Importações executadas em segundo plano: job_id -> status/resultado
+jobs: Dict[str, Dict[str, Any]] = {}
+JOB_TTL_SECONDS = float(os.environ.get("ORION_JOB_TTL_SECONDS", 3600))  # Retenção de jobs concluídos
+MAX_JOBS = 1000  # Máximo de jobs mantidos em `jobs`
+FINISHED_JOB_STATUSES = ("completed", "failed")
+
+def _prune_jobs(now: datetime):
+    """Descarta jobs concluídos há mais de JOB_TTL_SECONDS e, acima de MAX_JOBS, os concluídos mais antigos"""
+    finished = sorted(
+        (job["finished_at"], job_id) for job_id, job in list(jobs.items())
+        if job["status"] in FINISHED_JOB_STATUSES
+    )
+    expired_before = now - timedelta(seconds=JOB_TTL_SECONDS)
+    excess = len(jobs) - MAX_JOBS
+    for finished_at, job_id in finished:
+        if finished_at >= expired_before and excess <= 0:
+            break
+        jobs.pop(job_id, None)
+        excess -= 1
 
 # Modelos Pydantic para requests
 class StoreCreateRequest(BaseModel):
@@ -61,7 +147,43 @@ class PartnerCreateRequest(BaseModel):
     roi_potential: int = 5
     commission_rate: float = 0.1
 
+class ScoringWeightsRequest(BaseModel):
+    compatibility: Optional[Dict[str, float]] = None
+    profitability: Optional[Dict[str, float]] = None
+    compatibility_weight: Optional[float] = None
+    profitability_weight: Optional[float] = None
+
+class WeightProfilesRequest(BaseModel):
+    profiles: Dict[str, ScoringWeightsRequest]
+    store_ids: Optional[List[str]] = None
+    limit: int = 10
+    min_score: float = 0.3
+
+def _weight_profiles(request: WeightProfilesRequest) -> Dict[str, Any]:
+    """Perfis do request como snapshots, partindo dos pesos atuais"""
+    current = orchestrator.scoring_service.weights
+    return {
+        name: current.merged(
+            profile.compatibility,
+            profile.profitability,
+            profile.compatibility_weight,
+            profile.profitability_weight
+        )
+        for name, profile in request.profiles.items()
+    }
+
+def _weights_to_dict(weights) -> Dict[str, Any]:
+    return {
+        "compatibility": dict(weights.compatibility),
+        "profitability": dict(weights.profitability),
+        "compatibility_weight": weights.compatibility_weight,
+        "profitability_weight": weights.profitability_weight
+    }
+
 # Endpoints principais
+#
+# Rotas que tomam o lock do repositório (bloqueante) ou pontuam em massa são `def`: o FastAPI
+# as executa no pool de threads, sem parar o event loop enquanto esperam por uma escrita.
 
 @app.get("/")
 async def root():
@@ -76,7 +198,7 @@ async def health_check():
     return {"status": "healthy", "timestamp": datetime.now()}
 
 @app.post("/stores")
-async def create_store(store_data: StoreCreateRequest):
+def create_store(store_data: StoreCreateRequest):
     """Cria uma nova loja no sistema"""
     try:
         result = orchestrator.onboard_store(store_data.dict())
@@ -84,8 +206,64 @@ async def create_store(store_data: StoreCreateRequest):
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+async def _ndjson_lines(request: Request) -> AsyncIterator[bytes]:
+    """Lê o corpo da requisição em streaming, uma linha NDJSON por vez"""
+    buffer = b""
+    async for data in request.stream():
+        buffer += data
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+    if buffer.strip():
+        yield buffer
+
+class _RequestBodyStreamingResponse(StreamingResponse):
+    """StreamingResponse cujo gerador ainda lê o corpo da requisição
+
+    O StreamingResponse consome receive() em paralelo para detectar a desconexão
+    do cliente, disputando as mensagens do corpo com request.stream(). Aqui a
+    desconexão é percebida pelo próprio request.stream() (ClientDisconnect).
+    """
+
+    async def listen_for_disconnect(self, receive):
+        await asyncio.Event().wait()  # Cancelado quando a resposta termina
+
+def _parse_store_line(line: bytes) -> Dict[str, Any]:
+    return StoreCreateRequest(**json.loads(line)).dict()
+
+@app.post("/stores:bulk")
+async def create_stores_bulk(request: Request):
+    """Onboarding em massa a partir de NDJSON (uma loja por linha)
+
+    Responde em NDJSON com um status por linha recebida e um resumo ao final.
+    Cada bloco de BULK_CHUNK_SIZE linhas é gravado e pontuado no pool de threads.
+    """
+    async def statuses():
+        summary = {"received": 0, "created": 0, "failed": 0}
+
+        # Cada bloco é validado, gravado e pontuado fora do event loop
+        chunk = []
+        async for line in _ndjson_lines(request):
+            chunk.append(line)
+            if len(chunk) >= BULK_CHUNK_SIZE:
+                for status in await run_in_threadpool(
+                    orchestrator.onboard_store_chunk, chunk, summary, _parse_store_line
+                ):
+                    yield json.dumps(status) + "\n"
+                chunk = []
+        if chunk:
+            for status in await run_in_threadpool(
+                orchestrator.onboard_store_chunk, chunk, summary, _parse_store_line
+            ):
+                yield json.dumps(status) + "\n"
+
+        yield json.dumps({"summary": summary}) + "\n"
+
+    return _RequestBodyStreamingResponse(statuses(), media_type="application/x-ndjson")
+
 @app.get("/stores/{store_id}")
-async def get_store(store_id: str):
+def get_store(store_id: str):
     """Recupera informações de uma loja"""
     store_dna = orchestrator.dna_service.get_store_dna(store_id)
     if not store_dna:
@@ -104,7 +282,7 @@ async def get_store(store_id: str):
         "traffic_sources": store_dna.traffic_sources,
         "pain_points": store_dna.pain_points,
         "current_tools": store_dna.current_tools,
-        "priorities": store_dna.priorities,
+        "priorities": dict(store_dna.priorities),
         "created_at": store_dna.created_at.isoformat(),
         "updated_at": store_dna.updated_at.isoformat()
     }
@@ -112,25 +290,32 @@ async def get_store(store_id: str):
     return {"success": True, "data": store_data}
 
 @app.get("/stores/{store_id}/analysis")
-async def analyze_store(store_id: str):
-    """Executa análise completa de uma loja"""
+async def analyze_store(store_id: str, request: Request, scope: Literal["store", "ecosystem"] = "store"):
+    """Executa análise completa de uma loja (scope=ecosystem roda todos os agentes)
+
+    Não bloqueia o event loop; se o cliente desconectar, a análise é cancelada.
+    """
     try:
-        result = orchestrator.run_full_analysis(store_id)
+        result = await _cancel_on_disconnect(request, orchestrator.run_full_analysis_async(store_id, scope))
         if "error" in result:
             raise HTTPException(status_code=404, detail=result["error"])
         return {"success": True, "data": result}
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/stores/{store_id}/recommendations")
-async def get_store_recommendations(
+def get_store_recommendations(
     store_id: str, 
     limit: int = 10, 
     min_score: float = 0.3
 ):
-    """Obtém recomendações para uma loja"""
+    """Obtém recomendações para uma loja (da tabela materializada, se fresca o bastante)"""
     try:
-        recommendations = orchestrator.recommendation_service.get_recommendations_for_store(
+        recommendations, materialized_at = orchestrator.recommendation_service.get_materialized_recommendations(
             store_id, limit, min_score
         )
 
@@ -150,12 +335,16 @@ async def get_store_recommendations(
             for rec in recommendations
         ]
 
-        return {"success": True, "data": recs_data}
+        return {
+            "success": True,
+            "data": recs_data,
+            "materialized_at": materialized_at.isoformat() if materialized_at else None
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/stores/{store_id}/gaps")
-async def get_store_gaps(store_id: str):
+def get_store_gaps(store_id: str):
     """Identifica gaps/lacunas de uma loja"""
     try:
         gaps = orchestrator.dna_service.identify_gaps(store_id)
@@ -172,7 +361,7 @@ async def get_store_gaps(store_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/partners")
-async def create_partner(partner_data: PartnerCreateRequest):
+def create_partner(partner_data: PartnerCreateRequest):
     """Adiciona novo parceiro ao ecossistema"""
     try:
         result = orchestrator.add_partner_to_ecosystem(partner_data.dict())
@@ -180,19 +369,66 @@ async def create_partner(partner_data: PartnerCreateRequest):
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+def _run_partner_import(job_id: str, partners_data: List[Dict[str, Any]]):
+    """Executa uma importação de parceiros registrada em `jobs`"""
+    jobs[job_id]["status"] = "running"
+    try:
+        outcome = {"status": "completed", "result": orchestrator.add_partners_to_ecosystem(partners_data)}
+    except Exception as e:
+        outcome = {"status": "failed", "error": str(e)}
+    jobs[job_id].update(outcome, finished_at=datetime.now())
+
+@app.post("/partners:bulk")
+def create_partners_bulk(
+    partners_data: List[PartnerCreateRequest],
+    background_tasks: BackgroundTasks,
+    background: bool = False
+):
+    """Importa parceiros em lote; com background=true responde de imediato com um job"""
+    records = [partner_data.dict() for partner_data in partners_data]
+
+    if background:
+        job_id, now = str(uuid.uuid4()), datetime.now()
+        _prune_jobs(now)
+        jobs[job_id] = {"job_id": job_id, "status": "queued", "created_at": now}
+        background_tasks.add_task(_run_partner_import, job_id, records)
+        return {"success": True, "data": jobs[job_id]}
+
+    try:
+        result = orchestrator.add_partners_to_ecosystem(records)
+        return {"success": True, "data": result}
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status (e resultado, quando concluído) de uma importação em segundo plano"""
+    job = jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"success": True, "data": job}
+
 @app.get("/partners/{partner_id}/analysis")
-async def analyze_partner(partner_id: str):
-    """Analisa performance de um parceiro"""
+def analyze_partner(
+    partner_id: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(PARTNER_ANALYSIS_PAGE_SIZE, ge=1, le=PARTNER_ANALYSIS_MAX_PAGE_SIZE)
+):
+    """Analisa performance de um parceiro (avaliações paginadas por offset/limit)"""
     try:
-        result = orchestrator.recommendation_service.get_partner_performance_analysis(partner_id)
+        result = orchestrator.recommendation_service.get_partner_performance_analysis(
+            partner_id, offset, limit
+        )
         if "error" in result:
             raise HTTPException(status_code=404, detail=result["error"])
         return {"success": True, "data": result}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/ecosystem/dashboard")
-async def get_ecosystem_dashboard():
+def get_ecosystem_dashboard():
     """Dashboard do ecossistema completo"""
     try:
         dashboard = orchestrator.get_ecosystem_dashboard()
@@ -201,14 +437,64 @@ async def get_ecosystem_dashboard():
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/market/opportunities")
-async def get_market_opportunities():
-    """Análise de oportunidades de mercado"""
+def get_market_opportunities(consistency_check: bool = False):
+    """Análise de oportunidades de mercado (consistency_check compara com um recálculo completo)"""
     try:
-        opportunities = orchestrator.recommendation_service.generate_market_opportunities()
+        opportunities = orchestrator.recommendation_service.generate_market_opportunities(consistency_check)
         return {"success": True, "data": opportunities}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/scoring/weights")
+async def get_scoring_weights():
+    """Pesos atuais do scoring"""
+    return {"success": True, "data": _weights_to_dict(orchestrator.scoring_service.weights)}
+
+@app.put("/scoring/weights")
+def set_scoring_weights(request: ScoringWeightsRequest):
+    """Troca os pesos do scoring atomicamente (campos omitidos mantêm o valor atual)"""
+    try:
+        weights = orchestrator.recommendation_service.set_weights(
+            request.compatibility,
+            request.profitability,
+            request.compatibility_weight,
+            request.profitability_weight
+        )
+        return {"success": True, "data": _weights_to_dict(weights)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/scoring/profiles/rankings")
+def rank_weight_profiles(request: WeightProfilesRequest):
+    """Rankings por loja de cada perfil de pesos (um único cálculo de sub-scores)"""
+    try:
+        rankings = orchestrator.recommendation_service.rank_weight_profiles(
+            _weight_profiles(request), request.store_ids, request.limit, request.min_score
+        )
+        return {
+            "success": True,
+            "data": {
+                name: {
+                    store_id: [{"partner_id": partner_id, "final_score": score} for partner_id, score in ranked]
+                    for store_id, ranked in store_rankings.items()
+                }
+                for name, store_rankings in rankings.items()
+            }
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/scoring/profiles/overlap")
+def compare_weight_profiles(request: WeightProfilesRequest):
+    """Sobreposição dos rankings entre cada par de perfis de pesos"""
+    try:
+        stats = orchestrator.recommendation_service.compare_weight_profiles(
+            _weight_profiles(request), request.store_ids, request.limit, request.min_score
+        )
+        return {"success": True, "data": stats}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @app.get("/enums")
 async def get_enums():
     """Retorna enums disponíveis para facilitar frontend"""
@@ -223,7 +509,7 @@ async def get_enums():
 
 # Endpoint para popular dados de exemplo
 @app.post("/seed-data")
-async def seed_example_data():
+def seed_example_data():
     """Popula sistema com dados de exemplo para demonstração"""
     try:
         from ..core.sample_data import create_sample_data
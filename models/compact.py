@@ -0,0 +1,321 @@
+import struct
+import sys
+import threading
+from array import array
+from collections.abc import Mapping, MutableMapping
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Datas são guardadas como microssegundos desde a época (datetime ingênuo)
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+# Prioridade ausente num slot do vetor de prioridades, e prioridade guardada fora do vetor
+NO_PRIORITY = 0xFF
+OVERFLOW_PRIORITY = 0xFE
+MAX_PRIORITY = OVERFLOW_PRIORITY - 1  # Maior prioridade inteira guardada no próprio vetor
+
+# Id reservado: o nome segue por extenso (UTF-8), usado quando o vocabulário está cheio
+INLINE_ID = 0xFFFF
+VOCABULARY_MAX_SIZE = INLINE_ID
+
+# Seção de ids: quantidade de nomes e tamanho em bytes dos itens que seguem
+IDS_HEADER = struct.Struct("<HH")
+INLINE_NAME_HEADER = struct.Struct("<HH")  # INLINE_ID, tamanho do nome em bytes
+
+# Prioridade fora do vetor: slot, tipo (b"i" inteiro, b"f" float) e valor em 8 bytes.
+# Chaves que não são etapas usam o slot EXTRA_PRIORITY_SLOT e levam o nome logo após o item
+PRIORITY_OVERFLOW_COUNT = struct.Struct("<H")
+PRIORITY_OVERFLOW_ITEM = struct.Struct("<Bc8s")
+EXTRA_PRIORITY_SLOT = 0xFF
+EXTRA_PRIORITY_NAME = struct.Struct("<H")  # Tamanho do nome em bytes (UTF-8)
+
+class Vocabulary:
+    """Internação de identificadores textuais (pain points, ferramentas, canais) em ids inteiros
+
+    Os ids são válidos apenas dentro do processo; por isso StoreDNA é serializado
+    (pickle, SQLite, API) sempre pelos nomes, nunca pelos ids.
+
+    O vocabulário guarda no máximo `max_size` nomes (ids uint16). Cheio, intern
+    retorna None e os nomes novos são gravados por extenso nas seções de ids
+    (ver pack_ids): entradas arbitrárias não fazem o vocabulário crescer sem
+    limite nem provocam erro.
+    """
+
+    def __init__(self, names: Iterable[str] = (), max_size: int = VOCABULARY_MAX_SIZE):
+        if not 0 <= max_size <= VOCABULARY_MAX_SIZE:
+            raise ValueError(f"Vocabulary max_size must be between 0 and {VOCABULARY_MAX_SIZE}")
+        self.max_size = max_size
+        self.ids: Dict[str, int] = {}
+        self.names: List[str] = []
+        self._lock = threading.Lock()
+        for name in names:
+            self.intern(name)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def intern(self, name: str) -> Optional[int]:
+        """Retorna o id do nome, registrando-o se for novo (None se o vocabulário estiver cheio)"""
+        name_id = self.ids.get(name)
+        if name_id is None:
+            with self._lock:
+                name_id = self.ids.get(name)
+                if name_id is None:
+                    if len(self.names) >= self.max_size:
+                        return None
+                    name_id = len(self.names)
+                    self.names.append(sys.intern(name))
+                    self.ids[self.names[name_id]] = name_id
+        return name_id
+
+PAIN_POINTS = Vocabulary()
+TOOLS = Vocabulary()
+TRAFFIC_CHANNELS = Vocabulary(["organic", "paid", "social", "direct", "email", "referral"])
+
+def to_micros(value: datetime) -> int:
+    return (value - EPOCH) // MICROSECOND
+
+def from_micros(micros: int) -> datetime:
+    return EPOCH + timedelta(microseconds=micros)
+
+def pack_ids(names: Iterable[str], vocabulary: Vocabulary) -> bytes:
+    """Lista de nomes -> seção de ids uint16, preservando ordem e repetições
+
+    Nomes fora do vocabulário (cheio) vão por extenso, após o id reservado INLINE_ID.
+    """
+    names = list(names)
+    ids = [vocabulary.intern(name) for name in names]
+
+    if None not in ids:
+        items = array("H", ids).tobytes()
+    else:
+        parts = []
+        for name, name_id in zip(names, ids):
+            if name_id is not None:
+                parts.append(struct.pack("<H", name_id))
+                continue
+            encoded = name.encode("utf-8")
+            if len(encoded) > 0xFFFF:
+                raise ValueError("A packed name list is limited to 65535 bytes")
+            parts.append(INLINE_NAME_HEADER.pack(INLINE_ID, len(encoded)) + encoded)
+        items = b"".join(parts)
+
+    if len(items) > 0xFFFF:
+        raise ValueError("A packed name list is limited to 65535 bytes")
+    return IDS_HEADER.pack(len(names), len(items)) + items
+
+def unpack_ids(packed: bytes, offset: int, vocabulary: Vocabulary) -> Tuple[List[str], int]:
+    """Lê uma seção de ids, retornando os nomes e o offset seguinte"""
+    count, size = IDS_HEADER.unpack_from(packed, offset)
+    start = offset + IDS_HEADER.size
+    end = start + size
+    names = vocabulary.names
+
+    if size == 2 * count:  # Só ids do vocabulário
+        ids = array("H")
+        ids.frombytes(packed[start:end])
+        return [names[name_id] for name_id in ids], end
+
+    result = []
+    position = start
+    while position < end:
+        (name_id,) = struct.unpack_from("<H", packed, position)
+        if name_id == INLINE_ID:
+            _, length = INLINE_NAME_HEADER.unpack_from(packed, position)
+            position += INLINE_NAME_HEADER.size
+            result.append(packed[position:position + length].decode("utf-8"))
+            position += length
+        else:
+            result.append(names[name_id])
+            position += 2
+    return result, end
+
+def skip_ids(packed: bytes, offset: int) -> int:
+    """Offset logo após uma seção de ids"""
+    _, size = IDS_HEADER.unpack_from(packed, offset)
+    return offset + IDS_HEADER.size + size
+
+def pack_vector(values: Dict[str, float], vocabulary: Vocabulary) -> bytes:
+    """Dict canal -> valor como pares esparsos: seção de ids seguida dos valores float64
+
+    Os pares são ordenados pelo id do canal (nomes por extenso ao final), de modo
+    que dicts iguais geram os mesmos bytes independentemente da ordem de inserção.
+    """
+    def order(name: str) -> Tuple[int, int]:
+        name_id = vocabulary.intern(name)
+        return (1, 0) if name_id is None else (0, name_id)
+
+    names = sorted(values, key=order)
+    return pack_ids(names, vocabulary) + array("d", [float(values[name]) for name in names]).tobytes()
+
+def unpack_vector(packed: bytes, offset: int, vocabulary: Vocabulary) -> Tuple[Dict[str, float], int]:
+    names, offset = unpack_ids(packed, offset, vocabulary)
+    values = array("d")
+    values.frombytes(packed[offset:offset + 8 * len(names)])
+    return dict(zip(names, values)), offset + 8 * len(names)
+
+def skip_vector(packed: bytes, offset: int) -> int:
+    """Offset logo após uma seção de pares (ids + valores)"""
+    (count,) = struct.unpack_from("<H", packed, offset)
+    return skip_ids(packed, offset) + 8 * count
+
+def pack_priorities(priorities: Mapping, slots: Dict[str, int]) -> Tuple[bytes, bytes]:
+    """Dict etapa -> peso como vetor de um byte por etapa e seção de prioridades fora do vetor
+
+    Inteiros entre 0 e MAX_PRIORITY ficam no vetor (NO_PRIORITY = sem peso);
+    floats e inteiros fora da faixa ficam na seção extra, marcados no vetor com
+    OVERFLOW_PRIORITY. Chaves que não são etapas também vão para a seção extra,
+    pelo nome, e são preservadas como no dict original. Retorna (vetor, seção extra).
+    """
+    vector = bytearray([NO_PRIORITY]) * len(slots)
+    overflow = []
+    for key, value in priorities.items():
+        name = getattr(key, "value", key)
+        slot = slots.get(name)
+        if slot is not None and isinstance(value, int) and 0 <= value <= MAX_PRIORITY:
+            vector[slot] = int(value)
+            continue
+
+        if isinstance(value, int):
+            if not -2 ** 63 <= value < 2 ** 63:
+                raise ValueError(f"Priority for {key} does not fit in 64 bits")
+            kind, raw = b"i", struct.pack("<q", value)
+        elif isinstance(value, float):
+            kind, raw = b"f", struct.pack("<d", value)
+        else:
+            raise ValueError(f"Priority for {key} must be a number")
+
+        if slot is None:
+            encoded = str(name).encode("utf-8")
+            if len(encoded) > 0xFFFF:
+                raise ValueError("A priority name is limited to 65535 bytes")
+            overflow.append(
+                PRIORITY_OVERFLOW_ITEM.pack(EXTRA_PRIORITY_SLOT, kind, raw) +
+                EXTRA_PRIORITY_NAME.pack(len(encoded)) + encoded
+            )
+        else:
+            vector[slot] = OVERFLOW_PRIORITY
+            overflow.append(PRIORITY_OVERFLOW_ITEM.pack(slot, kind, raw))
+
+    if len(overflow) > 0xFFFF:
+        raise ValueError("Priorities outside the vector are limited to 65535 entries")
+    return bytes(vector), PRIORITY_OVERFLOW_COUNT.pack(len(overflow)) + b"".join(overflow)
+
+def _iter_priority_overflow(packed: bytes, offset: int) -> Iterator[Tuple[int, Optional[str], Any]]:
+    """Itens da seção de prioridades fora do vetor: (slot, nome ou None, valor)"""
+    (count,) = PRIORITY_OVERFLOW_COUNT.unpack_from(packed, offset)
+    offset += PRIORITY_OVERFLOW_COUNT.size
+    for _ in range(count):
+        slot, kind, raw = PRIORITY_OVERFLOW_ITEM.unpack_from(packed, offset)
+        offset += PRIORITY_OVERFLOW_ITEM.size
+        (value,) = struct.unpack("<q" if kind == b"i" else "<d", raw)
+        name = None
+        if slot == EXTRA_PRIORITY_SLOT:
+            (size,) = EXTRA_PRIORITY_NAME.unpack_from(packed, offset)
+            offset += EXTRA_PRIORITY_NAME.size
+            name = packed[offset:offset + size].decode("utf-8")
+            offset += size
+        yield slot, name, value
+
+def unpack_priority_overflow(packed: bytes, offset: int) -> Dict[int, Any]:
+    """Seção de prioridades fora do vetor: slot -> valor (apenas etapas)"""
+    return {slot: value for slot, name, value in _iter_priority_overflow(packed, offset) if name is None}
+
+def unpack_priority_extras(packed: bytes, offset: int) -> Dict[str, Any]:
+    """Seção de prioridades fora do vetor: nome -> valor das chaves que não são etapas"""
+    return {name: value for slot, name, value in _iter_priority_overflow(packed, offset) if name is not None}
+
+class PrioritiesView(MutableMapping):
+    """Visão (chave = valor da etapa, ex.: "1_atracao") das prioridades de um StoreDNA
+
+    Lê o estado atual do dono a cada acesso e grava alterações atribuindo o dict
+    resultante a `owner.priorities`. Aceita a etapa como Enum ou como string em
+    get/[]/in, como o dict original. Chaves que não são etapas aparecem após as
+    etapas, na ordem em que foram gravadas.
+    """
+
+    __slots__ = ("_owner", "_keys", "_slots")
+
+    def __init__(self, owner: Any, keys: Sequence[str], slots: Dict[str, int]):
+        self._owner = owner
+        self._keys = keys
+        self._slots = slots
+
+    def _value(self, key: Any) -> Any:
+        name = getattr(key, "value", key)
+        slot = self._slots.get(name)
+        if slot is None:
+            return self._owner._priority_extras().get(name)
+        return self._owner._priority(slot)
+
+    def __getitem__(self, key: Any) -> Any:
+        value = self._value(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        value = self._value(key)
+        return default if value is None else value
+
+    def __setitem__(self, key: Any, value: Any):
+        self._owner.priorities = dict(self, **{getattr(key, "value", key): value})
+
+    def __delitem__(self, key: Any):
+        values = dict(self)
+        del values[getattr(key, "value", key)]
+        self._owner.priorities = values
+
+    def __iter__(self) -> Iterator[str]:
+        keys = [key for slot, key in enumerate(self._keys) if self._owner._priority(slot) is not None]
+        return iter(keys + list(self._owner._priority_extras()))
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+def _write_through(base: type, methods: Sequence[str]) -> type:
+    """Subclasse de list/dict que regrava o campo do dono após cada alteração"""
+
+    def write(self):
+        setattr(self._owner, self._field, base(self))
+
+    def wrap(name: str):
+        method = getattr(base, name)
+
+        def wrapper(self, *args, **kwargs):
+            result = method(self, *args, **kwargs)
+            self._write()
+            return result
+
+        wrapper.__name__ = name
+        return wrapper
+
+    def init(self, values: Any, owner: Any, field: str):
+        base.__init__(self, values)
+        self._owner = owner
+        self._field = field
+
+    namespace = {name: wrap(name) for name in methods}
+    namespace.update(
+        __slots__=("_owner", "_field"),
+        __init__=init,
+        _write=write,
+        __reduce__=lambda self: (base, (base(self),))
+    )
+    return type(f"WriteThrough{base.__name__.capitalize()}", (base,), namespace)
+
+# Visões de StoreDNA: comparam e serializam como list/dict e regravam o campo ao serem alteradas
+WriteThroughList = _write_through(list, (
+    "__setitem__", "__delitem__", "__iadd__", "__imul__",
+    "append", "extend", "insert", "pop", "remove", "clear", "sort", "reverse"
+))
+WriteThroughDict = _write_through(dict, (
+    "__setitem__", "__delitem__", "__ior__", "pop", "popitem", "clear", "setdefault", "update"
+))
@@ -1,8 +1,15 @@
 
+import struct
 from dataclasses import dataclass
-from typing import Dict, List, Optional, Any
+from typing import Callable, Dict, List, Optional, Any
 from enum import Enum
 from datetime import datetime
+from .compact import (
+    NO_PRIORITY, OVERFLOW_PRIORITY, PAIN_POINTS, TOOLS, TRAFFIC_CHANNELS,
+    PrioritiesView, WriteThroughDict, WriteThroughList,
+    from_micros, pack_ids, pack_priorities, pack_vector, skip_ids, skip_vector,
+    to_micros, unpack_ids, unpack_priority_extras, unpack_priority_overflow, unpack_vector
+)
 
 class StoreSize(Enum):
     MICRO = "micro"
@@ -32,23 +39,196 @@ class EcommerceStage(Enum):
     COMPLIANCE = "11_compliance"
     TALENTOS = "12_talentos"
 
-@dataclass
+# Slots do vetor de prioridades: um por etapa, na ordem do Enum
+STAGE_KEYS: List[str] = [stage.value for stage in EcommerceStage]
+STAGE_SLOTS: Dict[str, int] = {key: slot for slot, key in enumerate(STAGE_KEYS)}
+
+# Campos numéricos e datas, empacotados no início de StoreDNA._packed
+STORE_HEADER = struct.Struct("<dqddqq")
+STORE_HEADER_FIELDS = (
+    "monthly_revenue", "monthly_orders", "avg_ticket", "conversion_rate", "created_at", "updated_at"
+)
+PRIORITIES_OFFSET = STORE_HEADER.size
+TRAFFIC_OFFSET = PRIORITIES_OFFSET + len(STAGE_KEYS)
+
+# Slots que definem a identidade de StoreDNA (comparação)
+STORE_DNA_STATE = ("store_id", "name", "segment", "size", "_packed")
+
+STORE_DNA_FIELDS = (
+    "store_id", "name", "segment", "size", "monthly_revenue", "monthly_orders", "avg_ticket",
+    "conversion_rate", "traffic_sources", "pain_points", "current_tools", "priorities",
+    "created_at", "updated_at"
+)
+
+def _header_property(index: int, encode: Callable, decode: Callable) -> property:
+    def getter(self):
+        return decode(STORE_HEADER.unpack_from(self._packed)[index])
+
+    def setter(self, value):
+        header = list(STORE_HEADER.unpack_from(self._packed))
+        header[index] = encode(value)
+        self._packed = STORE_HEADER.pack(*header) + self._packed[STORE_HEADER.size:]
+
+    return property(getter, setter)
+
+def _identity(value: Any) -> Any:
+    return value
+
+def _plain(value: Any) -> Any:
+    """Visões de StoreDNA como list/dict simples (sem referência ao dono)"""
+    if isinstance(value, list):
+        return list(value)
+    if isinstance(value, (dict, PrioritiesView)):
+        return dict(value)
+    return value
+
 class StoreDNA:
-    """Modelo do DNA da Loja - informações cadastrais e performance"""
-    store_id: str
-    name: str
-    segment: StoreSegment
-    size: StoreSize
-    monthly_revenue: float
-    monthly_orders: int
-    avg_ticket: float
-    conversion_rate: float
-    traffic_sources: Dict[str, float]  # {"organic": 0.3, "paid": 0.4, ...}
-    pain_points: List[str]
-    current_tools: List[str]
-    priorities: Dict[EcommerceStage, int]  # peso de 1-10 para cada etapa
-    created_at: datetime
-    updated_at: datetime
+    """Modelo do DNA da Loja - informações cadastrais e performance
+
+    Representação compacta (milhões de lojas em memória): além de id, nome,
+    segmento e tamanho, todos os campos ficam num único bytes (`_packed`):
+    números e datas em largura fixa, prioridades num vetor de 12 slots (um por
+    EcommerceStage; floats, valores fora de 0-253 e chaves que não são etapas
+    numa seção extra ao final),
+    canais de tráfego como pares esparsos (id, float64) e pain points/ferramentas
+    como ids internados (uint16). Os atributos originais continuam disponíveis
+    como visões: traffic_sources é um dict, pain_points e current_tools são
+    listas e priorities é um MutableMapping "1_atracao" -> peso. Alterar uma
+    visão no lugar (append, [k] = v...) regrava o campo, como uma atribuição.
+
+    `pain_point_profile` guarda os pain points compilados pela tabela de matching
+    do scoring (PainPointMatchTable) e é descartado quando os pain points mudam.
+    """
+
+    __slots__ = STORE_DNA_STATE + ("pain_point_profile",)
+
+    def __init__(
+        self,
+        store_id: str,
+        name: str,
+        segment: StoreSegment,
+        size: StoreSize,
+        monthly_revenue: float,
+        monthly_orders: int,
+        avg_ticket: float,
+        conversion_rate: float,
+        traffic_sources: Dict[str, float],  # {"organic": 0.3, "paid": 0.4, ...}
+        pain_points: List[str],
+        current_tools: List[str],
+        priorities: Dict[EcommerceStage, int],  # peso de 1-10 para cada etapa
+        created_at: datetime,
+        updated_at: datetime
+    ):
+        self.store_id = store_id
+        self.name = name
+        self.segment = segment
+        self.size = size
+        self.pain_point_profile = None
+        priority_vector, priority_overflow = pack_priorities(priorities, STAGE_SLOTS)
+        self._packed = (
+            STORE_HEADER.pack(
+                float(monthly_revenue), int(monthly_orders), float(avg_ticket), float(conversion_rate),
+                to_micros(created_at), to_micros(updated_at)
+            ) +
+            priority_vector +
+            pack_vector(traffic_sources, TRAFFIC_CHANNELS) +
+            pack_ids(pain_points, PAIN_POINTS) +
+            pack_ids(current_tools, TOOLS) +
+            priority_overflow
+        )
+
+    monthly_revenue = _header_property(0, float, _identity)
+    monthly_orders = _header_property(1, int, _identity)
+    avg_ticket = _header_property(2, float, _identity)
+    conversion_rate = _header_property(3, float, _identity)
+    created_at = _header_property(4, to_micros, from_micros)
+    updated_at = _header_property(5, to_micros, from_micros)
+
+    @property
+    def priorities(self) -> PrioritiesView:
+        return PrioritiesView(self, STAGE_KEYS, STAGE_SLOTS)
+
+    @priorities.setter
+    def priorities(self, value: Dict[EcommerceStage, Any]):
+        vector, overflow = pack_priorities(value, STAGE_SLOTS)
+        self._packed = (
+            self._packed[:PRIORITIES_OFFSET] + vector +
+            self._packed[TRAFFIC_OFFSET:self._priority_overflow_offset()] + overflow
+        )
+
+    @property
+    def traffic_sources(self) -> Dict[str, float]:
+        values = unpack_vector(self._packed, TRAFFIC_OFFSET, TRAFFIC_CHANNELS)[0]
+        return WriteThroughDict(values, self, "traffic_sources")
+
+    @traffic_sources.setter
+    def traffic_sources(self, value: Dict[str, float]):
+        self._packed = (
+            self._packed[:TRAFFIC_OFFSET] + pack_vector(value, TRAFFIC_CHANNELS) +
+            self._packed[self._pain_points_offset():]
+        )
+
+    @property
+    def pain_points(self) -> List[str]:
+        names = unpack_ids(self._packed, self._pain_points_offset(), PAIN_POINTS)[0]
+        return WriteThroughList(names, self, "pain_points")
+
+    @pain_points.setter
+    def pain_points(self, value: List[str]):
+        offset = self._pain_points_offset()
+        self._packed = (
+            self._packed[:offset] + pack_ids(value, PAIN_POINTS) +
+            self._packed[skip_ids(self._packed, offset):]
+        )
+        self.pain_point_profile = None
+
+    @property
+    def current_tools(self) -> List[str]:
+        names = unpack_ids(self._packed, self._current_tools_offset(), TOOLS)[0]
+        return WriteThroughList(names, self, "current_tools")
+
+    @current_tools.setter
+    def current_tools(self, value: List[str]):
+        self._packed = (
+            self._packed[:self._current_tools_offset()] + pack_ids(value, TOOLS) +
+            self._packed[self._priority_overflow_offset():]
+        )
+
+    def _priority(self, slot: int) -> Any:
+        """Prioridade do slot (None = sem peso)"""
+        value = self._packed[PRIORITIES_OFFSET + slot]
+        if value == OVERFLOW_PRIORITY:
+            return unpack_priority_overflow(self._packed, self._priority_overflow_offset())[slot]
+        return None if value == NO_PRIORITY else value
+
+    def _priority_extras(self) -> Dict[str, Any]:
+        """Prioridades de chaves que não são etapas (guardadas pelo nome)"""
+        return unpack_priority_extras(self._packed, self._priority_overflow_offset())
+
+    def _pain_points_offset(self) -> int:
+        return skip_vector(self._packed, TRAFFIC_OFFSET)
+
+    def _current_tools_offset(self) -> int:
+        return skip_ids(self._packed, self._pain_points_offset())
+
+    def _priority_overflow_offset(self) -> int:
+        return skip_ids(self._packed, self._current_tools_offset())
+
+    def __eq__(self, other: Any) -> bool:
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return all(getattr(self, field) == getattr(other, field) for field in STORE_DNA_STATE)
+
+    __hash__ = None  # mutável, como o dataclass original
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{field}={getattr(self, field)!r}" for field in STORE_DNA_FIELDS)
+        return f"StoreDNA({fields})"
+
+    def __reduce__(self):
+        # Serializa pelos nomes (os ids internados só valem dentro do processo), com as
+        # visões convertidas em list/dict
+        return (StoreDNA, tuple(_plain(getattr(self, field)) for field in STORE_DNA_FIELDS))
 
 @dataclass 
 class Partner:
@@ -0,0 +1,191 @@
+import argparse
+import json
+import os
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from ..services.persistence import SQLiteBackend
+from ..services.partner_catalog import PartnerCatalog
+from ..services.pain_points import PainPointMatchTable
+from ..services.scoring_service import ScoringService, ScoringWeights
+from ..services.store_table import StoreTable
+
+# Lojas por shard (unidade de trabalho enviada a cada processo)
+SHARD_SIZE = 10000
+
+# Lojas pontuadas por vez dentro de um shard (limita as matrizes loja×parceiro temporárias)
+SHARD_CHUNK_ROWS = 1024
+
+# Estado de cada processo: catálogo e scoring carregados uma única vez pelo initializer
+_worker: Dict[str, Any] = {}
+
+def _init_worker(db_path: str, weights: Optional[ScoringWeights], pain_points_path: Optional[str]):
+    """Carrega o catálogo de parceiros e o serviço de scoring do processo"""
+    backend = SQLiteBackend(db_path)
+    try:
+        catalog = PartnerCatalog(list(backend.iter_partners()))
+    finally:
+        backend.close()
+
+    table = PainPointMatchTable.from_json(pain_points_path) if pain_points_path else None
+    scoring = ScoringService(pain_point_table=table)
+
+    _worker.update(
+        db_path=db_path,
+        catalog=catalog,
+        scoring=scoring,
+        weights=weights or scoring.weights
+    )
+
+def score_shard(
+    shard: Tuple[int, int],
+    top_k: int,
+    min_score: float
+) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """Pontua as `limit` lojas após o rowid `after_rowid` do snapshot contra todo o catálogo
+
+    Retorna os ids das lojas e, por loja, as colunas do catálogo e os scores finais
+    do top-k (preenchidos com -1 / NaN quando há menos de top_k recomendações).
+    """
+    after_rowid, limit = shard
+    catalog: PartnerCatalog = _worker["catalog"]
+    scoring: ScoringService = _worker["scoring"]
+    weights: ScoringWeights = _worker["weights"]
+    columns = np.arange(len(catalog))
+
+    store_ids: List[str] = []
+    top_columns = np.full((limit, top_k), -1, dtype=np.int32)
+    top_scores = np.full((limit, top_k), np.nan, dtype=np.float64)
+
+    backend = SQLiteBackend(_worker["db_path"])
+    try:
+        stores = backend.iter_stores(after_rowid, limit)
+        while True:
+            # 1. Features de um bloco de lojas
+            store_table = StoreTable(capacity=SHARD_CHUNK_ROWS)
+            for store_dna in stores:
+                store_table.upsert(scoring.compile_store_features(store_dna))
+                if len(store_table) == SHARD_CHUNK_ROWS:
+                    break
+            if not len(store_table):
+                break
+
+            # 2. Bloco loja×parceiro numa única passada vetorizada
+            final_scores = scoring.score_catalog_rows_against_stores(
+                catalog, columns, store_table, weights
+            )["final_score"]
+
+            # 3. Top-k de cada loja
+            start = len(store_ids)
+            for i, ranked in enumerate(scoring.rank_rows(final_scores, top_k, min_score)):
+                top_columns[start + i, :len(ranked)] = ranked
+                top_scores[start + i, :len(ranked)] = final_scores[i, ranked]
+            store_ids.extend(store_table.store_ids)
+    finally:
+        backend.close()
+
+    return store_ids, top_columns[:len(store_ids)], top_scores[:len(store_ids)]
+
+def run_batch(
+    db_path: str,
+    output_path: str,
+    top_k: int = 10,
+    min_score: float = 0.3,
+    workers: Optional[int] = None,
+    shard_size: int = SHARD_SIZE,
+    weights: Optional[ScoringWeights] = None,
+    pain_points_path: Optional[str] = None
+) -> Dict[str, Any]:
+    """Pontua todas as lojas de um snapshot SQLite e grava o top-k de cada uma
+
+    As lojas são divididas em shards distribuídos por um ProcessPoolExecutor; cada
+    processo carrega o catálogo uma vez e pontua seus shards de forma vetorizada.
+    A saída é um .npz comprimido (ver load_batch_scores). Retorna um resumo da execução.
+    """
+    started = time.perf_counter()
+    backend = SQLiteBackend(db_path)
+    try:
+        shards = backend.store_shards(shard_size)
+        partner_ids = [partner.partner_id for partner in backend.iter_partners()]
+    finally:
+        backend.close()
+
+    initargs = (db_path, weights, pain_points_path)
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1:
+        _init_worker(*initargs)
+        results = [score_shard(shard, top_k, min_score) for shard in shards]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as executor:
+            results = list(executor.map(
+                score_shard, shards, [top_k] * len(shards), [min_score] * len(shards)
+            ))
+
+    store_ids = [store_id for shard_ids, _, _ in results for store_id in shard_ids]
+    top_columns = np.concatenate([r[1] for r in results]) if results else np.empty((0, top_k), dtype=np.int32)
+    top_scores = np.concatenate([r[2] for r in results]) if results else np.empty((0, top_k))
+
+    np.savez_compressed(
+        output_path,
+        store_ids=np.array(store_ids, dtype=str),
+        partner_ids=np.array(partner_ids, dtype=str),
+        columns=top_columns,
+        scores=top_scores
+    )
+
+    return {
+        "stores": len(store_ids),
+        "partners": len(partner_ids),
+        "shards": len(shards),
+        "workers": workers,
+        "seconds": round(time.perf_counter() - started, 3)
+    }
+
+def load_batch_scores(path: str) -> Dict[str, List[Tuple[str, float]]]:
+    """Lê a saída de run_batch: loja -> [(parceiro, score final)] em ordem de ranking"""
+    with np.load(path) as data:
+        partner_ids = data["partner_ids"].tolist()
+        return {
+            store_id: [
+                (partner_ids[column], float(score))
+                for column, score in zip(columns, scores) if column >= 0
+            ]
+            for store_id, columns, scores in zip(data["store_ids"].tolist(), data["columns"], data["scores"])
+        }
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        description="Recalcula offline o top-k de recomendações de todas as lojas",
+        epilog="Rode a partir do diretório pai do projeto (imports relativos ao pacote): "
+               "python -m orion_prototype.services.batch_score orion.db top_k.npz"
+    )
+    parser.add_argument("db", help="snapshot SQLite (ORION_DB_PATH)")
+    parser.add_argument("output", help="arquivo .npz de saída")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--min-score", type=float, default=0.3)
+    parser.add_argument("--workers", type=int, default=None, help="processos (padrão: núcleos da máquina)")
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE)
+    parser.add_argument("--weights", help="JSON com pesos (mesmos campos de PUT /scoring/weights)")
+    parser.add_argument("--pain-points", help="JSON da tabela de matching de pain points")
+    args = parser.parse_args(argv)
+
+    weights = None
+    if args.weights:
+        with open(args.weights, encoding="utf-8") as f:
+            weights = ScoringWeights().merged(**json.load(f))
+
+    summary = run_batch(
+        args.db, args.output,
+        top_k=args.top_k,
+        min_score=args.min_score,
+        workers=args.workers,
+        shard_size=args.shard_size,
+        weights=weights,
+        pain_points_path=args.pain_points
+    )
+    print(json.dumps(summary))
+
+if __name__ == "__main__":
+    main()
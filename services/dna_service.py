@@ -2,18 +2,41 @@
 import json
 import random
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional
 from ..models.entities import StoreDNA, StoreSize, StoreSegment, EcommerceStage
+from ..services.repository import EcosystemRepository
 
 class DNAService:
     """Serviço responsável por gerenciar o DNA das lojas"""
 
-    def __init__(self):
-        self.stores_db = {}  # Simulação de banco de dados
+    def __init__(self, repository: Optional[EcosystemRepository] = None):
+        self.repository = repository or EcosystemRepository()
+        self.stores_db = self.repository.stores  # Lojas do repositório compartilhado
+
+    def add_listener(self, listener: Callable[[StoreDNA], None]):
+        """Registra callback chamado após cada criação/atualização de DNA"""
+        self.repository.add_store_listener(listener)
 
     def create_store_dna(self, store_data: Dict) -> StoreDNA:
         """Cria o DNA inicial de uma loja"""
-        dna = StoreDNA(
+        dna = self.build_store_dna(store_data)
+        self.repository.save_store(dna)
+        return dna
+
+    def create_store_dnas(self, stores_data: List[Dict]) -> List[StoreDNA]:
+        """Cria o DNA de várias lojas com uma única gravação em lote"""
+        return self.save_store_dnas([self.build_store_dna(store_data) for store_data in stores_data])
+
+    def save_store_dnas(self, dnas: List[StoreDNA]) -> List[StoreDNA]:
+        """Grava em lote DNAs já montados (e validados) por build_store_dna"""
+        return self.repository.save_stores(dnas)
+
+    def build_store_dna(self, store_data: Dict) -> StoreDNA:
+        """Monta o DNA a partir dos dados cadastrais, sem gravá-lo
+
+        Levanta KeyError/ValueError se os dados forem inválidos.
+        """
+        return StoreDNA(
             store_id=store_data["store_id"],
             name=store_data["name"],
             segment=StoreSegment(store_data["segment"]),
@@ -30,21 +53,19 @@ class DNAService:
             updated_at=datetime.now()
         )
 
-        self.stores_db[dna.store_id] = dna
-        return dna
-
     def get_store_dna(self, store_id: str) -> Optional[StoreDNA]:
         """Recupera o DNA de uma loja"""
-        return self.stores_db.get(store_id)
+        return self.repository.get_store(store_id)
 
     def update_store_dna(self, store_id: str, updates: Dict) -> Optional[StoreDNA]:
         """Atualiza o DNA de uma loja"""
-        if store_id in self.stores_db:
-            dna = self.stores_db[store_id]
+        dna = self.get_store_dna(store_id)
+        if dna:
             for key, value in updates.items():
                 if hasattr(dna, key):
                     setattr(dna, key, value)
             dna.updated_at = datetime.now()
+            self.repository.save_store(dna)
             return dna
         return None
 
@@ -88,6 +109,10 @@ class DNAService:
         if not dna:
             return []
 
+        return self.gaps_from_maturity(maturity)
+
+    def gaps_from_maturity(self, maturity: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Lacunas a partir de uma análise de maturidade já calculada"""
         gaps = []
 
         # Identifica etapas com baixa maturidade como gaps
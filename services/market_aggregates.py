@@ -0,0 +1,115 @@
+import math
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, Optional
+from ..models.entities import StoreDNA, Partner
+from ..services.store_table import StoreAnalyticsTable
+
+# Lojas de alto faturamento (serviços premium) e de baixa conversão (CRO)
+HIGH_REVENUE_THRESHOLD = 50000
+LOW_CONVERSION_THRESHOLD = 0.02
+
+class MarketAggregates:
+    """Agregados de mercado mantidos incrementalmente a cada escrita
+
+    Contadores das lojas de alto faturamento e de baixa conversão e somas
+    correntes de faturamento e conversão, mantidos pelo EcosystemRepository.
+    Nada é guardado por loja: como o StoreDNA pode ser alterado no próprio objeto
+    antes de ser regravado, a contribuição anterior é lida da linha da loja no
+    StoreAnalyticsTable, portanto upsert_store deve ser chamado antes de
+    atualizar a tabela. As contagens por segmento, tamanho e categoria vêm das
+    funções de contagem dos índices do repositório (O(valores distintos)).
+    """
+
+    def __init__(
+        self,
+        analytics: StoreAnalyticsTable,
+        count_stores_by: Optional[Callable[[str], Dict[Any, int]]] = None,
+        count_partners_by: Optional[Callable[[str], Dict[Any, int]]] = None
+    ):
+        self.analytics = analytics
+        self.count_stores_by = count_stores_by or analytics.group_count
+        self.count_partners_by = count_partners_by or (lambda field: {})
+        self.high_revenue_stores = 0
+        self.low_conversion_stores = 0
+        self.total_monthly_revenue = 0.0
+        self.conversion_rate_sum = 0.0
+
+    @classmethod
+    def from_entities(cls, stores: Iterable[StoreDNA], partners: Iterable[Partner]) -> "MarketAggregates":
+        """Recalcula todos os agregados do zero (numa tabela analítica própria)"""
+        partner_counts = {"category": Counter(partner.category for partner in partners)}
+        aggregates = cls(StoreAnalyticsTable(), count_partners_by=lambda field: dict(partner_counts[field]))
+        for store in stores:
+            aggregates.upsert_store(store)
+            aggregates.analytics.upsert(store)
+        return aggregates
+
+    @property
+    def total_stores(self) -> int:
+        return len(self.analytics)
+
+    @property
+    def total_partners(self) -> int:
+        return sum(self.count_partners_by("category").values())
+
+    # Escritas
+
+    def upsert_store(self, store: StoreDNA):
+        """Troca a contribuição da loja (a anterior vem da linha analítica, ainda não atualizada)"""
+        row = self.analytics.index.get(store.store_id)
+        if row is not None:
+            self._apply_store(
+                self.analytics.column("monthly_revenue")[row].item(),
+                self.analytics.column("conversion_rate")[row].item(),
+                -1
+            )
+        self._apply_store(store.monthly_revenue, store.conversion_rate, 1)
+
+    # Leituras
+
+    def segment_distribution(self) -> Dict[str, int]:
+        return {segment.value: count for segment, count in self.count_stores_by("segment").items()}
+
+    def size_distribution(self) -> Dict[str, int]:
+        return {size.value: count for size, count in self.count_stores_by("size").items()}
+
+    def partner_coverage(self) -> Dict[str, int]:
+        return {category.value: count for category, count in self.count_partners_by("category").items()}
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Todos os agregados, para comparação e inspeção"""
+        return {
+            "total_stores": self.total_stores,
+            "total_partners": self.total_partners,
+            "segment_distribution": self.segment_distribution(),
+            "size_distribution": self.size_distribution(),
+            "partner_coverage": self.partner_coverage(),
+            "high_revenue_stores": self.high_revenue_stores,
+            "low_conversion_stores": self.low_conversion_stores,
+            "total_monthly_revenue": self.total_monthly_revenue,
+            "conversion_rate_sum": self.conversion_rate_sum
+        }
+
+    def compare(self, expected: "MarketAggregates") -> Dict[str, Any]:
+        """Compara com um recálculo completo: {"consistent", "mismatches": {agregado: {expected, actual}}}
+
+        As somas correntes são comparadas com tolerância relativa, pois acumulam
+        arredondamento de ponto flutuante a cada atualização.
+        """
+        actual_values, expected_values = self.snapshot(), expected.snapshot()
+        mismatches = {}
+        for name, expected_value in expected_values.items():
+            actual_value = actual_values[name]
+            if isinstance(expected_value, float):
+                equal = math.isclose(actual_value, expected_value, rel_tol=1e-9, abs_tol=1e-6)
+            else:
+                equal = actual_value == expected_value
+            if not equal:
+                mismatches[name] = {"expected": expected_value, "actual": actual_value}
+        return {"consistent": not mismatches, "mismatches": mismatches}
+
+    def _apply_store(self, monthly_revenue: float, conversion_rate: float, sign: int):
+        self.high_revenue_stores += sign * (monthly_revenue > HIGH_REVENUE_THRESHOLD)
+        self.low_conversion_stores += sign * (conversion_rate < LOW_CONVERSION_THRESHOLD)
+        self.total_monthly_revenue += sign * monthly_revenue
+        self.conversion_rate_sum += sign * conversion_rate
@@ -0,0 +1,126 @@
+import itertools
+import json
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from ..models.entities import StoreDNA
+from ..services.partner_catalog import STAGES
+
+# Simulação: alguns pain points matcham com categorias de parceiros
+PAIN_POINT_CATEGORY_MATCHES = {
+    "baixa_conversao": ["3_navegacao", "4_produto", "5_carrinho"],
+    "alto_cac": ["1_atracao"],
+    "logistica_cara": ["7_fulfillment", "8_entrega"],
+    "pagamentos": ["6_pagamento"],
+    "atendimento": ["9_pos_venda"]
+}
+
+# Ordinal de cada etapa pelo valor ("1_atracao" -> 0)
+STAGE_VALUE_ORDINALS: Dict[str, int] = {stage.value: i for i, stage in enumerate(STAGES)}
+
+# Combinações distintas de pain points com perfil memoizado
+PROFILE_CACHE_SIZE = 4096
+
+# Versões são únicas entre tabelas, para que um perfil nunca seja reaproveitado por outra tabela
+_versions = itertools.count(1)
+
+@dataclass(frozen=True)
+class PainPointProfile:
+    """Pain points de uma loja compilados contra uma versão da tabela de matching"""
+    version: int
+    mask: int  # bit por ordinal de etapa com ao menos um match
+    counts: Tuple[int, ...]  # matches por ordinal de etapa
+    total: int  # quantidade de pain points da loja
+
+    def match(self, stage_ordinal: int) -> float:
+        """Match dos pain points com uma etapa: min(1, matches/total), 0.5 sem pain points"""
+        if not self.total:
+            return 0.5
+        if not (self.mask >> stage_ordinal) & 1:
+            return 0.0
+        return min(1.0, self.counts[stage_ordinal] / self.total)
+
+class PainPointMatchTable:
+    """Tabela configurável e versionada de tipos de pain point -> categorias de parceiros
+
+    Um pain point casa com um tipo quando é substring do nome do tipo. Cada pain
+    point é compilado uma única vez num vetor de matches por etapa, e cada loja
+    num PainPointProfile (bitmask + contagens) guardado no próprio StoreDNA. Toda
+    alteração da tabela gera uma nova `version`, o que invalida os perfis antigos.
+    """
+
+    def __init__(self, matches: Optional[Dict[str, List[str]]] = None):
+        self._lock = threading.Lock()
+        self.update(PAIN_POINT_CATEGORY_MATCHES if matches is None else matches)
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        # A cópia mantém a versão, de modo que os perfis já compilados continuam válidos
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_json(cls, path: str) -> "PainPointMatchTable":
+        """Carrega a tabela de um arquivo JSON {"tipo": ["1_atracao", ...]}"""
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def update(self, matches: Dict[str, List[str]]):
+        """Substitui a tabela, gerando uma nova versão"""
+        for pain_type, categories in matches.items():
+            unknown = set(categories) - set(STAGE_VALUE_ORDINALS)
+            if unknown:
+                raise ValueError(f"Unknown categories for pain point {pain_type}: {sorted(unknown)}")
+
+        with self._lock:
+            self.matches = {pain_type: list(categories) for pain_type, categories in matches.items()}
+            self._pain_point_counts: Dict[str, Tuple[int, ...]] = {}
+            self._profiles: Dict[Tuple[str, ...], PainPointProfile] = {}
+            self.version = next(_versions)
+
+    def pain_point_counts(self, pain_point: str) -> Tuple[int, ...]:
+        """Quantidade de tipos da tabela que casam com o pain point, por ordinal de etapa"""
+        counts = self._pain_point_counts.get(pain_point)
+        if counts is None:
+            stage_counts = [0] * len(STAGES)
+            for pain_type, categories in self.matches.items():
+                if pain_point in pain_type:
+                    for category in set(categories):
+                        stage_counts[STAGE_VALUE_ORDINALS[category]] += 1
+            counts = self._pain_point_counts[pain_point] = tuple(stage_counts)
+        return counts
+
+    def compile(self, pain_points: List[str]) -> PainPointProfile:
+        """Compila os pain points de uma loja (memoizado por combinação)"""
+        key = tuple(pain_points)
+        profile = self._profiles.get(key)
+        if profile is None:
+            counts = [0] * len(STAGES)
+            for pain_point in key:
+                for ordinal, count in enumerate(self.pain_point_counts(pain_point)):
+                    counts[ordinal] += count
+
+            mask = 0
+            for ordinal, count in enumerate(counts):
+                if count:
+                    mask |= 1 << ordinal
+
+            profile = PainPointProfile(self.version, mask, tuple(counts), len(key))
+            if len(self._profiles) >= PROFILE_CACHE_SIZE:
+                self._profiles.clear()
+            self._profiles[key] = profile
+        return profile
+
+    def profile_for(self, store_dna: StoreDNA) -> PainPointProfile:
+        """Perfil da loja, recompilado apenas se os pain points ou a tabela mudaram"""
+        profile = store_dna.pain_point_profile
+        if profile is None or profile.version != self.version:
+            profile = store_dna.pain_point_profile = self.compile(store_dna.pain_points)
+        return profile
+
+# Tabela compartilhada pelos ScoringService criados sem tabela própria
+DEFAULT_PAIN_POINT_TABLE = PainPointMatchTable()
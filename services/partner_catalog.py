@@ -0,0 +1,157 @@
+import numpy as np
+from typing import Dict, List, Optional
+from ..models.entities import Partner, StoreSegment, StoreSize, EcommerceStage
+
+# Ordinais fixos usados nas máscaras de bits e nos índices de categoria
+SEGMENT_ORDINALS: Dict[StoreSegment, int] = {segment: i for i, segment in enumerate(StoreSegment)}
+SIZE_ORDINALS: Dict[StoreSize, int] = {size: i for i, size in enumerate(StoreSize)}
+STAGE_ORDINALS: Dict[EcommerceStage, int] = {stage: i for i, stage in enumerate(EcommerceStage)}
+STAGES: List[EcommerceStage] = list(EcommerceStage)
+
+# Colunas do catálogo e seus tipos
+CATALOG_COLUMNS = {
+    "segment_mask": np.uint16,  # bit por ordinal de segmento atendido
+    "size_mask": np.uint8,  # bit por ordinal de tamanho atendido
+    "category_index": np.int64,  # ordinal da etapa do parceiro
+    "commission_rate": np.float64,
+    "implementation_cost": np.float64,  # 1 - complexidade/10
+    "retention_probability": np.float64  # ROI potencial/10
+}
+
+class PartnerCatalog:
+    """Catálogo colunar de parceiros - features pré-compiladas para scoring vetorizado
+
+    As colunas ficam em buffers NumPy contíguos com capacidade extra, de modo
+    que inserções são O(1) amortizado. A ordem das linhas é a ordem de inserção
+    (a mesma de partners_db), preservada também nas remoções.
+    """
+
+    def __init__(self, partners: Optional[List[Partner]] = None, capacity: int = 16):
+        self.partner_ids: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.revision = 0  # Incrementado a cada alteração, para invalidar caches derivados
+        self._category_rows: Optional[List[np.ndarray]] = None  # Índice invertido etapa -> linhas
+        self._category_rows_revision = -1
+        self._size = 0
+        self._columns: Dict[str, np.ndarray] = {
+            name: np.zeros(max(1, capacity), dtype=dtype)
+            for name, dtype in CATALOG_COLUMNS.items()
+        }
+
+        for partner in partners or []:
+            self.add(partner)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, partner_id: str) -> bool:
+        return partner_id in self.index
+
+    # Visões somente das linhas ocupadas
+    @property
+    def segment_mask(self) -> np.ndarray:
+        return self._columns["segment_mask"][:self._size]
+
+    @property
+    def size_mask(self) -> np.ndarray:
+        return self._columns["size_mask"][:self._size]
+
+    @property
+    def category_index(self) -> np.ndarray:
+        return self._columns["category_index"][:self._size]
+
+    @property
+    def commission_rate(self) -> np.ndarray:
+        return self._columns["commission_rate"][:self._size]
+
+    @property
+    def implementation_cost(self) -> np.ndarray:
+        return self._columns["implementation_cost"][:self._size]
+
+    @property
+    def retention_probability(self) -> np.ndarray:
+        return self._columns["retention_probability"][:self._size]
+
+    def category_rows(self, stage_ordinal: int) -> np.ndarray:
+        """Linhas dos parceiros de uma etapa, em ordem de catálogo
+
+        O índice invertido é reconstruído (uma ordenação estável) na primeira
+        consulta após cada alteração do catálogo.
+        """
+        if self._category_rows_revision != self.revision:
+            order = np.argsort(self.category_index, kind="stable")
+            bounds = np.searchsorted(self.category_index[order], np.arange(len(STAGES) + 1))
+            self._category_rows = [order[bounds[i]:bounds[i + 1]] for i in range(len(STAGES))]
+            self._category_rows_revision = self.revision
+        return self._category_rows[stage_ordinal]
+
+    def add(self, partner: Partner) -> int:
+        """Insere ou atualiza (na mesma linha) um parceiro, retornando a linha"""
+        row = self.index.get(partner.partner_id)
+
+        if row is None:
+            self._ensure_capacity(self._size + 1)
+            row = self._size
+            self._size += 1
+            self.partner_ids.append(partner.partner_id)
+            self.index[partner.partner_id] = row
+
+        self._write_row(row, partner)
+        self.revision += 1
+        return row
+
+    def remove(self, partner_id: str) -> Optional[int]:
+        """Remove um parceiro, retornando a linha que ele ocupava"""
+        row = self.index.pop(partner_id, None)
+        if row is None:
+            return None
+
+        # Desloca as linhas seguintes para manter a ordem de inserção
+        for column in self._columns.values():
+            column[row:self._size - 1] = column[row + 1:self._size]
+
+        del self.partner_ids[row]
+        self._size -= 1
+
+        for i in range(row, self._size):
+            self.index[self.partner_ids[i]] = i
+
+        self.revision += 1
+        return row
+
+    def _ensure_capacity(self, required: int):
+        """Dobra os buffers quando necessário"""
+        capacity = len(self._columns["category_index"])
+        if required <= capacity:
+            return
+
+        while capacity < required:
+            capacity *= 2
+
+        for name, column in self._columns.items():
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+            self._columns[name] = grown
+
+    def _write_row(self, row: int, partner: Partner):
+        """Compila as features do parceiro (mesmas expressões do ScoringService escalar)"""
+        self._columns["segment_mask"][row] = self._segment_mask(partner)
+        self._columns["size_mask"][row] = self._size_mask(partner)
+        self._columns["category_index"][row] = STAGE_ORDINALS[partner.category]
+        self._columns["commission_rate"][row] = partner.commission_rate
+        self._columns["implementation_cost"][row] = 1.0 - (partner.integration_complexity / 10.0)
+        self._columns["retention_probability"][row] = partner.roi_potential / 10.0
+
+    @staticmethod
+    def _segment_mask(partner: Partner) -> int:
+        mask = 0
+        for segment in partner.target_segments:
+            mask |= 1 << SEGMENT_ORDINALS[segment]
+        return mask
+
+    @staticmethod
+    def _size_mask(partner: Partner) -> int:
+        mask = 0
+        for size in partner.target_sizes:
+            mask |= 1 << SIZE_ORDINALS[size]
+        return mask
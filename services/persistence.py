@@ -0,0 +1,285 @@
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from enum import Enum
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+from ..models.entities import StoreDNA, Partner, StoreSegment, StoreSize, EcommerceStage
+
+# Tamanho dos lotes de executemany em cargas em massa
+BATCH_SIZE = 10000
+
+STORE_COLUMNS = (
+    "store_id", "name", "segment", "size", "monthly_revenue", "monthly_orders",
+    "avg_ticket", "conversion_rate", "traffic_sources", "pain_points",
+    "current_tools", "priorities", "created_at", "updated_at"
+)
+
+PARTNER_COLUMNS = (
+    "partner_id", "name", "category", "subcategory", "description", "pricing_model",
+    "min_price", "max_price", "target_segments", "target_sizes",
+    "integration_complexity", "roi_potential", "commission_rate"
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS stores (
+    store_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    segment TEXT NOT NULL,
+    size TEXT NOT NULL,
+    monthly_revenue REAL NOT NULL,
+    monthly_orders INTEGER NOT NULL,
+    avg_ticket REAL NOT NULL,
+    conversion_rate REAL NOT NULL,
+    traffic_sources TEXT NOT NULL,
+    pain_points TEXT NOT NULL,
+    current_tools TEXT NOT NULL,
+    priorities TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS partners (
+    partner_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    category TEXT NOT NULL,
+    subcategory TEXT NOT NULL,
+    description TEXT NOT NULL,
+    pricing_model TEXT NOT NULL,
+    min_price REAL NOT NULL,
+    max_price REAL,
+    target_segments TEXT NOT NULL,
+    target_sizes TEXT NOT NULL,
+    integration_complexity INTEGER NOT NULL,
+    roi_potential INTEGER NOT NULL,
+    commission_rate REAL NOT NULL
+);
+"""
+
+def _upsert_sql(table: str, columns: Tuple[str, ...]) -> str:
+    """INSERT ... ON CONFLICT DO UPDATE com placeholders posicionais (statement fixo, reaproveitado)"""
+    placeholders = ", ".join("?" for _ in columns)
+    updates = ", ".join(f"{column} = excluded.{column}" for column in columns[1:])
+    return (
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders}) "
+        f"ON CONFLICT({columns[0]}) DO UPDATE SET {updates}"
+    )
+
+UPSERT_STORE_SQL = _upsert_sql("stores", STORE_COLUMNS)
+UPSERT_PARTNER_SQL = _upsert_sql("partners", PARTNER_COLUMNS)
+SELECT_STORE_SQL = f"SELECT {', '.join(STORE_COLUMNS)} FROM stores WHERE store_id = ?"
+SELECT_STORES_SQL = f"SELECT {', '.join(STORE_COLUMNS)} FROM stores ORDER BY rowid"
+# Faixas por rowid (WHERE rowid > ?): cada shard começa direto no índice, sem pular linhas
+SELECT_STORE_RANGE_SQL = f"SELECT {', '.join(STORE_COLUMNS)} FROM stores WHERE rowid > ? ORDER BY rowid LIMIT ?"
+SELECT_STORE_ROWIDS_SQL = "SELECT rowid FROM stores ORDER BY rowid"
+SELECT_PARTNER_SQL = f"SELECT {', '.join(PARTNER_COLUMNS)} FROM partners WHERE partner_id = ?"
+SELECT_PARTNERS_SQL = f"SELECT {', '.join(PARTNER_COLUMNS)} FROM partners ORDER BY rowid"
+DELETE_PARTNER_SQL = "DELETE FROM partners WHERE partner_id = ?"
+
+def _json_key(key: Any) -> str:
+    return key.value if isinstance(key, Enum) else str(key)
+
+def store_to_row(store: StoreDNA) -> Tuple:
+    """Serializa StoreDNA para uma linha da tabela stores"""
+    return (
+        store.store_id,
+        store.name,
+        store.segment.value,
+        store.size.value,
+        store.monthly_revenue,
+        store.monthly_orders,
+        store.avg_ticket,
+        store.conversion_rate,
+        json.dumps(store.traffic_sources),
+        json.dumps(list(store.pain_points)),
+        json.dumps(list(store.current_tools)),
+        # Prioridades são gravadas pela chave da etapa ("1_atracao"), como o scoring as lê
+        json.dumps({_json_key(stage): weight for stage, weight in store.priorities.items()}),
+        store.created_at.isoformat(),
+        store.updated_at.isoformat()
+    )
+
+def row_to_store(row: Tuple) -> StoreDNA:
+    """Reconstrói StoreDNA a partir de uma linha da tabela stores"""
+    return StoreDNA(
+        store_id=row[0],
+        name=row[1],
+        segment=StoreSegment(row[2]),
+        size=StoreSize(row[3]),
+        monthly_revenue=row[4],
+        monthly_orders=row[5],
+        avg_ticket=row[6],
+        conversion_rate=row[7],
+        traffic_sources=json.loads(row[8]),
+        pain_points=json.loads(row[9]),
+        current_tools=json.loads(row[10]),
+        priorities=json.loads(row[11]),
+        created_at=datetime.fromisoformat(row[12]),
+        updated_at=datetime.fromisoformat(row[13])
+    )
+
+def partner_to_row(partner: Partner) -> Tuple:
+    """Serializa Partner para uma linha da tabela partners"""
+    return (
+        partner.partner_id,
+        partner.name,
+        partner.category.value,
+        partner.subcategory,
+        partner.description,
+        partner.pricing_model,
+        partner.min_price,
+        partner.max_price,
+        json.dumps([segment.value for segment in partner.target_segments]),
+        json.dumps([size.value for size in partner.target_sizes]),
+        partner.integration_complexity,
+        partner.roi_potential,
+        partner.commission_rate
+    )
+
+def row_to_partner(row: Tuple) -> Partner:
+    """Reconstrói Partner a partir de uma linha da tabela partners"""
+    return Partner(
+        partner_id=row[0],
+        name=row[1],
+        category=EcommerceStage(row[2]),
+        subcategory=row[3],
+        description=row[4],
+        pricing_model=row[5],
+        min_price=row[6],
+        max_price=row[7],
+        target_segments=[StoreSegment(s) for s in json.loads(row[8])],
+        target_sizes=[StoreSize(s) for s in json.loads(row[9])],
+        integration_complexity=row[10],
+        roi_potential=row[11],
+        commission_rate=row[12]
+    )
+
+def _batches(items: Iterable, size: int) -> Iterator[List]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+class SQLiteBackend:
+    """Persistência de lojas e parceiros em SQLite (stdlib)
+
+    Usa WAL e synchronous=NORMAL para escritas rápidas e leituras concorrentes,
+    statements fixos (reaproveitados pelo cache de statements do sqlite3) e
+    upserts em lote via executemany, todos os lotes de uma carga numa única
+    transação. Leituras em streaming (iter_*) usam uma conexão própria, sem
+    manter cursor aberto na conexão compartilhada entre um bloco e outro.
+    """
+
+    def __init__(self, path: str = "orion.db", batch_size: int = BATCH_SIZE):
+        self.path = path
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, cached_statements=64)
+
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("PRAGMA temp_store=MEMORY")
+            self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # Lojas
+
+    def upsert_stores(self, stores: Iterable[StoreDNA]) -> int:
+        """Grava lojas em lotes; retorna quantas foram gravadas"""
+        return self._upsert(UPSERT_STORE_SQL, (store_to_row(store) for store in stores))
+
+    def get_store(self, store_id: str) -> Optional[StoreDNA]:
+        with self._lock:
+            row = self._conn.execute(SELECT_STORE_SQL, (store_id,)).fetchone()
+        return row_to_store(row) if row else None
+
+    def iter_stores(self, after_rowid: int = 0, limit: Optional[int] = None) -> Iterator[StoreDNA]:
+        """Itera as lojas na ordem de inserção (todas, ou até `limit` lojas após o rowid dado)"""
+        if after_rowid or limit is not None:
+            rows = self._iter_rows(SELECT_STORE_RANGE_SQL, (after_rowid, -1 if limit is None else limit))
+        else:
+            rows = self._iter_rows(SELECT_STORES_SQL)
+        for row in rows:
+            yield row_to_store(row)
+
+    def store_shards(self, shard_size: int) -> List[Tuple[int, int]]:
+        """Divide as lojas em faixas (rowid anterior à faixa, quantidade) para iter_stores
+
+        Uma única varredura dos rowids (só o índice da tabela); cada faixa é lida
+        depois com WHERE rowid > ?, em custo proporcional ao seu tamanho.
+        """
+        shards: List[Tuple[int, int]] = []
+        after_rowid = last_rowid = count = 0
+        for (rowid,) in self._iter_rows(SELECT_STORE_ROWIDS_SQL):
+            if count == shard_size:
+                shards.append((after_rowid, count))
+                after_rowid, count = last_rowid, 0
+            last_rowid = rowid
+            count += 1
+        if count:
+            shards.append((after_rowid, count))
+        return shards
+
+    def count_stores(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM stores").fetchone()[0]
+
+    # Parceiros
+
+    def upsert_partners(self, partners: Iterable[Partner]) -> int:
+        """Grava parceiros em lotes; retorna quantos foram gravados"""
+        return self._upsert(UPSERT_PARTNER_SQL, (partner_to_row(partner) for partner in partners))
+
+    def delete_partner(self, partner_id: str):
+        with self._lock, self._conn:
+            self._conn.execute(DELETE_PARTNER_SQL, (partner_id,))
+
+    def get_partner(self, partner_id: str) -> Optional[Partner]:
+        with self._lock:
+            row = self._conn.execute(SELECT_PARTNER_SQL, (partner_id,)).fetchone()
+        return row_to_partner(row) if row else None
+
+    def iter_partners(self) -> Iterator[Partner]:
+        """Itera todos os parceiros na ordem de inserção"""
+        for row in self._iter_rows(SELECT_PARTNERS_SQL):
+            yield row_to_partner(row)
+
+    def _iter_rows(self, sql: str, parameters: Tuple = ()) -> Iterator[Tuple]:
+        """Lê o resultado em blocos, sem materializar a tabela inteira
+
+        Cada leitura abre uma conexão só dela, que enxerga um snapshot consistente
+        (WAL) até terminar, mesmo com escritas pela conexão compartilhada no meio.
+        """
+        if self.path == ":memory:":
+            # O banco em memória só existe na conexão compartilhada
+            with self._lock:
+                rows = self._conn.execute(sql, parameters).fetchall()
+            yield from rows
+            return
+
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        try:
+            cursor = conn.execute(sql, parameters)
+            while True:
+                rows = cursor.fetchmany(self.batch_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            conn.close()
+
+    def _upsert(self, sql: str, rows: Iterable[Tuple]) -> int:
+        """Grava as linhas em lotes numa única transação (uma falha desfaz a carga inteira)"""
+        written = 0
+        with self._lock, self._conn:
+            for batch in _batches(rows, self.batch_size):
+                self._conn.executemany(sql, batch)
+                written += len(batch)
+        return written
@@ -1,29 +1,190 @@
 
+import asyncio
+import heapq
+import numpy as np
+from contextlib import contextmanager
+from dataclasses import dataclass
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Any, Tuple
 from ..models.entities import (
     StoreDNA, Partner, FinalRecommendation, 
     EcommerceStage, StoreSegment, StoreSize
 )
 from ..services.dna_service import DNAService
-from ..services.scoring_service import ScoringService
+from ..services.repository import EcosystemRepository, synchronized
+from ..services.scoring_service import ScoringService, ScoringWeights
+from ..services.pain_points import PainPointMatchTable
+from ..services.store_table import StoreFeatures, StoreTable
+from ..services.partner_catalog import PartnerCatalog, STAGE_ORDINALS, STAGES
+from ..services.score_matrix import ScoreMatrix, SUB_SCORE_COMPONENTS, SUB_SCORE_DTYPES
+from ..services.recommendation_table import RecommendationTable
 from ..agents.autonomous_agents import AgentOrchestrator
 
+# Registros validados e gravados por lote no onboarding em massa
+BULK_CHUNK_SIZE = 1000
+
+# Tamanho máximo do conjunto de candidatos do pipeline candidatos + rerank
+CANDIDATE_LIMIT = 200
+
+# Prioridade a partir da qual a etapa gera candidatos (5 é o peso neutro)
+CANDIDATE_MIN_PRIORITY = 6
+
+# Linhas recombinadas por vez ao reaplicar pesos sobre o tensor de sub-scores
+REWEIGHT_CHUNK_ROWS = 4096
+
+# Matriz de scores padrão: tipo e orçamento de memória (bytes, matriz + tensor de sub-scores).
+# Acima do orçamento a matriz é desativada e as leituras voltam a pontuar ao vivo
+SCORE_MATRIX_DTYPE = "float64"
+SCORE_MATRIX_MEMORY_BUDGET = 2 * 1024 ** 3
+SUB_SCORE_DTYPE = "float32"  # Tensor de sub-scores (opcional)
+
+@dataclass
+class AnalysisContext:
+    """Dados de uma loja calculados uma única vez por análise completa
+
+    Maturidade, gaps e o vetor de scores contra todo o catálogo são compartilhados
+    por todas as seções da análise (agentes, recomendações, recomendações por área),
+    que apenas derivam seus resultados deles. Os ids e as categorias do catálogo
+    são copiados junto com os scores, pois o catálogo pode mudar durante a análise.
+    """
+    store_dna: StoreDNA
+    maturity: Dict[str, Any]
+    gaps: List[Dict[str, Any]]
+    scores: Dict[str, np.ndarray]  # Sub-scores e totais, na ordem do catálogo
+    service: "RecommendationService"
+    partner_ids: List[str]  # Linha do catálogo -> partner_id, quando os scores foram calculados
+    category_index: np.ndarray  # Linha do catálogo -> ordinal da etapa, idem
+
+    @property
+    def store_id(self) -> str:
+        return self.store_dna.store_id
+
+    def focus_areas(self, count: int = 3) -> List[EcommerceStage]:
+        """Etapas com os gaps mais severos"""
+        return [EcommerceStage(gap["stage"]) for gap in self.gaps[:count]]
+
+    def recommendations(self, limit: int = 10, min_score: float = 0.3) -> List[FinalRecommendation]:
+        rows = np.arange(len(self.scores["final_score"]))
+        return self.service._recommendations_from_scores(
+            self.store_id, self.scores, rows, limit, min_score, self.partner_ids
+        )
+
+    def stage_recommendations(
+        self,
+        stages: Optional[List[EcommerceStage]] = None,
+        limit: int = 3,
+        min_score: float = 0.4
+    ) -> Dict[str, List[FinalRecommendation]]:
+        return {
+            stage.value: self.service._recommendations_from_scores(
+                self.store_id, self.scores, np.flatnonzero(self.category_index == STAGE_ORDINALS[stage]),
+                limit, min_score, self.partner_ids
+            )
+            for stage in (STAGES if stages is None else stages)
+        }
+
 class RecommendationService:
     """Serviço responsável por gerar recomendações personalizadas"""
 
-    def __init__(self):
-        self.dna_service = DNAService()
+    def __init__(
+        self,
+        dna_service: Optional[DNAService] = None,
+        score_matrix: Optional[ScoreMatrix] = None,
+        keep_sub_scores: bool = False,
+        recommendation_table: Optional[RecommendationTable] = None,
+        sub_score_dtype: str = SUB_SCORE_DTYPE
+    ):
+        self.dna_service = dna_service or DNAService()
+        self.repository = self.dna_service.repository
         self.scoring_service = ScoringService()
-        self.agent_orchestrator = AgentOrchestrator()
-        self.partners_db = {}  # Simulação do catálogo de parceiros
+        self.agent_orchestrator = AgentOrchestrator(self.dna_service, scoring_service=self.scoring_service)
+        self.partners_db = self.repository.partners  # Parceiros do repositório compartilhado
+        self.partner_catalog = PartnerCatalog()  # Features colunares de partners_db
+
+        # Matriz loja×parceiro materializada: linhas seguem store_table, colunas partner_catalog
+        self.store_table = StoreTable()
+        self.score_matrix = score_matrix if score_matrix is not None else ScoreMatrix(
+            dtype=SCORE_MATRIX_DTYPE, memory_budget=SCORE_MATRIX_MEMORY_BUDGET
+        )
+        self._matrix_weights = self.scoring_service.weights  # Pesos com que score_matrix foi calculada
+        # Orçamento de memória (bytes) da matriz de scores e do tensor de sub-scores, juntos
+        self.memory_budget = self.score_matrix.memory_budget
+        # Sub-scores loja×parceiro (sem pesos), opcional: trocar pesos apenas recombina o tensor.
+        # Usa só o que sobra do orçamento depois da matriz de scores (ver _resize_score_matrices)
+        if keep_sub_scores and sub_score_dtype not in SUB_SCORE_DTYPES:
+            raise ValueError(f"Unsupported sub-score tensor dtype: {sub_score_dtype}")
+        self.sub_score_tensor = ScoreMatrix(
+            dtype=sub_score_dtype, components=SUB_SCORE_COMPONENTS
+        ) if keep_sub_scores else None
+        self._bound_cache = None  # Ordem dos parceiros por limite superior de score
+        # Top-N materializado por loja, servido sem recálculo enquanto estiver fresco
+        self.recommendation_table = recommendation_table or RecommendationTable()
+        self._pending_rows: Optional[Dict[int, None]] = None  # Linhas da matriz adiadas (carga em massa)
+
+        # Modo de verificação do pipeline candidatos + rerank contra o caminho exaustivo
+        self.candidate_recall_check = False
+        self.candidate_recall_stats: Dict[str, float] = {"checks": 0, "expected": 0, "found": 0, "recall": 1.0}
+
+        # Parceiros já presentes no repositório (ex.: carregados do SQLite)
+        for partner in self.partners_db.values():
+            self.partner_catalog.add(partner)
+            self.agent_orchestrator.register_partner_agent(partner)
+        self._resize_score_matrices()
 
+        for store_dna in self.dna_service.stores_db.values():
+            self._on_store_written(store_dna)
+        self.dna_service.add_listener(self._on_store_written)
+        self.repository.add_partner_listener(self._add_to_catalog)
+
+    @synchronized
     def add_partner(self, partner: Partner):
         """Adiciona parceiro ao catálogo"""
-        self.partners_db[partner.partner_id] = partner
+        self.repository.save_partner(partner)
+        self._add_to_catalog(partner)
+
+    def _add_to_catalog(self, partner: Partner):
+        """Pontua um parceiro já gravado no repositório (também chamado no read-through)"""
+        column = self.partner_catalog.add(partner)
+        self._refresh_partner_column(column)
+        self._invalidate_recommendations()
         # Registra agente do parceiro
         self.agent_orchestrator.register_partner_agent(partner)
 
+    @synchronized
+    def add_partners(self, partners: List[Partner]) -> Dict[str, np.ndarray]:
+        """Adiciona parceiros em lote ao catálogo
+
+        Grava todos os parceiros primeiro e depois pontua todos contra todas as
+        lojas numa única passada vetorizada, que alimenta as colunas da matriz.
+        Retorna os scores loja×parceiro (ordem de store_table × ordem de `partners`).
+        """
+        self.repository.save_partners(partners)
+        columns = np.array([self.partner_catalog.add(partner) for partner in partners], dtype=np.int64)
+
+        scores = self.scoring_service.score_catalog_rows_against_stores(
+            self.partner_catalog, columns, self.store_table, self._matrix_weights
+        )
+        for matrix in self._resize_score_matrices():
+            matrix.set_columns(columns, scores)
+        self._invalidate_recommendations()
+
+        for partner in partners:
+            self.agent_orchestrator.register_partner_agent(partner)
+        return scores
+
+    @synchronized
+    def remove_partner(self, partner_id: str) -> Optional[Partner]:
+        """Remove parceiro do catálogo"""
+        partner = self.repository.remove_partner(partner_id)
+        if partner:
+            column = self.partner_catalog.remove(partner_id)
+            for matrix in self._score_matrices():
+                matrix.remove_column(column)
+            self._invalidate_recommendations()
+            self.agent_orchestrator.unregister_partner_agent(partner_id)
+        return partner
+
+    @synchronized
     def get_recommendations_for_store(
         self, 
         store_id: str, 
@@ -37,33 +198,128 @@ class RecommendationService:
         if not store_dna:
             return []
 
-        recommendations = []
+        return self._rank_partners(store_dna, limit, min_score)
 
-        # Para cada parceiro, calcula scores
-        for partner in self.partners_db.values():
-            # Score de compatibilidade
-            compatibility = self.scoring_service.calculate_compatibility_score(
-                store_dna, partner
-            )
-
-            # Score de rentabilidade
-            profitability = self.scoring_service.calculate_profitability_score(
-                store_dna, partner
-            )
+    @synchronized
+    def get_candidate_recommendations(
+        self,
+        store_id: str,
+        limit: int = 10,
+        min_score: float = 0.3,
+        max_candidates: int = CANDIDATE_LIMIT
+    ) -> List[FinalRecommendation]:
+        """Recomendações em dois estágios: candidatos pelos índices invertidos, depois rerank
 
-            # Recomendação final
-            recommendation = self.scoring_service.calculate_final_recommendation(
-                compatibility, profitability
-            )
+        Só os candidatos são pontuados e ordenados. Com `candidate_recall_check`
+        ligado, cada chamada também executa o caminho exaustivo e acumula o recall
+        em `candidate_recall_stats`.
+        """
+        store_dna = self.dna_service.get_store_dna(store_id)
+        if not store_dna:
+            return []
 
-            # Filtra por score mínimo
-            if recommendation.final_score >= min_score:
-                recommendations.append(recommendation)
+        candidates = self.generate_candidates(store_dna, max_candidates)
+        recommendations = self._rank_partners(store_dna, limit, min_score, rows=candidates)
+
+        if self.candidate_recall_check:
+            expected = {r.partner_id for r in self._rank_partners(store_dna, limit, min_score)}
+            found = {r.partner_id for r in recommendations}
+            stats = self.candidate_recall_stats
+            stats["checks"] += 1
+            stats["expected"] += len(expected)
+            stats["found"] += len(expected & found)
+            stats["recall"] = stats["found"] / stats["expected"] if stats["expected"] else 1.0
+
+        return recommendations
+
+    def generate_candidates(self, store_dna: StoreDNA, max_candidates: int = CANDIDATE_LIMIT) -> np.ndarray:
+        """Linhas do catálogo candidatas para a loja, a partir dos índices invertidos do repositório
+
+        Sinais: parceiro atende o segmento, atende o tamanho, é de uma categoria
+        ligada aos pain points da loja ou de uma etapa priorizada por ela. Com mais
+        de `max_candidates`, ficam os parceiros com mais sinais (empate pela ordem
+        do catálogo). Retorna as linhas em ordem de catálogo.
+        """
+        repository = self.repository
+        profile = self.scoring_service.pain_point_table.profile_for(store_dna)
+
+        categories = {
+            stage for ordinal, stage in enumerate(STAGES)
+            if (profile.mask >> ordinal) & 1
+            or store_dna.priorities.get(stage.value, 5) >= CANDIDATE_MIN_PRIORITY
+        }
 
-        # Ordena por score final
-        recommendations.sort(key=lambda x: x.final_score, reverse=True)
+        signals: Dict[str, int] = {}
+        for partner_ids in (
+            [repository.partner_ids_by("segment", store_dna.segment),
+             repository.partner_ids_by("size", store_dna.size)] +
+            [repository.partner_ids_by("category", stage) for stage in categories]
+        ):
+            for partner_id in partner_ids:
+                signals[partner_id] = signals.get(partner_id, 0) + 1
+
+        index = self.partner_catalog.index
+        rows = np.array([index[partner_id] for partner_id in signals], dtype=np.int64)
+        counts = np.array(list(signals.values()), dtype=np.int64)
+
+        if len(rows) > max_candidates:
+            order = np.lexsort((rows, -counts))[:max_candidates]
+            rows = rows[order]
+        return np.sort(rows)
+
+    @synchronized
+    def get_materialized_recommendations(
+        self,
+        store_id: str,
+        limit: int = 10,
+        min_score: float = 0.3
+    ) -> Tuple[List[FinalRecommendation], Optional[datetime]]:
+        """Recomendações servidas da tabela materializada, com o instante do cálculo
+
+        Entradas ausentes, insuficientes para `limit` ou desatualizadas além de
+        max_staleness são pontuadas ao vivo; se couberem no top-N, o resultado
+        ao vivo também é materializado. Retorna (recomendações, materialized_at).
+        """
+        table = self.recommendation_table
+        entry = table.get(store_id, limit, min_score)
+        if entry is not None:
+            return entry.recommendations, entry.materialized_at
 
-        return recommendations[:limit]
+        store_dna = self.dna_service.get_store_dna(store_id)
+        if not store_dna:
+            return [], None
+
+        if limit > table.top_n:
+            return self._rank_partners(store_dna, limit, min_score), datetime.now()
+
+        self._materialize(store_dna)
+        entry = table.get(store_id, limit, min_score)
+        return entry.recommendations, entry.materialized_at
+
+    @synchronized
+    def refresh_materialized(self, max_stores: Optional[int] = None) -> int:
+        """Recalcula as entradas pendentes da tabela materializada (uso em segundo plano)
+
+        Retorna quantas lojas foram recalculadas.
+        """
+        table = self.recommendation_table
+        store_ids = table.take_pending(max_stores)
+        for store_id in store_ids:
+            store_dna = self.repository.stores.get(store_id)
+            if store_dna is None:
+                table.pending.pop(store_id, None)
+            else:
+                self._materialize(store_dna)
+        return len(store_ids)
+
+    def _materialize(self, store_dna: StoreDNA):
+        """Grava o top-N (sem score mínimo) da loja na tabela materializada"""
+        table = self.recommendation_table
+        table.put(store_dna.store_id, self._rank_partners(store_dna, table.top_n, 0.0))
+
+    def _invalidate_recommendations(self):
+        """Escrita que afeta todas as lojas: nova geração da tabela materializada (O(1))"""
+        self.recommendation_table.mark_all_stale()
 
     def get_priority_recommendations(
         self, 
@@ -77,75 +333,662 @@ class RecommendationService:
             gaps = self.dna_service.identify_gaps(store_id)
             focus_areas = [EcommerceStage(gap["stage"]) for gap in gaps[:3]]
 
-        priority_recommendations = {}
+        # Filtro mais permissivo, apenas parceiros da categoria
+        return self.get_stage_recommendations(store_id, focus_areas, limit=3, min_score=0.4)
 
-        for stage in focus_areas:
-            # Filtra parceiros da categoria
-            stage_partners = [
-                p for p in self.partners_db.values() 
-                if p.category == stage
-            ]
+    @synchronized
+    def get_stage_recommendations(
+        self,
+        store_id: str,
+        stages: Optional[List[EcommerceStage]] = None,
+        limit: int = 3,
+        min_score: float = 0.4
+    ) -> Dict[str, List[FinalRecommendation]]:
+        """Melhores parceiros de cada etapa (todas as etapas por padrão) numa única passada
 
-            stage_recommendations = []
-            store_dna = self.dna_service.get_store_dna(store_id)
-
-            if store_dna:
-                for partner in stage_partners:
-                    compatibility = self.scoring_service.calculate_compatibility_score(
-                        store_dna, partner
-                    )
-                    profitability = self.scoring_service.calculate_profitability_score(
-                        store_dna, partner
-                    )
-                    recommendation = self.scoring_service.calculate_final_recommendation(
-                        compatibility, profitability
-                    )
-
-                    if recommendation.final_score >= 0.4:  # Filtro mais permissivo
-                        stage_recommendations.append(recommendation)
-
-                # Ordena por score
-                stage_recommendations.sort(key=lambda x: x.final_score, reverse=True)
-                priority_recommendations[stage.value] = stage_recommendations[:3]
-
-        return priority_recommendations
-
-    def generate_market_opportunities(self) -> Dict[str, Any]:
-        """Gera análise de oportunidades de mercado"""
-        all_stores = list(self.dna_service.stores_db.values())
-        all_partners = list(self.partners_db.values())
-
-        context = {
-            "stores": all_stores,
-            "partners": all_partners
+        A loja é pontuada uma vez contra todo o catálogo; o ranking de cada etapa
+        percorre apenas as linhas da categoria no índice do catálogo.
+        """
+        store_dna = self.dna_service.get_store_dna(store_id)
+        if not store_dna:
+            return {}
+
+        catalog = self.partner_catalog
+        scores = self.scoring_service.score_features_against_catalog(
+            self.scoring_service.compile_store_features(store_dna), catalog
+        )
+        return {
+            stage.value: self._recommendations_from_scores(
+                store_id, scores, catalog.category_rows(STAGE_ORDINALS[stage]), limit, min_score
+            )
+            for stage in (STAGES if stages is None else stages)
         }
 
-        return self.agent_orchestrator.market_agent.execute_action(context)
+    @synchronized
+    def analysis_context(self, store_id: str) -> Optional[AnalysisContext]:
+        """Maturidade, gaps e scores da loja contra todo o catálogo, calculados uma única vez"""
+        store_dna = self.dna_service.get_store_dna(store_id)
+        if not store_dna:
+            return None
+
+        maturity = self.dna_service.analyze_store_maturity(store_id)
+        scores = self.scoring_service.score_features_against_catalog(
+            self.scoring_service.compile_store_features(store_dna), self.partner_catalog
+        )
+        return AnalysisContext(
+            store_dna=store_dna,
+            maturity=maturity,
+            gaps=self.dna_service.gaps_from_maturity(maturity),
+            scores=scores,
+            service=self,
+            partner_ids=list(self.partner_catalog.partner_ids),
+            category_index=self.partner_catalog.category_index.copy()
+        )
+
+    def _recommendations_from_scores(
+        self,
+        store_id: str,
+        scores: Dict[str, np.ndarray],
+        rows: np.ndarray,
+        limit: int,
+        min_score: float,
+        partner_ids: Optional[List[str]] = None
+    ) -> List[FinalRecommendation]:
+        """Ordena linhas do catálogo já pontuadas (scores em ordem de catálogo) e materializa o top-k
+
+        `partner_ids` mapeia linha -> parceiro (padrão: o catálogo atual).
+        """
+        if partner_ids is None:
+            partner_ids = self.partner_catalog.partner_ids
+        final_scores = scores["final_score"]
+        keep = rows[final_scores[rows] >= min_score]
+        order = keep[np.argsort(-final_scores[keep], kind="stable")]
+        return [
+            self.scoring_service.build_recommendation(store_id, partner_ids[row], scores, row)
+            for row in order[:max(limit, 0)]
+        ]
+
+    @synchronized
+    def get_partner_store_scores(
+        self,
+        partner_id: str,
+        component: str = "compatibility_score"
+    ) -> Optional[np.ndarray]:
+        """Scores de um parceiro contra todas as lojas, na ordem de store_table.store_ids"""
+        column = self.partner_catalog.index.get(partner_id)
+        if column is None:
+            return None
+
+        weights = self.scoring_service.weights
+        matrix = self._current_matrix(weights)
+        if matrix is not None and matrix.exact and component in matrix.components and not self._pending_rows:
+            return matrix.column(column, component)
+
+        return self.scoring_service.score_catalog_row_against_stores(
+            self.partner_catalog, column, self.store_table, weights
+        )[component]
+
+    def _rank_partners(
+        self,
+        store_dna: StoreDNA,
+        limit: int,
+        min_score: float,
+        category: Optional[EcommerceStage] = None,
+        rows: Optional[np.ndarray] = None
+    ) -> List[FinalRecommendation]:
+        """Seleciona, ordena e materializa as melhores recomendações de uma loja
+
+        `rows` restringe o ranking a um subconjunto do catálogo (ex.: candidatos).
+        """
+        catalog = self.partner_catalog
+        weights = self.scoring_service.weights  # Um único snapshot de pesos por chamada
+        features = self.scoring_service.compile_store_features(store_dna)
+        row = self.store_table.row_of(store_dna.store_id)
+
+        if rows is None:
+            rows = np.arange(len(catalog)) if category is None else catalog.category_rows(STAGE_ORDINALS[category])
+        elif category is not None:
+            rows = rows[catalog.category_index[rows] == STAGE_ORDINALS[category]]
+
+        # Pré-seleção: linha materializada se houver, senão top-k com poda por limite superior
+        matrix = self._current_matrix(weights)
+        if matrix is not None and row is not None and not self._is_pending(row):
+            candidates = self._matrix_candidates(matrix, row, rows, limit, min_score)
+        else:
+            candidates = self._upper_bound_candidates(features, rows, limit, min_score, weights)
+
+        # Scores exatos apenas dos candidatos
+        scores = self.scoring_service.score_features_against_catalog(
+            features, catalog, rows=candidates, weights=weights
+        )
+        final_scores = scores["final_score"]
+
+        # Filtra por score mínimo e ordena (estável, como o sort da lista)
+        keep = np.flatnonzero(final_scores >= min_score)
+        order = keep[np.argsort(-final_scores[keep], kind="stable")]
+
+        # Materializa apenas as recomendações retornadas
+        return [
+            self.scoring_service.build_recommendation(
+                store_dna.store_id, catalog.partner_ids[candidates[i]], scores, i
+            )
+            for i in order[:limit]
+        ]
+
+    def _matrix_candidates(
+        self,
+        matrix: ScoreMatrix,
+        row: int,
+        rows: np.ndarray,
+        limit: int,
+        min_score: float
+    ) -> np.ndarray:
+        """Candidatos ao top-k lidos da linha materializada da loja
+
+        A tolerância cobre o erro de quantização e garante que nenhum parceiro do
+        top-k exato fique de fora; os candidatos são repontuados exatamente depois.
+        """
+        approx = matrix.row(row)[rows]
+        tolerance = matrix.tolerance
+
+        selected = approx >= min_score - tolerance
+        candidates, approx = rows[selected], approx[selected]
+
+        if 0 < limit < len(candidates):
+            kth = np.partition(approx, -limit)[-limit]
+            candidates = candidates[approx >= kth - 2 * tolerance]
+
+        return candidates
+
+    def _upper_bound_candidates(
+        self,
+        features: StoreFeatures,
+        rows: np.ndarray,
+        limit: int,
+        min_score: float,
+        weights: ScoringWeights
+    ) -> np.ndarray:
+        """Top-k por heap, visitando parceiros em ordem decrescente de limite superior
+
+        Dentro de cada categoria os parceiros ficam ordenados pela parcela do limite
+        que só depende deles; somada à parcela da loja para a categoria, ela limita o
+        score final. Os parceiros são pontuados em blocos e cada categoria é
+        abandonada assim que o limite do próximo bloco fica abaixo do k-ésimo melhor
+        score (ou de min_score), de modo que parceiros que não podem entrar no top-k
+        nunca são pontuados. Retorna as linhas vencedoras em ordem de catálogo.
+        """
+        if limit <= 0 or len(rows) <= limit:
+            return rows
+
+        bound_order = self._upper_bound_order(weights)
+        store_terms = self.scoring_service.store_upper_bound_terms(features, weights)
+        if bound_order is None or store_terms is None:
+            return rows
+
+        in_rows = None
+        if len(rows) < len(self.partner_catalog):
+            in_rows = np.zeros(len(self.partner_catalog), dtype=bool)
+            in_rows[rows] = True
+
+        # Categorias com maior limite primeiro, para o threshold subir cedo
+        categories = []
+        for category, (order, terms) in bound_order.items():
+            if in_rows is not None:
+                selected = in_rows[order]
+                order, terms = order[selected], terms[selected]
+            if len(order):
+                # Folga cobre o arredondamento da soma das parcelas
+                bounds = terms + (store_terms[category] + 1e-9)
+                categories.append((bounds[0], order, bounds))
+        categories.sort(key=lambda x: x[0], reverse=True)
+
+        heap = []  # (score, -linha): o menor item é o k-ésimo melhor, desempate pela linha
+        threshold = min_score
+        block = max(32, 4 * limit)
+
+        for _, order, bounds in categories:
+            for start in range(0, len(order), block):
+                if bounds[start] < threshold:
+                    break  # nenhum parceiro restante da categoria alcança o top-k
+
+                block_rows = order[start:start + block]
+                final_scores = self.scoring_service.score_features_against_catalog(
+                    features, self.partner_catalog, rows=block_rows, weights=weights
+                )["final_score"]
+
+                for i in np.flatnonzero(final_scores >= threshold):
+                    item = (float(final_scores[i]), -int(block_rows[i]))
+                    if len(heap) < limit:
+                        heapq.heappush(heap, item)
+                    elif item > heap[0]:
+                        heapq.heapreplace(heap, item)
+
+                if len(heap) == limit:
+                    threshold = max(min_score, heap[0][0])
+
+        return np.sort(np.array([-neg_row for _, neg_row in heap], dtype=np.int64))
+
+    def _upper_bound_order(
+        self,
+        weights: ScoringWeights
+    ) -> Optional[Dict[int, Tuple[np.ndarray, np.ndarray]]]:
+        """Por categoria, linhas do catálogo em ordem decrescente da parcela de limite do parceiro"""
+        key = (self.partner_catalog.revision, weights.key)
+
+        if self._bound_cache is None or self._bound_cache[0] != key:
+            terms = self.scoring_service.partner_upper_bound_terms(self.partner_catalog, weights)
+            order = None
+            if terms is not None:
+                ranking = np.argsort(-terms, kind="stable")
+                categories = self.partner_catalog.category_index[ranking]
+                order = {}
+                for category in np.unique(categories):
+                    category_rows = ranking[categories == category]
+                    order[int(category)] = (category_rows, terms[category_rows])
+            self._bound_cache = (key, order)
+
+        return self._bound_cache[1]
+
+    @synchronized
+    def set_weights(
+        self,
+        compatibility: Optional[Dict[str, float]] = None,
+        profitability: Optional[Dict[str, float]] = None,
+        compatibility_weight: Optional[float] = None,
+        profitability_weight: Optional[float] = None
+    ) -> ScoringWeights:
+        """Troca os pesos do scoring em tempo de execução, sem repontuar o catálogo
+
+        A matriz com os novos pesos é montada à parte, recombinando o tensor de
+        sub-scores, e só então substitui a atual. Até lá as leituras pontuam ao vivo
+        com os novos pesos, nunca misturando pesos antigos e novos. Sem o tensor
+        (desativado ou acima do orçamento de memória) as linhas são repontuadas.
+
+        Levanta ValueError (sem trocar os pesos) se a matriz tiver perda (float32,
+        float16, uint8) e os novos pesos gerarem scores fora de [0, 1], onde a
+        tolerância da matriz não vale mais.
+        """
+        matrix = self.score_matrix
+        if matrix is not None and not matrix.exact:
+            candidate = self.scoring_service.weights.merged(
+                compatibility, profitability, compatibility_weight, profitability_weight
+            )
+            if not candidate.normalized:
+                raise ValueError(
+                    f"{matrix.dtype_name} score matrix only bounds scores in [0, 1]: weights must be "
+                    "non-negative and compatibility_weight + profitability_weight must not exceed 1"
+                )
+
+        weights = self.scoring_service.set_weights(
+            compatibility, profitability, compatibility_weight, profitability_weight
+        )
+        self._invalidate_recommendations()
+
+        current = self.score_matrix
+        if current is None:
+            self._matrix_weights = weights
+            return weights
+
+        matrix = ScoreMatrix(
+            dtype=current.dtype_name,
+            components=current.components,
+            memory_budget=current.memory_budget,
+            store_capacity=len(self.store_table),
+            partner_capacity=len(self.partner_catalog)
+        )
+        try:
+            matrix.resize(len(self.store_table), len(self.partner_catalog))
+        except MemoryError:
+            self.score_matrix = None
+            self._matrix_weights = weights
+            return weights
+
+        tensor = self.sub_score_tensor
+        if tensor is not None:
+            max_abs = dict.fromkeys(SUB_SCORE_COMPONENTS, 0.0)
+            for start in range(0, matrix.stores, REWEIGHT_CHUNK_ROWS):
+                stop = min(start + REWEIGHT_CHUNK_ROWS, matrix.stores)
+                sub_scores = {component: tensor.block(start, stop, component) for component in SUB_SCORE_COMPONENTS}
+                matrix.set_block(start, self.scoring_service.combine_sub_scores(sub_scores, weights))
+                for component, values in sub_scores.items():
+                    if values.size:
+                        max_abs[component] = max(max_abs[component], float(np.abs(values).max()))
+            # Tensor com perda (float32/float16): a matriz recombinada herda o erro
+            matrix.tolerance = max(matrix.tolerance, self._recombination_tolerance(tensor, weights, max_abs))
+            # Matriz antes da marcação: a combinação intermediária cai no scoring ao vivo
+            self.score_matrix = matrix
+            self._matrix_weights = weights
+        else:
+            with self.deferred_scoring():
+                self.score_matrix = matrix
+                self._matrix_weights = weights
+                self._pending_rows.update(dict.fromkeys(range(matrix.stores)))
+
+        return weights
+
+    @synchronized
+    def rank_weight_profiles(
+        self,
+        profiles: Dict[str, ScoringWeights],
+        store_ids: Optional[List[str]] = None,
+        limit: int = 10,
+        min_score: float = 0.3
+    ) -> Dict[str, Dict[str, List[Tuple[str, float]]]]:
+        """Rankings de cada perfil de pesos para cada loja, a partir de um único cálculo de sub-scores
+
+        As lojas são processadas em blocos: os sub-scores do bloco (lidos do tensor ou
+        calculados uma vez) são recombinados com cada perfil e ordenados como em
+        get_recommendations_for_store. Retorna perfil -> loja -> [(parceiro, score final)].
+        """
+        catalog = self.partner_catalog
+        if store_ids is None:
+            rows = np.arange(len(self.store_table))
+        else:
+            rows = np.array(
+                [row for row in map(self.store_table.row_of, store_ids) if row is not None], dtype=np.int64
+            )
+
+        rankings: Dict[str, Dict[str, List[Tuple[str, float]]]] = {name: {} for name in profiles}
+        for start in range(0, len(rows), REWEIGHT_CHUNK_ROWS):
+            chunk = rows[start:start + REWEIGHT_CHUNK_ROWS]
+            sub_scores = self._sub_score_rows(chunk)
+
+            for name, weights in profiles.items():
+                final_scores = self.scoring_service.combine_sub_scores(sub_scores, weights)["final_score"]
+                ranked_rows = self.scoring_service.rank_rows(final_scores, limit, min_score)
+                for i, (row, ranked) in enumerate(zip(chunk, ranked_rows)):
+                    rankings[name][self.store_table.store_ids[row]] = [
+                        (catalog.partner_ids[column], float(final_scores[i, column])) for column in ranked
+                    ]
+
+        return rankings
+
+    def compare_weight_profiles(
+        self,
+        profiles: Dict[str, ScoringWeights],
+        store_ids: Optional[List[str]] = None,
+        limit: int = 10,
+        min_score: float = 0.3
+    ) -> List[Dict[str, Any]]:
+        """Estatísticas de sobreposição dos rankings entre cada par de perfis de pesos"""
+        return rank_overlap_stats(self.rank_weight_profiles(profiles, store_ids, limit, min_score))
+
+    def _recombination_tolerance(
+        self,
+        tensor: ScoreMatrix,
+        weights: ScoringWeights,
+        max_abs: Dict[str, float]
+    ) -> float:
+        """Erro máximo dos scores recombinados a partir de um tensor com perda
+
+        Cada sub-score lido tem erro de até max_abs × eps/2 (mais meio subnormal);
+        os limites min(1, ·) não ampliam o erro, e a combinação o pondera pelos pesos.
+        """
+        if tensor.exact:
+            return 0.0
+        info = np.finfo(tensor.dtype)
+        scale = {component: weights.compatibility_weight * weight
+                 for component, weight in weights.compatibility.items()}
+        scale.update({component: weights.profitability_weight * weight
+                      for component, weight in weights.profitability.items()})
+        error = sum(
+            abs(scale.get(component, 0.0)) * (max_abs[component] * float(info.eps) / 2 + float(info.smallest_subnormal) / 2)
+            for component in SUB_SCORE_COMPONENTS
+        )
+        # Folga para o arredondamento da própria combinação em float64
+        return error * (1 + 2 ** -20) + 2 ** -40
+
+    def _sub_score_rows(self, rows: np.ndarray) -> Dict[str, np.ndarray]:
+        """Sub-scores (independentes dos pesos) das lojas contra todo o catálogo, len(rows)×parceiros
+
+        Só usa o tensor se ele for exato; com perda, os rankings seriam aproximados.
+        """
+        tensor = self.sub_score_tensor
+        if tensor is not None and tensor.exact and not any(self._is_pending(int(row)) for row in rows):
+            return {component: tensor.take_rows(rows, component) for component in SUB_SCORE_COMPONENTS}
+
+        # Sem tensor: pontua cada loja uma vez, com quaisquer pesos
+        scores = [
+            self.scoring_service.score_features_against_catalog(
+                self.scoring_service.compile_store_features(
+                    self.repository.stores[self.store_table.store_ids[row]]
+                ),
+                self.partner_catalog
+            )
+            for row in rows
+        ]
+        shape = (len(rows), len(self.partner_catalog))
+        return {
+            component: np.array([store_scores[component] for store_scores in scores]).reshape(shape)
+            for component in SUB_SCORE_COMPONENTS
+        }
 
-    def get_partner_performance_analysis(self, partner_id: str) -> Dict[str, Any]:
-        """Analisa performance de um parceiro específico"""
-        partner = self.partners_db.get(partner_id)
+    @synchronized
+    def set_pain_point_table(self, table: PainPointMatchTable):
+        """Troca a tabela de matching de pain points e recompila as features de todas as lojas
+
+        Também deve ser chamado após PainPointMatchTable.update na tabela em uso.
+        """
+        self.scoring_service.pain_point_table = table
+        with self.deferred_scoring():
+            for store_dna in self.repository.stores.values():
+                self._on_store_written(store_dna)
+
+    @contextmanager
+    def deferred_scoring(self):
+        """Adia o recálculo da matriz de scores durante cargas em massa
+
+        As features das lojas gravadas continuam indo para a store_table, mas as
+        linhas da matriz só são recalculadas (em lote) ao sair do bloco. Enquanto
+        isso, leituras dessas lojas pontuam o catálogo ao vivo.
+
+        O bloco segura o lock do repositório, de modo que só as escritas feitas
+        nele são adiadas; não deve ficar aberto à espera de I/O (ex.: entre awaits).
+        """
+        with self.repository.lock:
+            if self._pending_rows is not None:
+                yield  # Já adiando: o bloco mais externo recalcula
+                return
+
+            self._pending_rows = {}
+            try:
+                yield
+            finally:
+                pending, self._pending_rows = self._pending_rows, None
+                self._refresh_store_rows(list(pending))
+
+    def _is_pending(self, row: int) -> bool:
+        return self._pending_rows is not None and row in self._pending_rows
+
+    def _on_store_written(self, store_dna: StoreDNA):
+        """Atualiza a linha da loja na tabela de features e na matriz de scores"""
+        features = self.scoring_service.compile_store_features(store_dna)
+        row = self.store_table.upsert(features)
+        self.recommendation_table.mark_stale(store_dna.store_id)
+
+        if self._pending_rows is not None:
+            self._pending_rows[row] = None
+        else:
+            self._write_row(row, features)
+
+    def _refresh_store_rows(self, rows: List[int]):
+        """Recalcula em lote as linhas da matriz de várias lojas"""
+        if not rows or not self._resize_score_matrices():
+            return
+
+        catalog = self.partner_catalog
+        if len(catalog) < len(rows) and 2 * len(rows) >= len(self.store_table):
+            # Menos parceiros que lojas, e boa parte da tabela a refazer: uma passada
+            # vetorizada por parceiro sobre todas as lojas
+            for column in range(len(catalog)):
+                self._refresh_partner_column(column)
+            return
+
+        for row in rows:
+            features = self.scoring_service.compile_store_features(
+                self.repository.stores[self.store_table.store_ids[row]]
+            )
+            self._write_row(row, features)
+
+    def _write_row(self, row: int, features: StoreFeatures):
+        """Grava a linha da loja na matriz de scores e no tensor de sub-scores"""
+        matrices = self._resize_score_matrices()
+        if matrices:
+            scores = self.scoring_service.score_features_against_catalog(
+                features, self.partner_catalog, weights=self._matrix_weights
+            )
+            for matrix in matrices:
+                matrix.set_row(row, scores)
+
+    def _refresh_partner_column(self, column: int):
+        """Atualiza a coluna do parceiro na matriz de scores e no tensor de sub-scores"""
+        matrices = self._resize_score_matrices()
+        if matrices:
+            scores = self.scoring_service.score_catalog_row_against_stores(
+                self.partner_catalog, column, self.store_table, self._matrix_weights
+            )
+            for matrix in matrices:
+                matrix.set_column(column, scores)
+
+    def _current_matrix(self, weights: ScoringWeights) -> Optional[ScoreMatrix]:
+        """Matriz materializada, se calculada com os pesos informados"""
+        matrix = self.score_matrix
+        return matrix if self._matrix_weights is weights else None
+
+    def _score_matrices(self) -> List[ScoreMatrix]:
+        return [matrix for matrix in (self.score_matrix, self.sub_score_tensor) if matrix is not None]
+
+    def _resize_score_matrices(self) -> List[ScoreMatrix]:
+        """Acompanha o tamanho das matrizes; desativa as que estourarem o orçamento de memória
+
+        Retorna as matrizes ativas. Sem matriz de scores, as leituras voltam a pontuar
+        o catálogo ao vivo; sem tensor, trocas de pesos repontuam as lojas.
+        """
+        size = (len(self.store_table), len(self.partner_catalog))
+        if self.score_matrix is not None:
+            try:
+                self.score_matrix.resize(*size)
+            except MemoryError:
+                self.score_matrix = None
+
+        tensor = self.sub_score_tensor
+        if tensor is not None:
+            # O tensor cabe no que sobra do orçamento depois da matriz de scores
+            if self.memory_budget is not None:
+                used = self.score_matrix.nbytes if self.score_matrix is not None else 0
+                tensor.memory_budget = self.memory_budget - used
+            try:
+                tensor.resize(*size)
+                if tensor.memory_budget is not None and tensor.nbytes > tensor.memory_budget:
+                    raise MemoryError("Sub-score tensor exceeds the remaining memory budget")
+            except MemoryError:
+                self.sub_score_tensor = None
+        return self._score_matrices()
+
+    def generate_market_opportunities(self, consistency_check: bool = False) -> Dict[str, Any]:
+        """Gera análise de oportunidades de mercado
+
+        Lida dos agregados incrementais do repositório (O(1) no tamanho do
+        ecossistema). consistency_check=True compara esses agregados com um
+        recálculo completo e anexa o resultado.
+        """
+        opportunities = self.agent_orchestrator.market_agent.execute_action({})
+        if consistency_check:
+            opportunities["consistency_check"] = self.repository.check_market_aggregates()
+        return opportunities
+
+    @synchronized
+    def get_partner_performance_analysis(
+        self,
+        partner_id: str,
+        offset: int = 0,
+        limit: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Analisa performance de um parceiro específico
+
+        O parceiro é pontuado contra toda a store_table numa única passada
+        vetorizada; só as avaliações da página [offset, offset + limit) são montadas.
+        """
+        partner = self.repository.get_partner(partner_id)
         if not partner:
             return {"error": f"Partner {partner_id} not found"}
 
-        all_stores = list(self.dna_service.stores_db.values())
-        context = {"stores": all_stores}
-
         partner_agent = self.agent_orchestrator.partner_agents.get(partner_id)
-        if partner_agent:
-            return partner_agent.execute_action(context)
+        if not partner_agent:
+            return {"error": f"Partner agent for {partner_id} not found"}
 
-        return {"error": f"Partner agent for {partner_id} not found"}
+        scores = self.scoring_service.score_catalog_row_against_stores(
+            self.partner_catalog, self.partner_catalog.index[partner_id], self.store_table
+        )
+        return partner_agent.evaluate(
+            self.store_table.store_ids, self.repository.stores, scores, offset, limit
+        )
+
+def rank_overlap_stats(rankings: Dict[str, Dict[str, List[Tuple[str, float]]]]) -> List[Dict[str, Any]]:
+    """Compara os rankings de cada par de perfis (saída de rank_weight_profiles)
+
+    Por par: sobreposição média do top-k (itens em comum / maior lista), Jaccard
+    médio e fração das lojas com a mesma primeira recomendação.
+    """
+    names = list(rankings)
+    stats = []
+    for i, first in enumerate(names):
+        for second in names[i + 1:]:
+            overlap = jaccard = top1 = 0.0
+            for store_id, ranked in rankings[first].items():
+                first_ids = [partner_id for partner_id, _ in ranked]
+                second_ids = [partner_id for partner_id, _ in rankings[second].get(store_id, [])]
+                common = len(set(first_ids) & set(second_ids))
+                union = len(set(first_ids) | set(second_ids))
+
+                overlap += common / max(len(first_ids), len(second_ids)) if union else 1.0
+                jaccard += common / union if union else 1.0
+                top1 += first_ids[:1] == second_ids[:1]
+
+            count = len(rankings[first])
+            stats.append({
+                "profiles": [first, second],
+                "stores": count,
+                "mean_overlap": overlap / count if count else 0.0,
+                "mean_jaccard": jaccard / count if count else 0.0,
+                "top1_agreement": top1 / count if count else 0.0
+            })
+    return stats
 
 class OrionOrchestrator:
     """Orquestrador Central do Sistema Órion"""
 
-    def __init__(self):
-        self.dna_service = DNAService()
-        self.scoring_service = ScoringService()
-        self.recommendation_service = RecommendationService()
-        self.agent_orchestrator = AgentOrchestrator()
+    def __init__(
+        self,
+        repository: Optional[EcosystemRepository] = None,
+        matrix_dtype: str = SCORE_MATRIX_DTYPE,
+        memory_budget: Optional[int] = SCORE_MATRIX_MEMORY_BUDGET,
+        keep_sub_scores: bool = False,
+        sub_score_dtype: str = SUB_SCORE_DTYPE
+    ):
+        """matrix_dtype/memory_budget configuram a matriz de scores (memory_budget=None: sem limite)
+
+        keep_sub_scores mantém o tensor de sub-scores: trocar pesos só recombina, sem repontuar.
+        """
+        self.repository = repository or EcosystemRepository()
+        self.dna_service = DNAService(self.repository)
+        self.recommendation_service = RecommendationService(
+            dna_service=self.dna_service,
+            score_matrix=ScoreMatrix(dtype=matrix_dtype, memory_budget=memory_budget),
+            keep_sub_scores=keep_sub_scores,
+            sub_score_dtype=sub_score_dtype
+        )
+        self.scoring_service = self.recommendation_service.scoring_service  # Mesmos pesos das recomendações
 
+        # Um único orquestrador de agentes: os agentes de parceiros são registrados
+        # pelo RecommendationService; mestres e especialistas, aqui
+        self.agent_orchestrator = self.recommendation_service.agent_orchestrator
+        for stage in EcommerceStage:
+            self.agent_orchestrator.register_specialist_agent(stage)
+        for store_id in self.repository.stores:
+            self.agent_orchestrator.register_master_agent(store_id)
+
+    @synchronized
     def onboard_store(self, store_data: Dict[str, Any]) -> Dict[str, Any]:
         """Faz onboarding completo de uma nova loja"""
 
@@ -191,35 +1034,149 @@ class OrionOrchestrator:
 
         return onboarding_result
 
-    def run_full_analysis(self, store_id: str) -> Dict[str, Any]:
-        """Executa análise completa de uma loja usando todos os agentes"""
-
-        store_dna = self.dna_service.get_store_dna(store_id)
-        if not store_dna:
+    def onboard_stores(
+        self,
+        records: Iterable[Any],
+        parse: Optional[Callable[[Any], Dict[str, Any]]] = None,
+        chunk_size: int = BULK_CHUNK_SIZE
+    ) -> Iterator[Dict[str, Any]]:
+        """Onboarding em massa: valida em blocos, grava em lote e adia as recomendações
+
+        Gera um status por registro, na ordem de entrada, e um resumo ao final. As
+        linhas da matriz de scores são recalculadas em lote ao fim de cada bloco
+        (ver onboard_store_chunk); análises e recomendações de cada loja ficam
+        disponíveis pelos endpoints usuais.
+        """
+        summary = {"received": 0, "created": 0, "failed": 0}
+
+        chunk = []
+        for record in records:
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                yield from self.onboard_store_chunk(chunk, summary, parse)
+                chunk = []
+        if chunk:
+            yield from self.onboard_store_chunk(chunk, summary, parse)
+
+        yield {"summary": summary}
+
+    @synchronized
+    def onboard_store_chunk(
+        self,
+        records: List[Any],
+        summary: Dict[str, int],
+        parse: Optional[Callable[[Any], Dict[str, Any]]] = None
+    ) -> List[Dict[str, Any]]:
+        """Valida e grava um bloco do onboarding em massa, retornando o status de cada registro
+
+        As recomendações do bloco são recalculadas em lote após a gravação. Um
+        registro só recebe status "created" depois que o bloco foi gravado; se a
+        gravação falha, todos os registros válidos do bloco recebem o erro.
+        """
+        statuses = []
+        valid = []
+
+        # 1. Valida registro a registro (parse opcional, ex.: JSON + schema da API)
+        for record in records:
+            line = summary["received"]
+            summary["received"] += 1
+            try:
+                store_data = parse(record) if parse else record
+                store_dna = self.dna_service.build_store_dna(store_data)
+            except (KeyError, TypeError, ValueError) as e:
+                summary["failed"] += 1
+                statuses.append({"line": line, "status": "error", "error": str(e)})
+                continue
+
+            valid.append(store_dna)
+            statuses.append({"line": line, "store_id": store_dna.store_id})
+
+        # 2. Grava o bloco de uma vez, com a matriz recalculada em lote ao final
+        try:
+            with self.recommendation_service.deferred_scoring():
+                self.dna_service.save_store_dnas(valid)
+        except Exception as e:
+            outcome = {"status": "error", "error": str(e)}
+            summary["failed"] += len(valid)
+        else:
+            outcome = {"status": "created"}
+            summary["created"] += len(valid)
+            for store_dna in valid:
+                self.agent_orchestrator.register_master_agent(store_dna.store_id)
+
+        # 3. Status dos registros válidos, conforme o resultado da gravação
+        for status in statuses:
+            if "store_id" in status:
+                status.update(outcome)
+        return statuses
+
+    def run_full_analysis(self, store_id: str, scope: str = "store") -> Dict[str, Any]:
+        """Executa análise completa de uma loja usando os agentes
+
+        scope="store" roda apenas os agentes relevantes para a loja (custo
+        independente do tamanho do ecossistema); scope="ecosystem" roda todos.
+        """
+        self._check_scope(scope)
+
+        # Maturidade, gaps e scores calculados uma vez para todas as seções
+        analysis = self.recommendation_service.analysis_context(store_id)
+        if analysis is None:
             return {"error": f"Store {store_id} not found"}
 
-        # Contexto para os agentes
-        all_stores = list(self.dna_service.stores_db.values())
-        all_partners = list(self.recommendation_service.partners_db.values())
+        # Executa análise via agentes
+        context = self._agent_context(analysis, scope)
+        if scope == "store":
+            agent_results = self.agent_orchestrator.execute_store_analysis(context)
+        else:
+            agent_results = self.agent_orchestrator.execute_full_analysis(context)
 
-        context = {
-            "store_id": store_id,
-            "stores": all_stores,
-            "partners": all_partners
-        }
+        return self._full_analysis_result(analysis, agent_results)
 
-        # Executa análise completa via agentes
-        agent_results = self.agent_orchestrator.execute_full_analysis(context)
+    async def run_full_analysis_async(self, store_id: str, scope: str = "store") -> Dict[str, Any]:
+        """Variante assíncrona de run_full_analysis, para uso dentro do event loop
+
+        O scoring (contexto de análise e recomendações) roda no executor padrão
+        do loop e os agentes são aguardados com asyncio.gather; cancelar a tarefa
+        (ex.: cliente desconectado) cancela os agentes ainda pendentes.
+        """
+        self._check_scope(scope)
+        loop = asyncio.get_running_loop()
+
+        analysis = await loop.run_in_executor(None, self.recommendation_service.analysis_context, store_id)
+        if analysis is None:
+            return {"error": f"Store {store_id} not found"}
+
+        context = await loop.run_in_executor(None, self._agent_context, analysis, scope)
+        if scope == "store":
+            agent_results = await self.agent_orchestrator.execute_store_analysis_async(context)
+        else:
+            agent_results = await self.agent_orchestrator.execute_full_analysis_async(context)
+
+        return await loop.run_in_executor(None, self._full_analysis_result, analysis, agent_results)
+
+    def _check_scope(self, scope: str):
+        if scope not in ("store", "ecosystem"):
+            raise ValueError(f"Unknown analysis scope: {scope}")
+
+    def _agent_context(self, analysis: AnalysisContext, scope: str) -> Dict[str, Any]:
+        if scope == "store":
+            return {"store_id": analysis.store_id, "analysis": analysis}
+        with self.repository.lock:
+            return {
+                "store_id": analysis.store_id,
+                "stores": list(self.dna_service.stores_db.values()),
+                "partners": list(self.recommendation_service.partners_db.values()),
+                "analysis": analysis
+            }
+
+    def _full_analysis_result(self, analysis: AnalysisContext, agent_results: Dict[str, Any]) -> Dict[str, Any]:
+        store_id = analysis.store_id
 
         # Gera recomendações atualizadas
-        current_recommendations = self.recommendation_service.get_recommendations_for_store(
-            store_id, limit=8
-        )
+        current_recommendations = analysis.recommendations(limit=8)
 
         # Recomendações priorizadas por área
-        priority_recommendations = self.recommendation_service.get_priority_recommendations(
-            store_id
-        )
+        priority_recommendations = analysis.stage_recommendations(analysis.focus_areas())
 
         full_analysis = {
             "store_id": store_id,
@@ -256,24 +1213,11 @@ class OrionOrchestrator:
 
         return full_analysis
 
+    @synchronized
     def add_partner_to_ecosystem(self, partner_data: Dict[str, Any]) -> Dict[str, Any]:
         """Adiciona novo parceiro ao ecossistema"""
 
-        partner = Partner(
-            partner_id=partner_data["partner_id"],
-            name=partner_data["name"],
-            category=EcommerceStage(partner_data["category"]),
-            subcategory=partner_data.get("subcategory", ""),
-            description=partner_data.get("description", ""),
-            pricing_model=partner_data.get("pricing_model", "fixed"),
-            min_price=partner_data.get("min_price", 0),
-            max_price=partner_data.get("max_price"),
-            target_segments=[StoreSegment(s) for s in partner_data.get("target_segments", [])],
-            target_sizes=[StoreSize(s) for s in partner_data.get("target_sizes", [])],
-            integration_complexity=partner_data.get("integration_complexity", 5),
-            roi_potential=partner_data.get("roi_potential", 5),
-            commission_rate=partner_data.get("commission_rate", 0.1)
-        )
+        partner = self._build_partner(partner_data)
 
         # Adiciona ao catálogo
         self.recommendation_service.add_partner(partner)
@@ -289,62 +1233,118 @@ class OrionOrchestrator:
             "status": "active"
         }
 
+    @synchronized
+    def add_partners_to_ecosystem(self, partners_data: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Importa parceiros em lote, com uma única passada de impacto de mercado"""
+
+        # 1. Valida todos os registros
+        partners = []
+        failed = []
+        for position, partner_data in enumerate(partners_data):
+            try:
+                partners.append(self._build_partner(partner_data))
+            except (KeyError, TypeError, ValueError) as e:
+                failed.append({"line": position, "error": str(e)})
+
+        # 2. Insere todos e pontua parceiros × lojas de uma vez
+        compatibility = self.recommendation_service.add_partners(partners)["compatibility_score"]
+
+        # 3. Impacto de mercado de cada parceiro a partir da mesma matriz
+        added_at = datetime.now()
+        added = [
+            {
+                "partner_id": partner.partner_id,
+                "added_at": added_at,
+                "category": partner.category.value,
+                "market_impact": self._market_impact_from_scores(compatibility[:, i]),
+                "status": "active"
+            }
+            for i, partner in enumerate(partners)
+        ]
+
+        return {
+            "received": len(partners_data),
+            "added": added,
+            "failed": failed
+        }
+
+    def _build_partner(self, partner_data: Dict[str, Any]) -> Partner:
+        """Monta o parceiro a partir dos dados cadastrais"""
+        return Partner(
+            partner_id=partner_data["partner_id"],
+            name=partner_data["name"],
+            category=EcommerceStage(partner_data["category"]),
+            subcategory=partner_data.get("subcategory", ""),
+            description=partner_data.get("description", ""),
+            pricing_model=partner_data.get("pricing_model", "fixed"),
+            min_price=partner_data.get("min_price", 0),
+            max_price=partner_data.get("max_price"),
+            target_segments=[StoreSegment(s) for s in partner_data.get("target_segments", [])],
+            target_sizes=[StoreSize(s) for s in partner_data.get("target_sizes", [])],
+            integration_complexity=partner_data.get("integration_complexity", 5),
+            roi_potential=partner_data.get("roi_potential", 5),
+            commission_rate=partner_data.get("commission_rate", 0.1)
+        )
+
     def _analyze_partner_market_impact(self, partner: Partner) -> Dict[str, Any]:
         """Analisa impacto de um novo parceiro no mercado"""
-        all_stores = list(self.dna_service.stores_db.values())
 
-        potential_matches = 0
-        high_compatibility_stores = []
-
-        for store_dna in all_stores:
-            compatibility = self.scoring_service.calculate_compatibility_score(
-                store_dna, partner
-            )
+        # Coluna do parceiro na matriz materializada (compatibilidade contra todas as lojas)
+        return self._market_impact_from_scores(
+            self.recommendation_service.get_partner_store_scores(partner.partner_id)
+        )
 
-            if compatibility.total_score >= 0.6:
-                potential_matches += 1
+    def _market_impact_from_scores(self, compatibility: np.ndarray) -> Dict[str, Any]:
+        """Resume o impacto de mercado a partir da compatibilidade contra todas as lojas"""
+        store_ids = self.recommendation_service.store_table.store_ids
 
-            if compatibility.total_score >= 0.8:
-                high_compatibility_stores.append({
-                    "store_id": store_dna.store_id,
-                    "store_name": store_dna.name,
-                    "compatibility_score": compatibility.total_score
-                })
+        potential_matches = int(np.count_nonzero(compatibility >= 0.6))
+        high_compatibility_stores = [
+            {
+                "store_id": store_ids[i],
+                "store_name": self.dna_service.get_store_dna(store_ids[i]).name,
+                "compatibility_score": float(compatibility[i])
+            }
+            for i in np.flatnonzero(compatibility >= 0.8)
+        ]
 
         return {
-            "total_stores_analyzed": len(all_stores),
+            "total_stores_analyzed": len(store_ids),
             "potential_matches": potential_matches,
-            "match_percentage": (potential_matches / len(all_stores)) * 100 if all_stores else 0,
+            "match_percentage": (potential_matches / len(store_ids)) * 100 if store_ids else 0,
             "high_compatibility_stores": high_compatibility_stores,
-            "market_opportunity": "high" if potential_matches > len(all_stores) * 0.3 else "medium"
+            "market_opportunity": "high" if potential_matches > len(store_ids) * 0.3 else "medium"
         }
 
     def get_ecosystem_dashboard(self) -> Dict[str, Any]:
         """Gera dashboard do ecossistema completo"""
 
-        all_stores = list(self.dna_service.stores_db.values())
-        all_partners = list(self.recommendation_service.partners_db.values())
+        analytics = self.repository.store_analytics
+        total_stores = len(self.repository.stores)
+        total_partners = len(self.repository.partners)
 
-        # Estatísticas básicas
-        total_revenue = sum(store.monthly_revenue for store in all_stores)
-        avg_conversion = sum(store.conversion_rate for store in all_stores) / len(all_stores) if all_stores else 0
+        # Estatísticas básicas (varreduras colunares)
+        total_revenue = analytics.sum("monthly_revenue")
+        avg_conversion = analytics.mean("conversion_rate")
 
-        # Distribuições
-        segment_dist = {}
-        size_dist = {}
-        for store in all_stores:
-            segment_dist[store.segment.value] = segment_dist.get(store.segment.value, 0) + 1
-            size_dist[store.size.value] = size_dist.get(store.size.value, 0) + 1
-
-        partner_category_dist = {}
-        for partner in all_partners:
-            cat = partner.category.value
-            partner_category_dist[cat] = partner_category_dist.get(cat, 0) + 1
+        # Distribuições lidas dos índices do repositório
+        segment_dist = {
+            segment.value: count
+            for segment, count in self.repository.count_stores_by("segment").items()
+        }
+        size_dist = {
+            size.value: count
+            for size, count in self.repository.count_stores_by("size").items()
+        }
+        partner_category_dist = {
+            category.value: count
+            for category, count in self.repository.count_partners_by("category").items()
+        }
 
         return {
             "ecosystem_overview": {
-                "total_stores": len(all_stores),
-                "total_partners": len(all_partners),
+                "total_stores": total_stores,
+                "total_partners": total_partners,
                 "total_monthly_revenue": total_revenue,
                 "average_conversion_rate": avg_conversion,
                 "last_updated": datetime.now()
@@ -357,8 +1357,8 @@ class OrionOrchestrator:
                 "by_category": partner_category_dist
             },
             "health_metrics": {
-                "stores_with_recommendations": len([s for s in all_stores if s.store_id in self.dna_service.stores_db]),
+                "stores_with_recommendations": total_stores,
                 "active_agents": len(self.agent_orchestrator.agents),
-                "ecosystem_maturity": "growing" if len(all_stores) < 100 else "mature"
+                "ecosystem_maturity": "growing" if total_stores < 100 else "mature"
             }
         }
@@ -0,0 +1,119 @@
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Deque, Dict, List, Optional
+from ..models.entities import FinalRecommendation
+
+# Recomendações guardadas por loja (atende qualquer limit até este valor)
+MATERIALIZED_TOP_N = 20
+
+# Por quanto tempo uma entrada desatualizada ainda pode ser servida
+MAX_STALENESS_SECONDS = 300
+
+@dataclass
+class MaterializedRecommendations:
+    """Top-N de uma loja (min_score 0) e quando foi calculado"""
+    recommendations: List[FinalRecommendation]
+    materialized_at: datetime
+    stale_since: Optional[datetime] = None  # primeira escrita que afetou a loja depois do cálculo
+    generation: int = 0  # geração da tabela no cálculo (ver RecommendationTable.mark_all_stale)
+
+class RecommendationTable:
+    """Tabela materializada de recomendações por loja
+
+    O RecommendationService marca entradas como desatualizadas a cada evento de
+    escrita (DNA da loja, parceiros, pesos, tabela de pain points) e as recalcula
+    em segundo plano (refresh_materialized). Uma entrada desatualizada continua
+    sendo servida por até `max_staleness`; depois disso a leitura pontua ao vivo.
+
+    Escritas que afetam todas as lojas apenas avançam a geração da tabela (O(1));
+    entradas de gerações anteriores são reconhecidas como desatualizadas na
+    leitura e agendadas para recálculo por take_pending.
+    """
+
+    def __init__(
+        self,
+        top_n: int = MATERIALIZED_TOP_N,
+        max_staleness: timedelta = timedelta(seconds=MAX_STALENESS_SECONDS)
+    ):
+        self.top_n = top_n
+        self.max_staleness = max_staleness
+        self.entries: Dict[str, MaterializedRecommendations] = {}
+        self.pending: Dict[str, None] = {}  # Lojas a (re)materializar, em ordem de chegada
+        self.generation = 0
+        # Início das gerações recentes (a última é `generation`); as mais antigas que
+        # max_staleness são descartadas, e suas entradas já não podem ser servidas
+        self._generation_starts: Deque[datetime] = deque()
+        self._swept_generation = 0  # Última geração cujas entradas antigas foram agendadas
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(
+        self,
+        store_id: str,
+        limit: int,
+        min_score: float,
+        now: Optional[datetime] = None
+    ) -> Optional[MaterializedRecommendations]:
+        """Entrada filtrada por limit/min_score, ou None se ausente, insuficiente ou velha demais"""
+        entry = self.entries.get(store_id)
+        if entry is None or limit > self.top_n:
+            return None
+        stale_since = self.stale_since(entry)
+        if stale_since is not None and (now or datetime.now()) - stale_since > self.max_staleness:
+            return None
+
+        recommendations = [r for r in entry.recommendations if r.final_score >= min_score]
+        return MaterializedRecommendations(
+            recommendations[:max(limit, 0)], entry.materialized_at, stale_since, entry.generation
+        )
+
+    def put(self, store_id: str, recommendations: List[FinalRecommendation], now: Optional[datetime] = None):
+        self.entries[store_id] = MaterializedRecommendations(
+            recommendations, now or datetime.now(), generation=self.generation
+        )
+        self.pending.pop(store_id, None)
+
+    def stale_since(self, entry: MaterializedRecommendations) -> Optional[datetime]:
+        """Primeira escrita, da loja ou de toda a tabela, que afetou a entrada depois do cálculo"""
+        if entry.generation == self.generation:
+            return entry.stale_since
+
+        # Início da geração seguinte à do cálculo (descartada: velha demais)
+        index = entry.generation + 1 - (self.generation - len(self._generation_starts) + 1)
+        table_stale_since = self._generation_starts[index] if index >= 0 else datetime.min
+        if entry.stale_since is None:
+            return table_stale_since
+        return min(entry.stale_since, table_stale_since)
+
+    def mark_stale(self, store_id: str, now: Optional[datetime] = None):
+        """Registra uma escrita que afeta a loja e agenda seu recálculo"""
+        entry = self.entries.get(store_id)
+        if entry is not None and entry.stale_since is None:
+            entry.stale_since = now or datetime.now()
+        self.pending[store_id] = None
+
+    def mark_all_stale(self, now: Optional[datetime] = None):
+        """Escrita que afeta todas as lojas (catálogo, pesos, tabela de pain points): nova geração"""
+        now = now or datetime.now()
+        self.generation += 1
+        self._generation_starts.append(now)
+        while len(self._generation_starts) > 1 and now - self._generation_starts[0] > self.max_staleness:
+            self._generation_starts.popleft()
+
+    def take_pending(self, max_stores: Optional[int] = None) -> List[str]:
+        """Lojas a recalcular, em ordem de chegada (permanecem pendentes até o put)
+
+        Esgotadas as escritas por loja, agenda de uma vez as entradas de gerações
+        anteriores (uma passada pelas entradas por geração, fora do caminho de escrita).
+        """
+        if not self.pending and self._swept_generation < self.generation:
+            self._swept_generation = self.generation
+            self.pending.update(
+                (store_id, None) for store_id, entry in self.entries.items() if entry.generation < self.generation
+            )
+
+        store_ids = iter(self.pending)
+        count = len(self.pending) if max_stores is None else min(max_stores, len(self.pending))
+        return [next(store_ids) for _ in range(count)]
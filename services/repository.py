@@ -0,0 +1,210 @@
+import functools
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from ..models.entities import StoreDNA, Partner
+from ..services.persistence import SQLiteBackend
+from ..services.store_table import StoreAnalyticsTable
+from ..services.market_aggregates import MarketAggregates
+
+# Campos indexados e como extrair as chaves de cada entidade
+STORE_INDEXES: Dict[str, Callable[[StoreDNA], List[Any]]] = {
+    "segment": lambda store: [store.segment],
+    "size": lambda store: [store.size],
+    "pain_point": lambda store: list(store.pain_points)
+}
+
+PARTNER_INDEXES: Dict[str, Callable[[Partner], List[Any]]] = {
+    "category": lambda partner: [partner.category],
+    "segment": lambda partner: list(partner.target_segments),
+    "size": lambda partner: list(partner.target_sizes)
+}
+
+def synchronized(method: Callable) -> Callable:
+    """Executa o método segurando o lock do repositório do objeto (self.repository.lock)"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.repository.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+class EcosystemRepository:
+    """Repositório único de lojas e parceiros, com índices secundários
+
+    É compartilhado por serviços e agentes (DNAService, RecommendationService,
+    AgentOrchestrator), de modo que todos enxergam os mesmos dados. Os índices
+    são mantidos a cada escrita e preservam a ordem de inserção.
+
+    Com um backend (SQLiteBackend) as escritas são gravadas em disco e os dicts em
+    memória funcionam como cache read-through: são carregados na inicialização e
+    completados sob demanda, de modo que o caminho de scoring nunca lê do disco.
+
+    `lock` (reentrante) serializa as escritas: o repositório o segura em cada
+    gravação (inclusive nos listeners) e os serviços derivados o usam, via
+    `synchronized`, nas operações que leem ou alteram seu estado derivado.
+    """
+
+    def __init__(self, backend: Optional[SQLiteBackend] = None):
+        self.backend = backend
+        self.lock = threading.RLock()
+        self.stores: Dict[str, StoreDNA] = {}
+        self.partners: Dict[str, Partner] = {}
+        self.store_listeners: List[Callable[[StoreDNA], None]] = []  # Notificados a cada escrita
+        # Notificados quando um parceiro gravado por outro processo é carregado (read-through)
+        self.partner_listeners: List[Callable[[Partner], None]] = []
+        self.store_analytics = StoreAnalyticsTable()  # Espelho colunar para agregações
+        # Contadores de mercado, atualizados a cada escrita (contagens lidas dos índices)
+        self.market_aggregates = MarketAggregates(
+            self.store_analytics, self.count_stores_by, self.count_partners_by
+        )
+
+        # campo -> chave -> ids (dict como conjunto ordenado)
+        self._store_index: Dict[str, Dict[Any, Dict[str, None]]] = {name: {} for name in STORE_INDEXES}
+        self._partner_index: Dict[str, Dict[Any, Dict[str, None]]] = {name: {} for name in PARTNER_INDEXES}
+
+        # Chaves indexadas de cada entidade, para reindexar em atualizações
+        self._store_keys: Dict[str, Dict[str, List[Any]]] = {}
+        self._partner_keys: Dict[str, Dict[str, List[Any]]] = {}
+
+        if backend is not None:
+            for store in backend.iter_stores():
+                self._cache_store(store)
+            for partner in backend.iter_partners():
+                self._cache_partner(partner)
+
+    # Lojas
+
+    def add_store_listener(self, listener: Callable[[StoreDNA], None]):
+        """Registra callback chamado após cada criação/atualização de loja"""
+        self.store_listeners.append(listener)
+
+    def save_store(self, store: StoreDNA) -> StoreDNA:
+        """Insere ou atualiza uma loja e seus índices"""
+        return self.save_stores([store])[0]
+
+    def save_stores(self, stores: Iterable[StoreDNA]) -> List[StoreDNA]:
+        """Insere ou atualiza lojas em lote (um executemany por lote no backend)"""
+        stores = list(stores)
+        with self.lock:
+            if self.backend is not None:
+                self.backend.upsert_stores(stores)
+
+            for store in stores:
+                self._cache_store(store)
+                for listener in self.store_listeners:
+                    listener(store)
+        return stores
+
+    def get_store(self, store_id: str) -> Optional[StoreDNA]:
+        store = self.stores.get(store_id)
+        if store is None and self.backend is not None:
+            with self.lock:
+                # Read-through: loja gravada por outro processo
+                store = self.stores.get(store_id) or self.backend.get_store(store_id)
+                if store is not None and store_id not in self.stores:
+                    self._cache_store(store)
+                    for listener in self.store_listeners:
+                        listener(store)
+        return store
+
+    def store_ids_by(self, field: str, key: Any) -> List[str]:
+        """Ids das lojas com um valor de campo indexado (segment, size, pain_point)"""
+        return list(self._store_index[field].get(key, {}))
+
+    def stores_by(self, field: str, key: Any) -> List[StoreDNA]:
+        return [self.stores[store_id] for store_id in self._store_index[field].get(key, {})]
+
+    def count_stores_by(self, field: str) -> Dict[Any, int]:
+        """Contagem de lojas por valor de um campo indexado - O(valores distintos)"""
+        return {key: len(ids) for key, ids in self._store_index[field].items()}
+
+    # Parceiros
+
+    def save_partner(self, partner: Partner) -> Partner:
+        """Insere ou atualiza um parceiro e seus índices"""
+        return self.save_partners([partner])[0]
+
+    def save_partners(self, partners: Iterable[Partner]) -> List[Partner]:
+        """Insere ou atualiza parceiros em lote"""
+        partners = list(partners)
+        with self.lock:
+            if self.backend is not None:
+                self.backend.upsert_partners(partners)
+
+            for partner in partners:
+                self._cache_partner(partner)
+        return partners
+
+    def remove_partner(self, partner_id: str) -> Optional[Partner]:
+        with self.lock:
+            partner = self.partners.pop(partner_id, None)
+            if partner:
+                if self.backend is not None:
+                    self.backend.delete_partner(partner_id)
+                self._unindex(partner_id, self._partner_index, self._partner_keys)
+        return partner
+
+    def add_partner_listener(self, listener: Callable[[Partner], None]):
+        """Registra callback chamado quando get_partner carrega um parceiro do backend"""
+        self.partner_listeners.append(listener)
+
+    def get_partner(self, partner_id: str) -> Optional[Partner]:
+        partner = self.partners.get(partner_id)
+        if partner is None and self.backend is not None:
+            with self.lock:
+                # Read-through: parceiro gravado por outro processo
+                partner = self.partners.get(partner_id) or self.backend.get_partner(partner_id)
+                if partner is not None and partner_id not in self.partners:
+                    self._cache_partner(partner)
+                    for listener in self.partner_listeners:
+                        listener(partner)
+        return partner
+
+    def partner_ids_by(self, field: str, key: Any) -> List[str]:
+        """Ids dos parceiros com um valor de campo indexado (category, segment, size)"""
+        return list(self._partner_index[field].get(key, {}))
+
+    def partners_by(self, field: str, key: Any) -> List[Partner]:
+        return [self.partners[partner_id] for partner_id in self._partner_index[field].get(key, {})]
+
+    def count_partners_by(self, field: str) -> Dict[Any, int]:
+        """Contagem de parceiros por valor de um campo indexado - O(valores distintos)"""
+        return {key: len(ids) for key, ids in self._partner_index[field].items()}
+
+    # Agregados de mercado
+
+    def check_market_aggregates(self) -> Dict[str, Any]:
+        """Compara os agregados incrementais com um recálculo completo (O(lojas + parceiros))"""
+        with self.lock:
+            expected = MarketAggregates.from_entities(self.stores.values(), self.partners.values())
+            return self.market_aggregates.compare(expected)
+
+    # Manutenção do cache e dos índices
+
+    def _cache_store(self, store: StoreDNA):
+        self.stores[store.store_id] = store
+        self._reindex(store.store_id, store, STORE_INDEXES, self._store_index, self._store_keys)
+        self.market_aggregates.upsert_store(store)  # antes da tabela: lê a contribuição anterior
+        self.store_analytics.upsert(store)
+
+    def _cache_partner(self, partner: Partner):
+        self.partners[partner.partner_id] = partner
+        self._reindex(partner.partner_id, partner, PARTNER_INDEXES, self._partner_index, self._partner_keys)
+
+    def _reindex(self, entity_id: str, entity: Any, extractors: Dict, index: Dict, keys: Dict):
+        self._unindex(entity_id, index, keys)
+
+        entity_keys = {}
+        for field, extract in extractors.items():
+            entity_keys[field] = extract(entity)
+            for key in entity_keys[field]:
+                index[field].setdefault(key, {})[entity_id] = None
+        keys[entity_id] = entity_keys
+
+    def _unindex(self, entity_id: str, index: Dict, keys: Dict):
+        for field, field_keys in keys.pop(entity_id, {}).items():
+            for key in field_keys:
+                ids = index[field].get(key)
+                if ids is not None:
+                    ids.pop(entity_id, None)
+                    if not ids:
+                        del index[field][key]
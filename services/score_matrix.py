@@ -0,0 +1,182 @@
+import numpy as np
+from typing import Dict, Optional, Tuple
+
+# Tipos suportados e o erro máximo de leitura (em unidades de score) de cada um, válido para
+# scores em [0, 1] (erro relativo do float e passo da quantização uint8)
+MATRIX_DTYPES = {
+    "float64": (np.float64, 0.0),
+    "float32": (np.float32, 2.0 ** -24),
+    "float16": (np.float16, 2.0 ** -11),
+    "uint8": (np.uint8, 0.5 / 255)  # quantização linear de [0, 1] em 256 níveis
+}
+
+SCORE_COMPONENTS = ("compatibility_score", "profitability_score", "final_score")
+
+# Sub-scores independentes dos pesos, na ordem em que o ScoringService os combina
+SUB_SCORE_COMPONENTS = (
+    "segment_match", "size_match", "pain_point_match", "priority_match",
+    "commission_potential", "implementation_cost", "retention_probability"
+)
+
+# Tipos aceitos para o tensor de sub-scores (a quantização uint8 limitaria os valores a [0, 1])
+SUB_SCORE_DTYPES = ("float64", "float32", "float16")
+
+class ScoreMatrix:
+    """Matriz materializada loja×parceiro com os scores de compatibilidade, rentabilidade e final
+
+    A matriz é posicional: as linhas seguem a StoreTable e as colunas seguem o
+    PartnerCatalog do RecommendationService, que mantém as três estruturas em
+    sincronia (linha recalculada em escritas de DNA, coluna em add_partner).
+
+    Para caber em orçamentos de memória grandes (ex.: 100k lojas × 10k parceiros)
+    os scores podem ser guardados em float32/float16 ou quantizados em uint8
+    (3 bytes por par com os três componentes, 1 byte guardando apenas o final).
+    `tolerance` informa o erro máximo de leitura do tipo escolhido para scores em
+    [0, 1]: com qualquer tipo com perda (não `exact`) o RecommendationService recusa
+    pesos que levariam o score para fora da faixa (ScoringWeights.normalized).
+
+    Com components=SUB_SCORE_COMPONENTS a mesma estrutura guarda o tensor de
+    sub-scores (independente dos pesos) usado para reaplicar pesos sem rescoring;
+    uma matriz recombinada de um tensor com perda recebe a tolerância dele.
+    """
+
+    def __init__(
+        self,
+        dtype: str = "float64",
+        components: Tuple[str, ...] = SCORE_COMPONENTS,
+        memory_budget: Optional[int] = None,
+        store_capacity: int = 64,
+        partner_capacity: int = 16
+    ):
+        if dtype not in MATRIX_DTYPES:
+            raise ValueError(f"Unsupported score matrix dtype: {dtype}")
+        unknown = set(components) - set(SCORE_COMPONENTS) - set(SUB_SCORE_COMPONENTS)
+        if unknown:
+            raise ValueError(f"Unknown score components: {sorted(unknown)}")
+
+        self.dtype_name = dtype
+        self.dtype, self.tolerance = MATRIX_DTYPES[dtype]
+        self.components = tuple(components)
+        self.memory_budget = memory_budget  # em bytes; None = sem limite
+
+        self.stores = 0
+        self.partners = 0
+        self._matrices: Dict[str, np.ndarray] = {}
+        self._allocate(max(1, store_capacity), max(1, partner_capacity))
+
+    @property
+    def exact(self) -> bool:
+        """Indica se as leituras reproduzem exatamente os scores calculados"""
+        return self.tolerance == 0.0
+
+    @property
+    def nbytes(self) -> int:
+        """Memória alocada pelas matrizes"""
+        return sum(matrix.nbytes for matrix in self._matrices.values())
+
+    def resize(self, stores: int, partners: int):
+        """Ajusta o número de linhas/colunas válidas, crescendo os buffers se necessário
+
+        Levanta MemoryError (sem alterar a matriz) se o crescimento exceder o orçamento.
+        """
+        store_capacity, partner_capacity = self._capacity()
+
+        if stores > store_capacity or partners > partner_capacity:
+            new_stores = self._grow(store_capacity, stores)
+            new_partners = self._grow(partner_capacity, partners)
+
+            if not self._fits(new_stores, new_partners):
+                # Tenta alocar apenas o necessário antes de desistir
+                new_stores = max(stores, self.stores)
+                new_partners = max(partners, self.partners)
+                if not self._fits(new_stores, new_partners):
+                    raise MemoryError(
+                        f"Score matrix for {stores} stores x {partners} partners "
+                        f"exceeds memory budget of {self.memory_budget} bytes"
+                    )
+
+            self._allocate(new_stores, new_partners)
+
+        self.stores = stores
+        self.partners = partners
+
+    def set_row(self, row: int, scores: Dict[str, np.ndarray]):
+        """Grava a linha de uma loja (scores contra todo o catálogo)"""
+        for component, matrix in self._matrices.items():
+            matrix[row, :self.partners] = self._encode(scores[component])
+
+    def set_column(self, column: int, scores: Dict[str, np.ndarray]):
+        """Grava a coluna de um parceiro (scores contra todas as lojas)"""
+        for component, matrix in self._matrices.items():
+            matrix[:self.stores, column] = self._encode(scores[component])
+
+    def set_columns(self, columns: np.ndarray, scores: Dict[str, np.ndarray]):
+        """Grava as colunas de vários parceiros (matrizes loja×parceiro na ordem de `columns`)"""
+        for component, matrix in self._matrices.items():
+            matrix[:self.stores, columns] = self._encode(scores[component])
+
+    def set_block(self, start: int, scores: Dict[str, np.ndarray]):
+        """Grava um bloco de linhas consecutivas a partir de `start` (matrizes linhas×parceiros)"""
+        for component, matrix in self._matrices.items():
+            values = scores[component]
+            matrix[start:start + len(values), :self.partners] = self._encode(values)
+
+    def remove_column(self, column: int):
+        """Remove a coluna de um parceiro deslocando as seguintes (como o PartnerCatalog)"""
+        for matrix in self._matrices.values():
+            matrix[:self.stores, column:self.partners - 1] = matrix[:self.stores, column + 1:self.partners]
+        self.partners -= 1
+
+    def row(self, row: int, component: str = "final_score") -> np.ndarray:
+        """Lê os scores de uma loja contra todo o catálogo - O(P)"""
+        return self._decode(self._matrices[component][row, :self.partners])
+
+    def column(self, column: int, component: str = "final_score") -> np.ndarray:
+        """Lê os scores de um parceiro contra todas as lojas - O(S)"""
+        return self._decode(self._matrices[component][:self.stores, column])
+
+    def block(self, start: int, stop: int, component: str = "final_score") -> np.ndarray:
+        """Lê as linhas [start, stop) contra todo o catálogo"""
+        return self._decode(self._matrices[component][start:stop, :self.partners])
+
+    def take_rows(self, rows: np.ndarray, component: str = "final_score") -> np.ndarray:
+        """Lê linhas arbitrárias contra todo o catálogo (matriz len(rows)×parceiros)"""
+        return self._decode(self._matrices[component][rows, :self.partners])
+
+    def value(self, row: int, column: int, component: str = "final_score") -> float:
+        """Lê o score de um par loja×parceiro - O(1)"""
+        return float(self._decode(self._matrices[component][row, column]))
+
+    def _encode(self, values: np.ndarray) -> np.ndarray:
+        if self.dtype == np.uint8:
+            return np.rint(np.clip(values, 0.0, 1.0) * 255).astype(np.uint8)
+        return values
+
+    def _decode(self, values: np.ndarray) -> np.ndarray:
+        if self.dtype == np.uint8:
+            return values.astype(np.float64) / 255
+        return values.astype(np.float64)
+
+    def _capacity(self) -> Tuple[int, int]:
+        return next(iter(self._matrices.values())).shape if self._matrices else (0, 0)
+
+    def _grow(self, capacity: int, required: int) -> int:
+        capacity = max(1, capacity)
+        while capacity < required:
+            capacity *= 2
+        return capacity
+
+    def _fits(self, stores: int, partners: int) -> bool:
+        if self.memory_budget is None:
+            return True
+        itemsize = np.dtype(self.dtype).itemsize
+        return stores * partners * itemsize * len(self.components) <= self.memory_budget
+
+    def _allocate(self, store_capacity: int, partner_capacity: int):
+        """Realoca os buffers preservando a região válida"""
+        for component in self.components:
+            grown = np.zeros((store_capacity, partner_capacity), dtype=self.dtype)
+            current = self._matrices.get(component)
+            if current is not None:
+                grown[:self.stores, :self.partners] = current[:self.stores, :self.partners]
+            self._matrices[component] = grown
@@ -1,32 +1,148 @@
 
 import math
+import threading
+import numpy as np
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Dict, List, Optional
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Tuple
 from ..models.entities import (
     StoreDNA, Partner, CompatibilityScore, 
     ProfitabilityScore, FinalRecommendation
 )
+from ..services.pain_points import DEFAULT_PAIN_POINT_TABLE, PainPointMatchTable
+from ..services.partner_catalog import (
+    PartnerCatalog, SEGMENT_ORDINALS, SIZE_ORDINALS, STAGE_ORDINALS, STAGES
+)
+from ..services.store_table import StoreFeatures, StoreTable
+
+DEFAULT_COMPATIBILITY_WEIGHTS = {
+    "segment_match": 0.3,
+    "size_match": 0.25,
+    "pain_point_match": 0.25,
+    "priority_match": 0.2
+}
+
+DEFAULT_PROFITABILITY_WEIGHTS = {
+    "commission_potential": 0.4,
+    "implementation_cost": 0.3,
+    "retention_probability": 0.3
+}
+
+@dataclass(frozen=True, eq=False)
+class ScoringWeights:
+    """Snapshot imutável dos pesos do scoring (sub-scores e divisão final)"""
+    compatibility: Mapping[str, float] = field(default_factory=lambda: dict(DEFAULT_COMPATIBILITY_WEIGHTS))
+    profitability: Mapping[str, float] = field(default_factory=lambda: dict(DEFAULT_PROFITABILITY_WEIGHTS))
+    compatibility_weight: float = 0.7
+    profitability_weight: float = 0.3
+    key: Tuple = field(init=False)  # Identifica a configuração em chaves de cache
+
+    def __post_init__(self):
+        for name, weights, expected in [
+            ("compatibility", self.compatibility, DEFAULT_COMPATIBILITY_WEIGHTS),
+            ("profitability", self.profitability, DEFAULT_PROFITABILITY_WEIGHTS)
+        ]:
+            if set(weights) != set(expected):
+                raise ValueError(f"{name} weights must have exactly the keys {sorted(expected)}")
+            # Ordem fixa das chaves e visão somente leitura
+            object.__setattr__(self, name, MappingProxyType({key: float(weights[key]) for key in expected}))
+
+        object.__setattr__(self, "key", (
+            tuple(self.compatibility.items()),
+            tuple(self.profitability.items()),
+            float(self.compatibility_weight),
+            float(self.profitability_weight)
+        ))
+
+    def merged(
+        self,
+        compatibility: Optional[Dict[str, float]] = None,
+        profitability: Optional[Dict[str, float]] = None,
+        compatibility_weight: Optional[float] = None,
+        profitability_weight: Optional[float] = None
+    ) -> "ScoringWeights":
+        """Novo snapshot com os pesos informados mesclados aos atuais"""
+        return ScoringWeights(
+            compatibility={**self.compatibility, **(compatibility or {})},
+            profitability={**self.profitability, **(profitability or {})},
+            compatibility_weight=(
+                self.compatibility_weight if compatibility_weight is None else compatibility_weight
+            ),
+            profitability_weight=(
+                self.profitability_weight if profitability_weight is None else profitability_weight
+            )
+        )
+
+    @property
+    def normalized(self) -> bool:
+        """Indica se os scores ficam em [0, 1]: pesos não negativos e divisão final somando até 1
+
+        Os sub-scores são não negativos e os scores de compatibilidade e rentabilidade
+        são limitados a 1, então só a divisão final pode levar o score acima de 1.
+        """
+        weights = list(self.compatibility.values()) + list(self.profitability.values())
+        return (
+            min(weights + [self.compatibility_weight, self.profitability_weight]) >= 0 and
+            self.compatibility_weight + self.profitability_weight <= 1.0 + 1e-9
+        )
+
+    def __reduce__(self):
+        # MappingProxyType não é serializável; reconstrói a partir de dicts
+        return (ScoringWeights, (
+            dict(self.compatibility), dict(self.profitability),
+            self.compatibility_weight, self.profitability_weight
+        ))
 
 class ScoringService:
     """Serviço responsável por calcular scores de compatibilidade e rentabilidade"""
 
-    def __init__(self):
-        self.compatibility_weights = {
-            "segment_match": 0.3,
-            "size_match": 0.25,
-            "pain_point_match": 0.25,
-            "priority_match": 0.2
-        }
+    def __init__(self, pain_point_table: Optional[PainPointMatchTable] = None):
+        self.pain_point_table = pain_point_table or DEFAULT_PAIN_POINT_TABLE
 
-        self.profitability_weights = {
-            "commission_potential": 0.4,
-            "implementation_cost": 0.3,
-            "retention_probability": 0.3
-        }
+        self.weights = ScoringWeights()
+        self._weights_lock = threading.Lock()
+
+    def __getstate__(self):
+        # O lock fica no processo de origem (ex.: agentes enviados a um pool de processos)
+        state = dict(self.__dict__)
+        del state["_weights_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._weights_lock = threading.Lock()
+
+    @property
+    def compatibility_weights(self) -> Mapping[str, float]:
+        return self.weights.compatibility
+
+    @property
+    def profitability_weights(self) -> Mapping[str, float]:
+        return self.weights.profitability
+
+    def set_weights(
+        self,
+        compatibility: Optional[Dict[str, float]] = None,
+        profitability: Optional[Dict[str, float]] = None,
+        compatibility_weight: Optional[float] = None,
+        profitability_weight: Optional[float] = None
+    ) -> "ScoringWeights":
+        """Troca os pesos atomicamente; campos omitidos mantêm o valor atual
+
+        Pesos parciais são mesclados aos atuais. Cada chamada de scoring lê um único
+        snapshot de `weights`, então nunca combina pesos antigos e novos.
+        """
+        with self._weights_lock:
+            weights = self.weights.merged(
+                compatibility, profitability, compatibility_weight, profitability_weight
+            )
+            self.weights = weights
+        return weights
 
     def calculate_compatibility_score(
-        self, 
-        store_dna: StoreDNA, 
+        self,
+        store_dna: StoreDNA,
         partner: Partner
     ) -> CompatibilityScore:
         """Calcula score de compatibilidade entre loja e parceiro"""
@@ -38,17 +154,18 @@ class ScoringService:
         size_match = 1.0 if store_dna.size in partner.target_sizes else 0.5
 
         # 3. Match com pain points (simulado)
-        pain_point_match = self._calculate_pain_point_match(store_dna.pain_points, partner)
+        pain_point_match = self._calculate_pain_point_match(store_dna, partner)
 
         # 4. Match com prioridades da loja
         priority_match = self._calculate_priority_match(store_dna.priorities, partner)
 
         # Score total ponderado
+        weights = self.weights.compatibility
         total_score = (
-            segment_match * self.compatibility_weights["segment_match"] +
-            size_match * self.compatibility_weights["size_match"] +
-            pain_point_match * self.compatibility_weights["pain_point_match"] +
-            priority_match * self.compatibility_weights["priority_match"]
+            segment_match * weights["segment_match"] +
+            size_match * weights["size_match"] +
+            pain_point_match * weights["pain_point_match"] +
+            priority_match * weights["priority_match"]
         )
 
         return CompatibilityScore(
@@ -63,8 +180,8 @@ class ScoringService:
         )
 
     def calculate_profitability_score(
-        self, 
-        store_dna: StoreDNA, 
+        self,
+        store_dna: StoreDNA,
         partner: Partner
     ) -> ProfitabilityScore:
         """Calcula score de rentabilidade para a plataforma"""
@@ -80,10 +197,11 @@ class ScoringService:
         retention_probability = partner.roi_potential / 10.0
 
         # Score total ponderado
+        weights = self.weights.profitability
         total_score = (
-            commission_potential * self.profitability_weights["commission_potential"] +
-            implementation_cost * self.profitability_weights["implementation_cost"] +
-            retention_probability * self.profitability_weights["retention_probability"]
+            commission_potential * weights["commission_potential"] +
+            implementation_cost * weights["implementation_cost"] +
+            retention_probability * weights["retention_probability"]
         )
 
         return ProfitabilityScore(
@@ -100,10 +218,18 @@ class ScoringService:
         self,
         compatibility: CompatibilityScore,
         profitability: ProfitabilityScore,
-        compatibility_weight: float = 0.7,
-        profitability_weight: float = 0.3
+        compatibility_weight: Optional[float] = None,
+        profitability_weight: Optional[float] = None
     ) -> FinalRecommendation:
-        """Calcula recomendação final balanceando compatibilidade e rentabilidade"""
+        """Calcula recomendação final balanceando compatibilidade e rentabilidade
+
+        Sem pesos explícitos, usa a divisão atual de `weights` (0.7/0.3 por padrão).
+        """
+        weights = self.weights
+        if compatibility_weight is None:
+            compatibility_weight = weights.compatibility_weight
+        if profitability_weight is None:
+            profitability_weight = weights.profitability_weight
 
         final_score = (
             compatibility.total_score * compatibility_weight +
@@ -111,21 +237,14 @@ class ScoringService:
         )
 
         # Determina prioridade
-        if final_score >= 0.8:
-            priority = 1  # Alta
-        elif final_score >= 0.6:
-            priority = 2  # Média
-        else:
-            priority = 3  # Baixa
+        priority = self._determine_priority(final_score)
 
         # Gera reasoning
-        reasoning = []
-        if compatibility.segment_match > 0.8:
-            reasoning.append("Forte compatibilidade com segmento da loja")
-        if profitability.commission_potential > 0.6:
-            reasoning.append("Alto potencial de receita para a plataforma")
-        if compatibility.pain_point_match > 0.7:
-            reasoning.append("Resolve pain points identificados")
+        reasoning = self._generate_reasoning(
+            compatibility.segment_match,
+            profitability.commission_potential,
+            compatibility.pain_point_match
+        )
 
         return FinalRecommendation(
             store_id=compatibility.store_id,
@@ -140,27 +259,294 @@ class ScoringService:
             created_at=datetime.now()
         )
 
-    def _calculate_pain_point_match(self, pain_points: List[str], partner: Partner) -> float:
-        """Calcula match com pain points (simulado)"""
-        if not pain_points:
-            return 0.5
+    def compile_store_features(self, store_dna: StoreDNA) -> StoreFeatures:
+        """Pré-compila as features da loja por categoria de parceiro"""
+
+        # Pain points: mesmo cálculo de _calculate_pain_point_match para cada etapa
+        profile = self.pain_point_table.profile_for(store_dna)
+        pain_point_by_category = np.array(
+            [profile.match(ordinal) for ordinal in range(len(STAGES))],
+            dtype=np.float64
+        )
+
+        # Prioridades: mesmo cálculo de _calculate_priority_match para cada etapa
+        if store_dna.priorities:
+            priority_by_category = np.array(
+                [store_dna.priorities.get(stage.value, 5) / 10.0 for stage in STAGES],
+                dtype=np.float64
+            )
+        else:
+            priority_by_category = np.full(len(STAGES), 0.5, dtype=np.float64)
+
+        return StoreFeatures(
+            store_id=store_dna.store_id,
+            segment_ordinal=SEGMENT_ORDINALS[store_dna.segment],
+            size_ordinal=SIZE_ORDINALS[store_dna.size],
+            pain_point_by_category=pain_point_by_category,
+            priority_by_category=priority_by_category,
+            revenue_factor=min(1.0, store_dna.monthly_revenue / 100000)
+        )
+
+    def score_store_against_catalog(
+        self,
+        store_dna: StoreDNA,
+        catalog: PartnerCatalog
+    ) -> Dict[str, np.ndarray]:
+        """Calcula todos os scores de uma loja contra o catálogo inteiro em operações vetoriais
 
-        # Simulação: alguns pain points matcham com categorias de parceiros
-        category_matches = {
-            "baixa_conversao": ["3_navegacao", "4_produto", "5_carrinho"],
-            "alto_cac": ["1_atracao"],
-            "logistica_cara": ["7_fulfillment", "8_entrega"],
-            "pagamentos": ["6_pagamento"],
-            "atendimento": ["9_pos_venda"]
+        Os valores são bit a bit idênticos aos do caminho escalar
+        (calculate_compatibility_score / calculate_profitability_score /
+        calculate_final_recommendation), na ordem das linhas do catálogo.
+        """
+        features = self.compile_store_features(store_dna)
+        return self.score_features_against_catalog(features, catalog)
+
+    def score_features_against_catalog(
+        self,
+        features: StoreFeatures,
+        catalog: PartnerCatalog,
+        rows: Optional[np.ndarray] = None,
+        weights: Optional["ScoringWeights"] = None
+    ) -> Dict[str, np.ndarray]:
+        """Versão de score_store_against_catalog para features já compiladas
+
+        Se `rows` for informado, pontua apenas essas linhas do catálogo (na ordem dada).
+        """
+        segment_mask = catalog.segment_mask
+        size_mask = catalog.size_mask
+        category_index = catalog.category_index
+        commission_rate = catalog.commission_rate
+        implementation_cost = catalog.implementation_cost
+        retention_probability = catalog.retention_probability
+
+        if rows is not None:
+            segment_mask = segment_mask[rows]
+            size_mask = size_mask[rows]
+            category_index = category_index[rows]
+            commission_rate = commission_rate[rows]
+            implementation_cost = implementation_cost[rows]
+            retention_probability = retention_probability[rows]
+
+        sub_scores = {
+            "segment_match": np.where(segment_mask & (1 << features.segment_ordinal), 1.0, 0.3),
+            "size_match": np.where(size_mask & (1 << features.size_ordinal), 1.0, 0.5),
+            "pain_point_match": features.pain_point_by_category[category_index],
+            "priority_match": features.priority_by_category[category_index],
+            "commission_potential": commission_rate * features.revenue_factor,
+            "implementation_cost": implementation_cost,
+            "retention_probability": retention_probability
         }
 
-        matches = 0
-        for pain_point in pain_points:
-            for pain_type, categories in category_matches.items():
-                if pain_point in pain_type and partner.category.value in categories:
-                    matches += 1
+        return self.combine_sub_scores(sub_scores, weights)
+
+    def score_catalog_row_against_stores(
+        self,
+        catalog: PartnerCatalog,
+        row: int,
+        store_table: StoreTable,
+        weights: Optional["ScoringWeights"] = None
+    ) -> Dict[str, np.ndarray]:
+        """Calcula todos os scores de um parceiro do catálogo contra todas as lojas da tabela
+
+        Mesmas operações de score_features_against_catalog, na direção das lojas:
+        os valores são bit a bit idênticos aos do caminho escalar, na ordem das linhas da tabela.
+        """
+        scores = self.score_catalog_rows_against_stores(
+            catalog, np.array([row]), store_table, weights
+        )
+        return {name: values[:, 0] for name, values in scores.items()}
+
+    def score_catalog_rows_against_stores(
+        self,
+        catalog: PartnerCatalog,
+        rows: np.ndarray,
+        store_table: StoreTable,
+        weights: Optional["ScoringWeights"] = None
+    ) -> Dict[str, np.ndarray]:
+        """Pontua vários parceiros do catálogo contra todas as lojas numa única passada
+
+        Retorna matrizes loja×parceiro (linhas da tabela × `rows`, na ordem dada).
+        """
+        shape = (len(store_table), len(rows))
+        segment_mask = catalog.segment_mask[rows].astype(np.int64)
+        size_mask = catalog.size_mask[rows].astype(np.int64)
+        category_index = catalog.category_index[rows]
+
+        sub_scores = {
+            "segment_match": np.where(
+                (segment_mask[None, :] >> store_table.segment_ordinal[:, None]) & 1, 1.0, 0.3
+            ),
+            "size_match": np.where(
+                (size_mask[None, :] >> store_table.size_ordinal[:, None]) & 1, 1.0, 0.5
+            ),
+            "pain_point_match": store_table.pain_point_by_category[:, category_index],
+            "priority_match": store_table.priority_by_category[:, category_index],
+            "commission_potential": catalog.commission_rate[rows][None, :] * store_table.revenue_factor[:, None],
+            "implementation_cost": np.broadcast_to(catalog.implementation_cost[rows], shape),
+            "retention_probability": np.broadcast_to(catalog.retention_probability[rows], shape)
+        }
+
+        return self.combine_sub_scores(sub_scores, weights)
+
+    def partner_upper_bound_terms(
+        self,
+        catalog: PartnerCatalog,
+        weights: Optional["ScoringWeights"] = None
+    ) -> Optional[np.ndarray]:
+        """Parcela do limite superior do score final que depende apenas do parceiro
+
+        Somada a store_upper_bound_terms (parcela da loja, por categoria), limita o
+        score final de qualquer loja com faturamento não negativo: segmento/tamanho
+        contam como atendidos quando o parceiro atende algum e o faturamento como
+        ≥ R$ 100k. Como min(1, x) ≤ x, o limite dispensa a saturação da compatibilidade.
+        Retorna None se algum peso for negativo.
+        """
+        weights = weights or self.weights
+        compatibility, profitability = weights.compatibility, weights.profitability
+        all_weights = list(compatibility.values()) + list(profitability.values())
+        if min(all_weights + [weights.compatibility_weight, weights.profitability_weight]) < 0:
+            return None
+
+        segment_best = np.where(catalog.segment_mask != 0, 1.0, 0.3)
+        size_best = np.where(catalog.size_mask != 0, 1.0, 0.5)
+        profitability_best = np.minimum(1.0, (
+            np.maximum(catalog.commission_rate, 0.0) * profitability["commission_potential"] +
+            catalog.implementation_cost * profitability["implementation_cost"] +
+            catalog.retention_probability * profitability["retention_probability"]
+        ))
+
+        return (
+            (segment_best * compatibility["segment_match"] +
+             size_best * compatibility["size_match"]) * weights.compatibility_weight +
+            profitability_best * weights.profitability_weight
+        )
+
+    def store_upper_bound_terms(
+        self,
+        features: StoreFeatures,
+        weights: Optional["ScoringWeights"] = None
+    ) -> Optional[np.ndarray]:
+        """Parcela do limite superior do score final que depende da loja, por categoria
+
+        Retorna None se a loja estiver fora das premissas de partner_upper_bound_terms.
+        """
+        if features.revenue_factor < 0:
+            return None
+
+        weights = weights or self.weights
+        return (
+            features.pain_point_by_category * weights.compatibility["pain_point_match"] +
+            features.priority_by_category * weights.compatibility["priority_match"]
+        ) * weights.compatibility_weight
+
+    def combine_sub_scores(
+        self,
+        sub_scores: Dict[str, np.ndarray],
+        weights: Optional["ScoringWeights"] = None
+    ) -> Dict[str, np.ndarray]:
+        """Aplica os pesos sobre os sub-scores vetorizados e calcula os totais
+
+        Os sub-scores não dependem dos pesos: aplicar um novo conjunto de pesos a
+        sub-scores já calculados (ex.: o tensor guardado pelo RecommendationService)
+        reproduz exatamente um rescoring completo.
+        """
+        weights = weights or self.weights
+        compatibility, profitability = weights.compatibility, weights.profitability
+
+        # 1. Score de compatibilidade ponderado
+        compatibility_score = np.minimum(1.0, (
+            sub_scores["segment_match"] * compatibility["segment_match"] +
+            sub_scores["size_match"] * compatibility["size_match"] +
+            sub_scores["pain_point_match"] * compatibility["pain_point_match"] +
+            sub_scores["priority_match"] * compatibility["priority_match"]
+        ))
+
+        # 2. Score de rentabilidade ponderado
+        profitability_score = np.minimum(1.0, (
+            sub_scores["commission_potential"] * profitability["commission_potential"] +
+            sub_scores["implementation_cost"] * profitability["implementation_cost"] +
+            sub_scores["retention_probability"] * profitability["retention_probability"]
+        ))
+
+        # 3. Score final
+        final_score = (
+            compatibility_score * weights.compatibility_weight +
+            profitability_score * weights.profitability_weight
+        )
+
+        scores = dict(sub_scores)
+        scores["compatibility_score"] = compatibility_score
+        scores["profitability_score"] = profitability_score
+        scores["final_score"] = final_score
+        return scores
+
+    def rank_rows(self, final_scores: np.ndarray, limit: int, min_score: float) -> List[np.ndarray]:
+        """Top-k de cada linha de uma matriz loja×parceiro de scores finais
+
+        Mesmo critério das recomendações: score ≥ min_score, ordem decrescente
+        estável (empates na ordem do catálogo). Retorna as colunas de cada linha.
+        """
+        order = np.argsort(-final_scores, axis=1, kind="stable")
+        return [
+            ranked[final_scores[i, ranked] >= min_score][:limit]
+            for i, ranked in enumerate(order)
+        ]
+
+    def build_recommendation(
+        self,
+        store_id: str,
+        partner_id: str,
+        scores: Dict[str, np.ndarray],
+        index: int
+    ) -> FinalRecommendation:
+        """Materializa a FinalRecommendation de uma posição do resultado vetorizado"""
+        final_score = float(scores["final_score"][index])
+
+        return FinalRecommendation(
+            store_id=store_id,
+            partner_id=partner_id,
+            compatibility_score=float(scores["compatibility_score"][index]),
+            profitability_score=float(scores["profitability_score"][index]),
+            final_score=final_score,
+            reasoning=self._generate_reasoning(
+                float(scores["segment_match"][index]),
+                float(scores["commission_potential"][index]),
+                float(scores["pain_point_match"][index])
+            ),
+            priority=self._determine_priority(final_score),
+            estimated_roi=float(scores["retention_probability"][index]) * 100,
+            implementation_timeline="2-4 semanas" if final_score > 0.7 else "4-8 semanas",
+            created_at=datetime.now()
+        )
+
+    def _determine_priority(self, final_score: float) -> int:
+        """Determina prioridade a partir do score final"""
+        if final_score >= 0.8:
+            return 1  # Alta
+        elif final_score >= 0.6:
+            return 2  # Média
+        return 3  # Baixa
+
+    def _generate_reasoning(
+        self,
+        segment_match: float,
+        commission_potential: float,
+        pain_point_match: float
+    ) -> List[str]:
+        """Gera reasoning da recomendação"""
+        reasoning = []
+        if segment_match > 0.8:
+            reasoning.append("Forte compatibilidade com segmento da loja")
+        if commission_potential > 0.6:
+            reasoning.append("Alto potencial de receita para a plataforma")
+        if pain_point_match > 0.7:
+            reasoning.append("Resolve pain points identificados")
+        return reasoning
 
-        return min(1.0, matches / len(pain_points)) if pain_points else 0.5
+    def _calculate_pain_point_match(self, store_dna: StoreDNA, partner: Partner) -> float:
+        """Calcula match com pain points (simulado) - teste de bit no perfil compilado da loja"""
+        profile = self.pain_point_table.profile_for(store_dna)
+        return profile.match(STAGE_ORDINALS[partner.category])
 
     def _calculate_priority_match(self, priorities: Dict, partner: Partner) -> float:
         """Calcula match com prioridades da loja"""
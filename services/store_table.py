@@ -0,0 +1,232 @@
+import numpy as np
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+from ..models.entities import StoreDNA, StoreSegment, StoreSize
+from ..services.partner_catalog import SEGMENT_ORDINALS, SIZE_ORDINALS, STAGES
+
+# Colunas analíticas e seus tipos
+ANALYTICS_COLUMNS = {
+    "monthly_revenue": np.float64,
+    "monthly_orders": np.int64,
+    "avg_ticket": np.float64,
+    "conversion_rate": np.float64,
+    "segment": np.int64,  # ordinal do StoreSegment
+    "size": np.int64  # ordinal do StoreSize
+}
+
+# Colunas categóricas: código -> membro do Enum
+ANALYTICS_CODES = {
+    "segment": list(StoreSegment),
+    "size": list(StoreSize)
+}
+
+# Operadores aceitos em StoreAnalyticsTable.where
+FILTER_OPERATORS = {
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "<": np.less,
+    "<=": np.less_equal,
+    "==": np.equal,
+    "!=": np.not_equal
+}
+
+@dataclass
+class StoreFeatures:
+    """Features da loja pré-compiladas por categoria para scoring vetorizado"""
+    store_id: str
+    segment_ordinal: int
+    size_ordinal: int
+    pain_point_by_category: np.ndarray  # match de pain points por ordinal de etapa
+    priority_by_category: np.ndarray  # prioridade normalizada por ordinal de etapa
+    revenue_factor: float
+
+class StoreTable:
+    """Tabela colunar de lojas - features de scoring em buffers NumPy contíguos
+
+    Cada loja ocupa uma linha fixa (ordem de inserção). As colunas espelham
+    StoreFeatures, permitindo pontuar um parceiro contra todas as lojas de uma vez.
+    """
+
+    def __init__(self, capacity: int = 64):
+        self.store_ids: List[str] = []
+        self.index: Dict[str, int] = {}
+        self._size = 0
+
+        capacity = max(1, capacity)
+        self._columns: Dict[str, np.ndarray] = {
+            "segment_ordinal": np.zeros(capacity, dtype=np.int64),
+            "size_ordinal": np.zeros(capacity, dtype=np.int64),
+            "revenue_factor": np.zeros(capacity, dtype=np.float64),
+            "pain_point_by_category": np.zeros((capacity, len(STAGES)), dtype=np.float64),
+            "priority_by_category": np.zeros((capacity, len(STAGES)), dtype=np.float64)
+        }
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, store_id: str) -> bool:
+        return store_id in self.index
+
+    # Visões somente das linhas ocupadas
+    @property
+    def segment_ordinal(self) -> np.ndarray:
+        return self._columns["segment_ordinal"][:self._size]
+
+    @property
+    def size_ordinal(self) -> np.ndarray:
+        return self._columns["size_ordinal"][:self._size]
+
+    @property
+    def revenue_factor(self) -> np.ndarray:
+        return self._columns["revenue_factor"][:self._size]
+
+    @property
+    def pain_point_by_category(self) -> np.ndarray:
+        return self._columns["pain_point_by_category"][:self._size]
+
+    @property
+    def priority_by_category(self) -> np.ndarray:
+        return self._columns["priority_by_category"][:self._size]
+
+    def upsert(self, features: StoreFeatures) -> int:
+        """Insere ou atualiza (na mesma linha) as features de uma loja, retornando a linha"""
+        row = self.index.get(features.store_id)
+
+        if row is None:
+            self._ensure_capacity(self._size + 1)
+            row = self._size
+            self._size += 1
+            self.store_ids.append(features.store_id)
+            self.index[features.store_id] = row
+
+        self._columns["segment_ordinal"][row] = features.segment_ordinal
+        self._columns["size_ordinal"][row] = features.size_ordinal
+        self._columns["revenue_factor"][row] = features.revenue_factor
+        self._columns["pain_point_by_category"][row] = features.pain_point_by_category
+        self._columns["priority_by_category"][row] = features.priority_by_category
+        return row
+
+    def row_of(self, store_id: str) -> Optional[int]:
+        """Retorna a linha de uma loja"""
+        return self.index.get(store_id)
+
+    def _ensure_capacity(self, required: int):
+        """Dobra os buffers quando necessário"""
+        capacity = len(self._columns["segment_ordinal"])
+        if required <= capacity:
+            return
+
+        while capacity < required:
+            capacity *= 2
+
+        for name, column in self._columns.items():
+            grown = np.zeros((capacity,) + column.shape[1:], dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+            self._columns[name] = grown
+
+class StoreAnalyticsTable:
+    """Espelho colunar (struct-of-arrays) das lojas para varreduras analíticas
+
+    Mantido pelo EcosystemRepository a cada escrita de DNA. Filtros, contagens,
+    somas e agrupamentos rodam como varreduras NumPy sobre as colunas, em vez de
+    iterar sobre objetos StoreDNA. As linhas seguem a ordem de inserção das lojas.
+    """
+
+    def __init__(self, capacity: int = 64):
+        self.store_ids: List[str] = []
+        self.index: Dict[str, int] = {}
+        self._size = 0
+        self._columns: Dict[str, np.ndarray] = {
+            name: np.zeros(max(1, capacity), dtype=dtype)
+            for name, dtype in ANALYTICS_COLUMNS.items()
+        }
+
+    def __len__(self) -> int:
+        return self._size
+
+    def column(self, name: str) -> np.ndarray:
+        """Visão das linhas ocupadas de uma coluna"""
+        return self._columns[name][:self._size]
+
+    def upsert(self, store: StoreDNA) -> int:
+        """Insere ou atualiza (na mesma linha) uma loja, retornando a linha"""
+        row = self.index.get(store.store_id)
+
+        if row is None:
+            self._ensure_capacity(self._size + 1)
+            row = self._size
+            self._size += 1
+            self.store_ids.append(store.store_id)
+            self.index[store.store_id] = row
+
+        self._columns["monthly_revenue"][row] = store.monthly_revenue
+        self._columns["monthly_orders"][row] = store.monthly_orders
+        self._columns["avg_ticket"][row] = store.avg_ticket
+        self._columns["conversion_rate"][row] = store.conversion_rate
+        self._columns["segment"][row] = SEGMENT_ORDINALS[store.segment]
+        self._columns["size"][row] = SIZE_ORDINALS[store.size]
+        return row
+
+    # Consultas
+
+    def where(self, *conditions: Tuple[str, str, Any]) -> np.ndarray:
+        """Máscara das linhas que atendem a todas as condições (coluna, operador, valor)
+
+        Ex.: where(("monthly_revenue", ">", 50000), ("segment", "==", StoreSegment.FASHION))
+        """
+        mask = np.ones(self._size, dtype=bool)
+        for name, operator, value in conditions:
+            if operator not in FILTER_OPERATORS:
+                raise ValueError(f"Unsupported operator: {operator}")
+            mask &= FILTER_OPERATORS[operator](self.column(name), self._encode(name, value))
+        return mask
+
+    def filter(self, *conditions: Tuple[str, str, Any]) -> List[str]:
+        """Ids das lojas que atendem às condições"""
+        return [self.store_ids[row] for row in np.flatnonzero(self.where(*conditions))]
+
+    def count(self, mask: Optional[np.ndarray] = None) -> int:
+        return self._size if mask is None else int(np.count_nonzero(mask))
+
+    def sum(self, name: str, mask: Optional[np.ndarray] = None) -> float:
+        values = self.column(name)
+        return (values if mask is None else values[mask]).sum().item()
+
+    def mean(self, name: str, mask: Optional[np.ndarray] = None) -> float:
+        count = self.count(mask)
+        return self.sum(name, mask) / count if count else 0
+
+    def group_count(self, by: str, mask: Optional[np.ndarray] = None) -> Dict[Any, int]:
+        """Contagem por valor de uma coluna categórica (segment/size), decodificada para o Enum"""
+        codes = self.column(by) if mask is None else self.column(by)[mask]
+        counts = np.bincount(codes, minlength=len(ANALYTICS_CODES[by]))
+        return {member: int(counts[code]) for code, member in enumerate(ANALYTICS_CODES[by]) if counts[code]}
+
+    def group_sum(self, by: str, name: str, mask: Optional[np.ndarray] = None) -> Dict[Any, float]:
+        """Soma de uma coluna por valor de uma coluna categórica"""
+        codes, values = self.column(by), self.column(name)
+        if mask is not None:
+            codes, values = codes[mask], values[mask]
+        counts = np.bincount(codes, minlength=len(ANALYTICS_CODES[by]))
+        sums = np.bincount(codes, weights=values, minlength=len(ANALYTICS_CODES[by]))
+        return {member: sums[code].item() for code, member in enumerate(ANALYTICS_CODES[by]) if counts[code]}
+
+    def _encode(self, name: str, value: Any) -> Any:
+        """Converte membros de Enum para o código da coluna categórica"""
+        if name in ANALYTICS_CODES and not isinstance(value, (int, np.integer)):
+            return ANALYTICS_CODES[name].index(value)
+        return value
+
+    def _ensure_capacity(self, required: int):
+        """Dobra os buffers quando necessário"""
+        capacity = len(self._columns["segment"])
+        if required <= capacity:
+            return
+
+        while capacity < required:
+            capacity *= 2
+
+        for name, column in self._columns.items():
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+            self._columns[name] = grown
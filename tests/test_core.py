@@ -1,15 +1,32 @@
 
+import asyncio
 import pytest
+import pickle
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import sys
 import os
+from datetime import datetime, timedelta
 
 # Adiciona o diretório pai ao path
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
 from models.entities import StoreDNA, Partner, StoreSegment, StoreSize, EcommerceStage
+from models.compact import Vocabulary, pack_ids, pack_vector, unpack_ids, unpack_vector
 from services.dna_service import DNAService
 from services.scoring_service import ScoringService
-from services.recommendation_service import OrionOrchestrator
+from services.partner_catalog import PartnerCatalog, STAGE_ORDINALS
+from services.pain_points import PainPointMatchTable
+from services.score_matrix import ScoreMatrix
+from services.repository import EcosystemRepository
+from services.persistence import SQLiteBackend
+from services.recommendation_service import OrionOrchestrator, RecommendationService
+from services.recommendation_table import MAX_STALENESS_SECONDS
+from services.batch_score import run_batch, load_batch_scores
+from agents.autonomous_agents import BaseAgent, MarketIntelligenceAgent
+from agents.execution import AgentExecutor, Intermediate
 from core.sample_data import create_sample_data
 
 class TestDNAService:
@@ -81,6 +98,277 @@ class TestDNAService:
             assert "gap_severity" in gaps[0]
             assert "stage" in gaps[0]
 
+    def test_compact_store_dna_views(self):
+        created_at = datetime(2024, 5, 17, 10, 30, 15, 123456)
+        dna = StoreDNA(
+            store_id="compact_store",
+            name="Compact Store",
+            segment=StoreSegment.FASHION,
+            size=StoreSize.PEQUENA,
+            monthly_revenue=25000,
+            monthly_orders=180,
+            avg_ticket=138.89,
+            conversion_rate=0.022,
+            traffic_sources={"paid": 0.5, "influencer": 0.2},
+            pain_points=["alto_cac", "seo", "alto_cac"],
+            current_tools=["google_ads"],
+            priorities={"1_atracao": 8, EcommerceStage.CARRINHO: 7},
+            created_at=created_at,
+            updated_at=created_at
+        )
+
+        assert dna.traffic_sources == {"paid": 0.5, "influencer": 0.2}
+        assert dna.pain_points == ["alto_cac", "seo", "alto_cac"]
+        assert dict(dna.priorities) == {"1_atracao": 8, "5_carrinho": 7}
+        assert dna.priorities.get(EcommerceStage.CARRINHO) == 7
+        assert dna.priorities.get("3_navegacao", 5) == 5
+        assert (dna.monthly_revenue, dna.avg_ticket, dna.created_at) == (25000, 138.89, created_at)
+
+        dna.pain_points = ["frete_caro"]
+        dna.monthly_orders = 200
+        assert dna.pain_points == ["frete_caro"]
+        assert dna.current_tools == ["google_ads"]
+        assert dna.monthly_orders == 200
+        assert pickle.loads(pickle.dumps(dna)) == dna
+
+        # Visões alteradas no lugar regravam o campo
+        dna.pain_points.append("seo")
+        dna.current_tools += ["hotjar"]
+        dna.traffic_sources["email"] = 0.1
+        del dna.traffic_sources["influencer"]
+        dna.priorities[EcommerceStage.PAGAMENTO] = 9
+        assert dna.pain_points == ["frete_caro", "seo"]
+        assert dna.current_tools == ["google_ads", "hotjar"]
+        assert dna.traffic_sources == {"paid": 0.5, "email": 0.1}
+        assert dict(dna.priorities) == {"1_atracao": 8, "5_carrinho": 7, "6_pagamento": 9}
+
+        # Prioridades float e fora da faixa de um byte continuam aceitas
+        dna.priorities = {"1_atracao": 7.5, "2_infraestrutura": 1000, "3_navegacao": -1, "4_produto": 3}
+        assert dict(dna.priorities) == {"1_atracao": 7.5, "2_infraestrutura": 1000, "3_navegacao": -1, "4_produto": 3}
+        dna.current_tools = ["klaviyo"]
+        assert dna.priorities["2_infraestrutura"] == 1000 and dna.current_tools == ["klaviyo"]
+        assert pickle.loads(pickle.dumps(dna)) == dna
+
+        # Chaves que não são etapas são preservadas, como no dict original
+        dna.priorities = {"1_atracao": 8, "fidelizacao": 6, "marca": 2.5}
+        dna.priorities["5_carrinho"] = 7
+        assert dict(dna.priorities) == {"1_atracao": 8, "5_carrinho": 7, "fidelizacao": 6, "marca": 2.5}
+        assert dna.priorities["fidelizacao"] == 6 and "marca" in dna.priorities
+        del dna.priorities["marca"]
+        dna.pain_points = ["seo"]
+        assert dict(dna.priorities) == {"1_atracao": 8, "5_carrinho": 7, "fidelizacao": 6}
+        assert pickle.loads(pickle.dumps(dna)) == dna
+
+    def test_vocabulary_falls_back_to_inline_names(self):
+        vocabulary = Vocabulary(["organic", "paid"], max_size=3)
+        assert vocabulary.intern("social") == 2
+        assert vocabulary.intern("tiktok") is None and len(vocabulary) == 3
+
+        names = ["paid", "tiktok", "organic", "kwai", "tiktok"]
+        packed = b"header" + pack_ids(names, vocabulary) + b"tail"
+        assert unpack_ids(packed, 6, vocabulary) == (names, len(packed) - 4)
+
+        values = {"tiktok": 0.25, "paid": 0.5, "organic": 0.25}
+        packed = pack_vector(values, vocabulary)
+        assert unpack_vector(packed, 0, vocabulary) == (values, len(packed))
+        assert packed == pack_vector(dict(reversed(list(values.items()))), vocabulary)
+
+class TestEcosystemRepository:
+    """Testa repositório compartilhado e seus índices"""
+
+    def test_indexes_follow_updates(self):
+        repository = EcosystemRepository()
+        dna_service = DNAService(repository)
+
+        dna_service.create_store_dna({
+            "store_id": "repo_store_001",
+            "name": "Repo Store",
+            "segment": "fashion",
+            "size": "pequena",
+            "pain_points": ["alto_cac", "seo"]
+        })
+
+        assert repository.store_ids_by("segment", StoreSegment.FASHION) == ["repo_store_001"]
+        assert repository.store_ids_by("pain_point", "seo") == ["repo_store_001"]
+
+        dna_service.update_store_dna("repo_store_001", {
+            "segment": StoreSegment.LIVROS,
+            "pain_points": ["alto_cac"]
+        })
+
+        assert repository.store_ids_by("segment", StoreSegment.FASHION) == []
+        assert repository.count_stores_by("segment") == {StoreSegment.LIVROS: 1}
+        assert repository.store_ids_by("pain_point", "seo") == []
+
+    def test_shared_across_services_and_agents(self):
+        orchestrator = OrionOrchestrator()
+        create_sample_data(orchestrator)
+
+        repository = orchestrator.repository
+        assert orchestrator.recommendation_service.dna_service.stores_db is repository.stores
+        assert orchestrator.recommendation_service.partners_db is repository.partners
+
+        master_agent = orchestrator.agent_orchestrator.master_agents["loja_fashion_001"]
+        assert "error" not in master_agent.execute_action({})
+
+        by_category = repository.count_partners_by("category")
+        assert sum(by_category.values()) == len(repository.partners)
+
+    def test_analytics_table_matches_store_scans(self):
+        orchestrator = OrionOrchestrator()
+        create_sample_data(orchestrator)
+        orchestrator.dna_service.update_store_dna("loja_fashion_001", {"monthly_revenue": 60000})
+
+        repository = orchestrator.repository
+        analytics = repository.store_analytics
+        stores = list(repository.stores.values())
+
+        high_revenue = analytics.where(("monthly_revenue", ">", 50000))
+        assert analytics.filter(("monthly_revenue", ">", 50000)) == \
+            [s.store_id for s in stores if s.monthly_revenue > 50000]
+        assert analytics.count(analytics.where(("conversion_rate", "<", 0.02))) == \
+            len([s for s in stores if s.conversion_rate < 0.02])
+        assert analytics.sum("monthly_orders", high_revenue) == \
+            sum(s.monthly_orders for s in stores if s.monthly_revenue > 50000)
+        assert analytics.group_count("segment") == repository.count_stores_by("segment")
+        assert analytics.filter(("segment", "==", StoreSegment.FASHION), ("size", "!=", StoreSize.GRANDE)) == \
+            [s.store_id for s in stores if s.segment == StoreSegment.FASHION and s.size != StoreSize.GRANDE]
+
+        by_size = analytics.group_sum("size", "monthly_revenue")
+        for size, total in by_size.items():
+            assert total == pytest.approx(sum(s.monthly_revenue for s in stores if s.size == size))
+
+    def test_market_aggregates_follow_writes(self):
+        orchestrator = OrionOrchestrator()
+        create_sample_data(orchestrator)
+        repository = orchestrator.repository
+        service = orchestrator.recommendation_service
+
+        # Alteração no próprio objeto antes de regravar, e remoção de parceiro
+        orchestrator.dna_service.update_store_dna("loja_fashion_001", {
+            "monthly_revenue": 60000, "conversion_rate": 0.01, "segment": StoreSegment.LIVROS
+        })
+        service.remove_partner(next(iter(repository.partners)))
+
+        opportunities = service.generate_market_opportunities(consistency_check=True)
+        assert opportunities["consistency_check"] == {"consistent": True, "mismatches": {}}
+
+        recomputed = MarketIntelligenceAgent().execute_action({
+            "stores": list(repository.stores.values()),
+            "partners": list(repository.partners.values())
+        })
+        for key in ("segment_distribution", "size_distribution", "partner_coverage",
+                    "market_gaps", "growth_opportunities"):
+            assert opportunities[key] == recomputed[key]
+
+        repository.market_aggregates.high_revenue_stores += 1
+        check = repository.check_market_aggregates()
+        assert not check["consistent"] and list(check["mismatches"]) == ["high_revenue_stores"]
+
+class TestSQLitePersistence:
+    """Testa persistência em SQLite por trás do repositório"""
+
+    def test_round_trip_restores_stores_and_partners(self, tmp_path):
+        db_path = str(tmp_path / "orion.db")
+
+        orchestrator = OrionOrchestrator(EcosystemRepository(SQLiteBackend(db_path)))
+        create_sample_data(orchestrator)
+        orchestrator.recommendation_service.remove_partner("partner_search_002")
+        expected = {
+            store_id: [(r.partner_id, r.final_score) for r in
+                       orchestrator.recommendation_service.get_recommendations_for_store(store_id)]
+            for store_id in orchestrator.repository.stores
+        }
+        orchestrator.repository.backend.close()
+
+        backend = SQLiteBackend(db_path)
+        reloaded = OrionOrchestrator(EcosystemRepository(backend))
+
+        assert list(reloaded.repository.stores) == list(expected)
+        assert "partner_search_002" not in reloaded.repository.partners
+        assert backend.count_stores() == len(expected)
+        for store_id, recommendations in expected.items():
+            assert [(r.partner_id, r.final_score) for r in
+                    reloaded.recommendation_service.get_recommendations_for_store(store_id)] == recommendations
+
+    def test_bulk_create_and_read_through(self, tmp_path):
+        db_path = str(tmp_path / "orion.db")
+        writer = DNAService(EcosystemRepository(SQLiteBackend(db_path)))
+        reader = DNAService(EcosystemRepository(SQLiteBackend(db_path)))
+
+        writer.create_store_dnas([
+            {"store_id": f"bulk_{i}", "name": f"Bulk {i}", "segment": "fashion", "size": "pequena"}
+            for i in range(25)
+        ])
+
+        # A loja gravada pelo outro repositório é lida do disco e passa a ser indexada
+        dna = reader.get_store_dna("bulk_7")
+        assert dna.name == "Bulk 7"
+        assert reader.repository.store_ids_by("segment", StoreSegment.FASHION) == ["bulk_7"]
+
+    def test_bulk_upsert_is_atomic_and_streaming_is_isolated(self, tmp_path):
+        backend = SQLiteBackend(str(tmp_path / "orion.db"), batch_size=2)
+        service = DNAService()
+        stores = [
+            service.build_store_dna({"store_id": f"s{i}", "name": f"S {i}", "segment": "fashion", "size": "media"})
+            for i in range(5)
+        ]
+
+        # Falha no último lote desfaz os anteriores
+        invalid = service.build_store_dna({"store_id": "bad", "name": "Bad", "segment": "fashion", "size": "media"})
+        invalid.name = None
+        with pytest.raises(sqlite3.IntegrityError):
+            backend.upsert_stores(stores + [invalid])
+        assert backend.count_stores() == 0
+
+        assert backend.upsert_stores(stores) == 5
+
+        # Leitura em blocos continua no seu snapshot enquanto a conexão compartilhada grava
+        streamed = backend.iter_stores()
+        first = next(streamed)
+        late = service.build_store_dna({"store_id": "late", "name": "Late", "segment": "livros", "size": "micro"})
+        backend.upsert_stores([late])
+        assert [first.store_id] + [store.store_id for store in streamed] == [store.store_id for store in stores]
+        assert backend.get_store("late").name == "Late"
+
+    def test_partner_read_through(self, tmp_path):
+        db_path = str(tmp_path / "orion.db")
+        writer = OrionOrchestrator(EcosystemRepository(SQLiteBackend(db_path)))
+        create_sample_data(writer)
+        reader = OrionOrchestrator(EcosystemRepository(SQLiteBackend(db_path)))
+
+        partner = Partner(
+            partner_id="partner_late_001", name="Late", category=EcommerceStage.TALENTOS,
+            subcategory="", description="", pricing_model="fixed", min_price=0, max_price=None,
+            target_segments=[StoreSegment.FASHION], target_sizes=[StoreSize.MEDIA],
+            integration_complexity=3, roi_potential=8, commission_rate=0.1
+        )
+        writer.recommendation_service.add_partner(partner)
+
+        # O parceiro gravado pelo outro repositório é lido do disco, indexado e pontuado
+        service = reader.recommendation_service
+        analysis = service.get_partner_performance_analysis("partner_late_001")
+        assert "error" not in analysis
+        assert reader.repository.partner_ids_by("category", EcommerceStage.TALENTOS)[-1] == "partner_late_001"
+        assert reader.repository.check_market_aggregates()["consistent"]
+        assert service.partner_catalog.partner_ids[-1] == "partner_late_001"
+        assert reader.repository.get_partner("partner_desconhecido") is None
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_batch_score_matches_service(self, tmp_path, workers):
+        db_path = str(tmp_path / "orion.db")
+        orchestrator = OrionOrchestrator(EcosystemRepository(SQLiteBackend(db_path)))
+        create_sample_data(orchestrator)
+
+        output = str(tmp_path / "top_k.npz")
+        summary = run_batch(db_path, output, top_k=3, workers=workers, shard_size=2)
+        assert summary["shards"] == (len(orchestrator.repository.stores) + 1) // 2
+
+        batch = load_batch_scores(output)
+        assert list(batch) == list(orchestrator.repository.stores)
+        for store_id, ranked in batch.items():
+            assert ranked == scalar_recommendations(orchestrator, store_id, 3)
+
 class TestScoringService:
     """Testa serviço de scoring"""
 
@@ -162,6 +450,682 @@ class TestScoringService:
         assert recommendation.priority in [1, 2, 3]
         assert isinstance(recommendation.reasoning, list)
 
+    def test_score_store_against_catalog_matches_scalar(self):
+        partners = [self.partner]
+        for i, stage in enumerate(EcommerceStage):
+            partners.append(Partner(
+                partner_id=f"batch_partner_{i}",
+                name=f"Batch Partner {i}",
+                category=stage,
+                subcategory="",
+                description="",
+                pricing_model="fixed",
+                min_price=0,
+                max_price=None,
+                target_segments=list(StoreSegment)[:i % 4],
+                target_sizes=list(StoreSize)[i % 3:],
+                integration_complexity=1 + i % 10,
+                roi_potential=10 - i % 7,
+                commission_rate=0.05 * (i % 5)
+            ))
+
+        catalog = PartnerCatalog(partners)
+        scores = self.scoring_service.score_store_against_catalog(self.store_dna, catalog)
+
+        for i, partner in enumerate(partners):
+            compatibility = self.scoring_service.calculate_compatibility_score(
+                self.store_dna, partner
+            )
+            profitability = self.scoring_service.calculate_profitability_score(
+                self.store_dna, partner
+            )
+            expected = self.scoring_service.calculate_final_recommendation(
+                compatibility, profitability
+            )
+            batch = self.scoring_service.build_recommendation(
+                self.store_dna.store_id, catalog.partner_ids[i], scores, i
+            )
+
+            assert scores["compatibility_score"][i] == compatibility.total_score
+            assert scores["profitability_score"][i] == profitability.total_score
+            assert batch.partner_id == partner.partner_id
+            assert batch.final_score == expected.final_score
+            assert batch.priority == expected.priority
+            assert batch.reasoning == expected.reasoning
+            assert batch.estimated_roi == expected.estimated_roi
+
+    def test_pain_point_table_matches_nested_loop(self):
+        def nested_loop_match(pain_points, stage, matches):
+            if not pain_points:
+                return 0.5
+            count = 0
+            for pain_point in pain_points:
+                for pain_type, categories in matches.items():
+                    if pain_point in pain_type and stage in categories:
+                        count += 1
+            return min(1.0, count / len(pain_points))
+
+        matches = {
+            "baixa_conversao": ["3_navegacao", "5_carrinho"],
+            "conversao_mobile": ["3_navegacao"],
+            "alto_cac": ["1_atracao"]
+        }
+        table = PainPointMatchTable(matches)
+        scoring_service = ScoringService(table)
+
+        for pain_points in [[], ["alto_cac"], ["conversao", "seo"], ["a", "a", "cac"], ["desconhecido"]]:
+            self.store_dna.pain_points = pain_points
+            features = scoring_service.compile_store_features(self.store_dna)
+            for stage in EcommerceStage:
+                expected = nested_loop_match(pain_points, stage.value, matches)
+                assert features.pain_point_by_category[STAGE_ORDINALS[stage]] == expected
+                assert self.store_dna.pain_point_profile.match(STAGE_ORDINALS[stage]) == expected
+
+        # Nova versão da tabela invalida o perfil compilado da loja
+        version = self.store_dna.pain_point_profile.version
+        table.update({"desconhecido": ["12_talentos"]})
+        features = scoring_service.compile_store_features(self.store_dna)
+        assert self.store_dna.pain_point_profile.version != version
+        assert features.pain_point_by_category[STAGE_ORDINALS[EcommerceStage.TALENTOS]] == 1.0
+
+class TestPartnerCatalog:
+    """Testa catálogo colunar de parceiros"""
+
+    def _partner(self, partner_id, category, complexity=5):
+        return Partner(
+            partner_id=partner_id,
+            name=partner_id,
+            category=category,
+            subcategory="",
+            description="",
+            pricing_model="fixed",
+            min_price=0,
+            max_price=None,
+            target_segments=[StoreSegment.FASHION, StoreSegment.LIVROS],
+            target_sizes=[StoreSize.MEDIA],
+            integration_complexity=complexity,
+            roi_potential=7,
+            commission_rate=0.1
+        )
+
+    def test_incremental_add_and_remove(self):
+        catalog = PartnerCatalog(capacity=2)
+        for i, stage in enumerate(EcommerceStage):
+            catalog.add(self._partner(f"p{i}", stage))
+
+        assert len(catalog) == len(EcommerceStage)
+        assert list(catalog.category_index) == list(range(len(EcommerceStage)))
+        assert catalog.segment_mask[0] == (1 << 0) | (1 << 5)
+        assert catalog.size_mask[0] == 1 << 2
+
+        # Atualização mantém a linha; remoção preserva a ordem das demais
+        catalog.add(self._partner("p1", EcommerceStage.ATRACAO, complexity=2))
+        assert catalog.index["p1"] == 1
+        assert catalog.implementation_cost[1] == 1.0 - (2 / 10.0)
+
+        catalog.remove("p0")
+        assert catalog.partner_ids[:2] == ["p1", "p2"]
+        assert catalog.index["p2"] == 1
+        assert len(catalog.category_index) == len(EcommerceStage) - 1
+        assert catalog.remove("p0") is None
+
+        # Índice por categoria acompanha a revisão do catálogo
+        assert list(catalog.category_rows(STAGE_ORDINALS[EcommerceStage.ATRACAO])) == [0]
+        assert list(catalog.category_rows(STAGE_ORDINALS[EcommerceStage.NAVEGACAO])) == [1]
+
+    def test_stage_recommendations_in_one_pass(self):
+        orchestrator = OrionOrchestrator()
+        create_sample_data(orchestrator)
+        service = orchestrator.recommendation_service
+        scoring = service.scoring_service
+        store_dna = orchestrator.dna_service.get_store_dna("loja_eletronicos_002")
+
+        by_stage = service.get_stage_recommendations("loja_eletronicos_002", limit=2, min_score=0.3)
+        assert list(by_stage) == [stage.value for stage in EcommerceStage]
+
+        for stage in EcommerceStage:
+            expected = []
+            for partner in service.partners_db.values():
+                if partner.category == stage:
+                    recommendation = scoring.calculate_final_recommendation(
+                        scoring.calculate_compatibility_score(store_dna, partner),
+                        scoring.calculate_profitability_score(store_dna, partner)
+                    )
+                    if recommendation.final_score >= 0.3:
+                        expected.append(recommendation)
+            expected.sort(key=lambda x: x.final_score, reverse=True)
+            assert [(r.partner_id, r.final_score) for r in by_stage[stage.value]] == \
+                [(r.partner_id, r.final_score) for r in expected[:2]]
+
+def scalar_recommendations(orchestrator, store_id, limit=10, min_score=0.3):
+    """Recomendações pelo caminho escalar original, para comparação"""
+    service = orchestrator.recommendation_service
+    scoring = service.scoring_service
+    store_dna = orchestrator.dna_service.get_store_dna(store_id)
+
+    recommendations = []
+    for partner in service.partners_db.values():
+        recommendation = scoring.calculate_final_recommendation(
+            scoring.calculate_compatibility_score(store_dna, partner),
+            scoring.calculate_profitability_score(store_dna, partner)
+        )
+        if recommendation.final_score >= min_score:
+            recommendations.append(recommendation)
+    recommendations.sort(key=lambda x: x.final_score, reverse=True)
+
+    return [(r.partner_id, r.final_score) for r in recommendations[:limit]]
+
+class TestScoreMatrix:
+    """Testa matriz materializada loja×parceiro"""
+
+    def _orchestrator(self, score_matrix):
+        orchestrator = OrionOrchestrator()
+        orchestrator.recommendation_service.score_matrix = score_matrix
+        create_sample_data(orchestrator)
+        return orchestrator
+
+    @pytest.mark.parametrize("dtype", ["float64", "float16", "uint8"])
+    def test_recommendations_match_scalar_path(self, dtype):
+        orchestrator = self._orchestrator(ScoreMatrix(dtype=dtype))
+        service = orchestrator.recommendation_service
+
+        # Escrita de DNA recalcula apenas a linha da loja
+        orchestrator.dna_service.update_store_dna("loja_saude_004", {"monthly_revenue": 120000})
+
+        for store_id in orchestrator.dna_service.stores_db:
+            for limit, min_score in [(10, 0.3), (2, 0.5)]:
+                recommendations = service.get_recommendations_for_store(store_id, limit, min_score)
+                assert [(r.partner_id, r.final_score) for r in recommendations] == \
+                    scalar_recommendations(orchestrator, store_id, limit, min_score)
+
+    @pytest.mark.parametrize("dtype", ["float32", "float16", "uint8"])
+    def test_lossy_matrix_requires_normalized_weights(self, dtype):
+        orchestrator = self._orchestrator(ScoreMatrix(dtype=dtype))
+        service = orchestrator.recommendation_service
+        weights = service.scoring_service.weights
+
+        # Score final acima de 1 saturaria o uint8 e sairia da tolerância dos floats
+        for invalid in [{"compatibility_weight": 0.9}, {"profitability": {"implementation_cost": -0.1}}]:
+            with pytest.raises(ValueError):
+                service.set_weights(**invalid)
+            assert service.scoring_service.weights is weights
+
+        service.set_weights(compatibility_weight=0.6, profitability_weight=0.4)
+        for store_id in orchestrator.dna_service.stores_db:
+            recommendations = service.get_recommendations_for_store(store_id, 10, 0.3)
+            assert [(r.partner_id, r.final_score) for r in recommendations] == \
+                scalar_recommendations(orchestrator, store_id, 10, 0.3)
+
+        # Matriz exata aceita pesos livres
+        exact = self._orchestrator(ScoreMatrix(dtype="float64")).recommendation_service
+        assert exact.set_weights(compatibility_weight=0.9).compatibility_weight == 0.9
+
+    def test_incremental_row_and_column(self):
+        orchestrator = self._orchestrator(ScoreMatrix())
+        service = orchestrator.recommendation_service
+        matrix = service.score_matrix
+        scoring = service.scoring_service
+
+        assert matrix.stores == len(orchestrator.dna_service.stores_db)
+        assert matrix.partners == len(service.partners_db)
+
+        store_dna = orchestrator.dna_service.get_store_dna("loja_fashion_001")
+        row = service.store_table.row_of("loja_fashion_001")
+        for partner_id, column in service.partner_catalog.index.items():
+            partner = service.partners_db[partner_id]
+            compatibility = scoring.calculate_compatibility_score(store_dna, partner)
+            assert matrix.value(row, column, "compatibility_score") == compatibility.total_score
+
+        removed = service.partner_catalog.partner_ids[0]
+        service.remove_partner(removed)
+        assert matrix.partners == len(service.partners_db)
+        assert removed not in [r.partner_id for r in
+                               service.get_recommendations_for_store("loja_fashion_001", min_score=0)]
+
+    @pytest.mark.parametrize("sub_score_dtype", [None, "float64", "float32", "float16"])
+    def test_set_weights_without_rescoring(self, sub_score_dtype):
+        keep_sub_scores = sub_score_dtype is not None
+        assert OrionOrchestrator().recommendation_service.sub_score_tensor is None  # Opcional
+        orchestrator = OrionOrchestrator(
+            keep_sub_scores=keep_sub_scores, sub_score_dtype=sub_score_dtype or "float32"
+        )
+        service = orchestrator.recommendation_service
+        assert (service.sub_score_tensor is not None) == keep_sub_scores
+        create_sample_data(orchestrator)
+
+        calls = []
+        score_rows = service.scoring_service.score_features_against_catalog
+        service.scoring_service.score_features_against_catalog = \
+            lambda *args, **kwargs: calls.append(args) or score_rows(*args, **kwargs)
+
+        service.set_weights(
+            compatibility={"segment_match": 0.05, "pain_point_match": 0.5},
+            compatibility_weight=0.4,
+            profitability_weight=0.6
+        )
+        # Com o tensor de sub-scores, a troca de pesos não repontua nenhuma loja
+        assert (len(calls) == 0) == keep_sub_scores
+        # Tensor com perda: a matriz recombinada só pré-seleciona, com a tolerância do tensor
+        assert service.score_matrix.exact == (sub_score_dtype in (None, "float64"))
+
+        for store_id in orchestrator.dna_service.stores_db:
+            recommendations = service.get_recommendations_for_store(store_id, 10, 0.3)
+            assert [(r.partner_id, r.final_score) for r in recommendations] == \
+                scalar_recommendations(orchestrator, store_id, 10, 0.3)
+
+        with pytest.raises(ValueError):
+            service.set_weights(profitability={"unknown": 1.0})
+
+    def test_weight_profiles_in_one_pass(self):
+        orchestrator = self._orchestrator(ScoreMatrix())
+        service = orchestrator.recommendation_service
+        base = service.scoring_service.weights
+        profiles = {
+            "base": base,
+            "fit": base.merged(compatibility_weight=0.9, profitability_weight=0.1),
+            "revenue": base.merged(profitability={"commission_potential": 0.8})
+        }
+
+        rankings = service.rank_weight_profiles(profiles, limit=5)
+
+        # Cada perfil reproduz o caminho escalar com os mesmos pesos
+        for name, weights in profiles.items():
+            service.set_weights(
+                dict(weights.compatibility), dict(weights.profitability),
+                weights.compatibility_weight, weights.profitability_weight
+            )
+            for store_id in orchestrator.dna_service.stores_db:
+                assert rankings[name][store_id] == scalar_recommendations(orchestrator, store_id, 5)
+
+        stats = {tuple(pair["profiles"]): pair for pair in service.compare_weight_profiles(profiles, limit=5)}
+        assert len(stats) == 3
+        assert stats[("base", "fit")]["stores"] == len(orchestrator.dna_service.stores_db)
+        assert 0.0 <= stats[("base", "revenue")]["mean_jaccard"] <= stats[("base", "revenue")]["mean_overlap"] <= 1.0
+
+    def test_memory_budget(self):
+        matrix = ScoreMatrix(dtype="uint8", memory_budget=100 * 10 * 3)
+        matrix.resize(100, 10)
+        assert matrix.nbytes <= 100 * 10 * 3
+
+        with pytest.raises(MemoryError):
+            matrix.resize(1000, 10)
+        assert matrix.stores == 100
+
+        # O tensor de sub-scores divide o orçamento com a matriz de scores, que tem prioridade
+        budget = 64 * 16 * 3
+        service = RecommendationService(
+            score_matrix=ScoreMatrix(dtype="uint8", memory_budget=budget), keep_sub_scores=True
+        )
+        assert service.sub_score_tensor is None and service.score_matrix is not None
+        service = RecommendationService(
+            score_matrix=ScoreMatrix(dtype="uint8", memory_budget=budget * 20), keep_sub_scores=True
+        )
+        assert service.sub_score_tensor.dtype_name == "float32"
+        assert service.score_matrix.nbytes + service.sub_score_tensor.nbytes <= budget * 20
+
+        # O orquestrador tem orçamento limitado por padrão e aceita tipo e orçamento próprios
+        assert OrionOrchestrator().recommendation_service.memory_budget is not None
+        orchestrator = OrionOrchestrator(matrix_dtype="uint8", memory_budget=budget)
+        create_sample_data(orchestrator)
+        matrix = orchestrator.recommendation_service.score_matrix
+        assert matrix.dtype_name == "uint8" and matrix.nbytes <= budget
+
+class TestCandidatePipeline:
+    """Testa pipeline de candidatos por índices invertidos + rerank"""
+
+    def test_candidates_rerank_and_recall_check(self):
+        orchestrator = OrionOrchestrator()
+        create_sample_data(orchestrator)
+        service = orchestrator.recommendation_service
+        service.candidate_recall_check = True
+
+        store_dna = orchestrator.dna_service.get_store_dna("loja_fashion_001")
+        candidates = service.generate_candidates(store_dna)
+        assert len(candidates) < len(service.partner_catalog) or len(service.partner_catalog) <= 1
+        for row in candidates:
+            partner = service.partners_db[service.partner_catalog.partner_ids[row]]
+            assert (store_dna.segment in partner.target_segments or store_dna.size in partner.target_sizes
+                    or service.scoring_service._calculate_pain_point_match(store_dna, partner) > 0
+                    or store_dna.priorities.get(partner.category.value, 5) >= 6)
+        assert len(service.generate_candidates(store_dna, max_candidates=2)) == min(2, len(candidates))
+
+        # Os candidatos são reranqueados com os scores exatos
+        for store_id in orchestrator.dna_service.stores_db:
+            exhaustive = scalar_recommendations(orchestrator, store_id, len(service.partners_db), 0.0)
+            candidate_ids = {service.partner_catalog.partner_ids[row] for row in
+                             service.generate_candidates(orchestrator.dna_service.get_store_dna(store_id))}
+            expected = [(partner_id, score) for partner_id, score in exhaustive if partner_id in candidate_ids]
+            assert [(r.partner_id, r.final_score) for r in
+                    service.get_candidate_recommendations(store_id, 10, 0.0)] == expected[:10]
+
+        stats = service.candidate_recall_stats
+        assert stats["checks"] == len(orchestrator.dna_service.stores_db)
+        assert 0.0 < stats["recall"] <= 1.0
+
+class TestRecommendationTable:
+    """Testa tabela materializada de recomendações"""
+
+    def test_served_from_table_until_stale_bound(self):
+        orchestrator = OrionOrchestrator()
+        create_sample_data(orchestrator)
+        service = orchestrator.recommendation_service
+        table = service.recommendation_table
+
+        # Escritas agendam o recálculo; o refresh em segundo plano materializa todas as lojas
+        assert service.refresh_materialized() == len(orchestrator.dna_service.stores_db)
+        recommendations, materialized_at = service.get_materialized_recommendations("loja_fashion_001", 5, 0.3)
+        assert [(r.partner_id, r.final_score) for r in recommendations] == \
+            scalar_recommendations(orchestrator, "loja_fashion_001", 5)
+
+        # Escrita no DNA: entrada antiga servida dentro do limite de staleness
+        orchestrator.dna_service.update_store_dna("loja_fashion_001", {"pain_points": ["alto_cac"]})
+        assert service.get_materialized_recommendations("loja_fashion_001", 5, 0.3)[1] == materialized_at
+
+        # Além do limite, pontua ao vivo e rematerializa
+        table.max_staleness = timedelta(0)
+        recommendations, refreshed_at = service.get_materialized_recommendations("loja_fashion_001", 5, 0.3)
+        assert refreshed_at > materialized_at
+        assert [(r.partner_id, r.final_score) for r in recommendations] == \
+            scalar_recommendations(orchestrator, "loja_fashion_001", 5)
+        assert "loja_fashion_001" not in table.pending
+
+        # Remoção de parceiro afeta todas as lojas: só avança a geração da tabela
+        generation = table.generation
+        service.remove_partner("partner_ads_001")
+        assert table.generation == generation + 1 and not table.pending
+        recommendations, live_at = service.get_materialized_recommendations("loja_fashion_001", 5, 0.3)
+        assert live_at > refreshed_at
+        assert "partner_ads_001" not in [r.partner_id for r in recommendations]
+
+        # As demais entradas, de gerações anteriores, são agendadas pelo refresh
+        assert service.refresh_materialized() == len(orchestrator.dna_service.stores_db) - 1
+        assert service.refresh_materialized() == 0
+
+        # Dentro do limite de staleness, a entrada de geração anterior continua servida
+        table.max_staleness = timedelta(seconds=MAX_STALENESS_SECONDS)
+        service.remove_partner("partner_crm_007")
+        assert service.get_materialized_recommendations("loja_fashion_001", 5, 0.3)[1] == live_at
+
+class TestUpperBoundTopK:
+    """Testa top-k com poda por limite superior (sem matriz materializada)"""
+
+    def test_pruned_top_k_matches_scalar_path(self):
+        orchestrator = OrionOrchestrator()
+        service = orchestrator.recommendation_service
+        service.score_matrix = None
+        create_sample_data(orchestrator)
+
+        stages = list(EcommerceStage)
+        for i in range(600):
+            orchestrator.add_partner_to_ecosystem({
+                "partner_id": f"bulk_partner_{i}",
+                "name": f"Bulk Partner {i}",
+                "category": stages[i % len(stages)].value,
+                "target_segments": [s.value for s in list(StoreSegment)[i % 3:i % 5]],
+                "target_sizes": [s.value for s in list(StoreSize)[i % 2:]],
+                "integration_complexity": 1 + (i * 7) % 10,
+                "roi_potential": 1 + (i * 3) % 10,
+                "commission_rate": 0.05 * (i % 6)
+            })
+
+        scored = []
+        score_rows = service.scoring_service.score_features_against_catalog
+
+        def counting_score_rows(features, catalog, rows=None, **kwargs):
+            scored.append(len(catalog) if rows is None else len(rows))
+            return score_rows(features, catalog, rows=rows, **kwargs)
+
+        service.scoring_service.score_features_against_catalog = counting_score_rows
+
+        for store_id in orchestrator.dna_service.stores_db:
+            for limit, min_score in [(10, 0.3), (1, 0.0), (5, 0.7)]:
+                scored.clear()
+                recommendations = service.get_recommendations_for_store(store_id, limit, min_score)
+                assert [(r.partner_id, r.final_score) for r in recommendations] == \
+                    scalar_recommendations(orchestrator, store_id, limit, min_score)
+                assert sum(scored) < len(service.partners_db)
+
+class TestAgentExecutor:
+    """Testa execução concorrente dos agentes"""
+
+    class SleepyAgent(BaseAgent):
+        def __init__(self, agent_id, seconds):
+            super().__init__(agent_id, agent_id)
+            self.seconds = seconds
+
+        def execute_action(self, context):
+            time.sleep(self.seconds)
+            return {"agent_id": self.agent_id}
+
+    def test_ordering_and_timeouts(self):
+        executor = AgentExecutor(max_workers=4, timeout=0.5)
+        tasks = [("results", f"a{i}", self.SleepyAgent(f"a{i}", seconds), {})
+                 for i, seconds in enumerate([0.2, 0.1, 0.0, 2.0])]
+
+        results = executor.run(tasks, ["results"])["results"]
+        assert list(results) == ["a0", "a1", "a2", "a3"]
+        assert results["a0"] == {"agent_id": "a0"}
+        assert "timed out" in results["a3"]["error"]
+        executor.shutdown()
+
+    def test_partner_agents_in_process_pool(self):
+        orchestrator = OrionOrchestrator()
+        create_sample_data(orchestrator)
+        agents = orchestrator.recommendation_service.agent_orchestrator
+        context = {"stores": list(orchestrator.dna_service.stores_db.values())}
+
+        agents.executor = AgentExecutor(max_workers=1)
+        sequential = agents.execute_full_analysis(context)["partner_results"]
+
+        agents.executor = AgentExecutor(max_workers=2, process_workers=2)
+        parallel = agents.execute_full_analysis(context)["partner_results"]
+        agents.executor.shutdown()
+
+        assert list(parallel) == list(sequential)
+        for partner_id, result in sequential.items():
+            assert parallel[partner_id]["evaluations"] == result["evaluations"]
+
+    def test_async_scheduler_and_cancellation(self):
+        executor = AgentExecutor(max_workers=4, timeout=0.5)
+        tasks = [("results", f"a{i}", self.SleepyAgent(f"a{i}", seconds), {})
+                 for i, seconds in enumerate([0.2, 0.0, 2.0])]
+
+        results = asyncio.run(executor.run_async(tasks, ["results"]))["results"]
+        assert list(results) == ["a0", "a1", "a2"]
+        assert results["a1"] == {"agent_id": "a1"}
+        assert "timed out" in results["a2"]["error"]
+
+        async def cancelled():
+            task = asyncio.ensure_future(executor.run_async(tasks, ["results"]))
+            await asyncio.sleep(0.05)
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                return True
+            return False
+
+        assert asyncio.run(cancelled())
+        executor.shutdown()
+
+        orchestrator = OrionOrchestrator()
+        create_sample_data(orchestrator)
+        sync_result = orchestrator.run_full_analysis("loja_fashion_001")
+        async_result = asyncio.run(orchestrator.run_full_analysis_async("loja_fashion_001"))
+        assert async_result["current_recommendations"] == sync_result["current_recommendations"]
+        partner_results = sync_result["agent_analysis"]["partner_results"]
+        assert len(partner_results) == len(orchestrator.repository.partners)
+        assert async_result["agent_analysis"]["partner_results"] == partner_results
+
+    @pytest.mark.parametrize("scope", ["store", "ecosystem"])
+    def test_async_analysis_never_waits_for_the_lock_on_the_loop(self, scope):
+        orchestrator = OrionOrchestrator()
+        create_sample_data(orchestrator)
+        service = orchestrator.recommendation_service
+        held = 0.5
+
+        # Logo após o contexto de análise, outra thread segura o lock (ex.: uma escrita longa)
+        acquired = threading.Event()
+
+        def hold_lock():
+            with orchestrator.repository.lock:
+                acquired.set()
+                time.sleep(held)
+
+        holder = threading.Thread(target=hold_lock)
+        analysis_context = service.analysis_context
+
+        def analysis_then_lock(store_id):
+            analysis = analysis_context(store_id)
+            holder.start()
+            acquired.wait()
+            return analysis
+
+        service.analysis_context = analysis_then_lock
+
+        async def run():
+            analysis = asyncio.ensure_future(orchestrator.run_full_analysis_async("loja_fashion_001", scope))
+            longest_gap, last = 0.0, time.perf_counter()
+            while not analysis.done():
+                await asyncio.sleep(0.01)
+                now = time.perf_counter()
+                longest_gap, last = max(longest_gap, now - last), now
+            return analysis.result(), longest_gap
+
+        result, longest_gap = asyncio.run(run())
+        holder.join()
+        assert "error" not in result
+        assert longest_gap < held / 2  # o loop continuou atendendo enquanto o lock estava ocupado
+
+    def test_concurrent_runs_share_pools_and_snapshot_partners(self):
+        executor = AgentExecutor(max_workers=4)
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            pools = list(pool.map(lambda _: executor._thread_pool(), range(32)))
+        assert all(p is pools[0] for p in pools)
+        executor.shutdown()
+
+        orchestrator = OrionOrchestrator()
+        create_sample_data(orchestrator)
+        stages = list(EcommerceStage)
+
+        def add_partners():
+            for i in range(30):
+                orchestrator.add_partner_to_ecosystem({
+                    "partner_id": f"concurrent_partner_{i}",
+                    "name": f"Concurrent Partner {i}",
+                    "category": stages[i % len(stages)].value,
+                    "target_segments": [StoreSegment.FASHION.value],
+                    "target_sizes": [StoreSize.PEQUENA.value],
+                    "integration_complexity": 1 + i % 10,
+                    "commission_rate": 0.1
+                })
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            writer = pool.submit(add_partners)
+            analyses = [pool.submit(orchestrator.run_full_analysis, "loja_fashion_001", scope)
+                        for scope in ("store", "ecosystem") * 3]
+            writer.result()
+            for analysis in analyses:
+                partner_results = analysis.result()["agent_analysis"]["partner_results"]
+                assert all("error" not in r for r in partner_results.values())
+
+    def test_pipeline_shares_intermediates(self):
+        calls = []
+
+        def count(name, value):
+            def compute(context, *inputs):
+                calls.append(name)
+                return value(*inputs)
+            return compute
+
+        class ConsumerAgent(BaseAgent):
+            inputs = ("doubled",)
+
+            def execute_action(self, context):
+                return {"agent_id": self.agent_id, "doubled": context["doubled"]}
+
+        intermediates = {
+            "base": Intermediate("base", count("base", lambda: 21)),
+            "doubled": Intermediate("doubled", count("doubled", lambda base: base * 2), ("base",)),
+            "broken": Intermediate("broken", count("broken", lambda: 1 / 0))
+        }
+        tasks = [("results", f"c{i}", ConsumerAgent(f"c{i}", f"c{i}"), {}) for i in range(3)]
+        tasks.append(("results", "free", self.SleepyAgent("free", 0.0), {}))
+
+        for executor in (AgentExecutor(max_workers=1), AgentExecutor(max_workers=4)):
+            calls.clear()
+            results = executor.run(tasks, ["results"], intermediates, {})["results"]
+            assert list(results) == ["c0", "c1", "c2", "free"]
+            assert all(results[f"c{i}"]["doubled"] == 42 for i in range(3))
+            assert sorted(calls) == ["base", "doubled"]  # Uma vez cada; "broken" não é necessário
+            executor.shutdown()
+
+        calls.clear()
+        results = asyncio.run(AgentExecutor().run_async(tasks, ["results"], intermediates, {}))["results"]
+        assert results["c2"]["doubled"] == 42 and sorted(calls) == ["base", "doubled"]
+
+        ConsumerAgent.inputs = ("broken",)
+        results = AgentExecutor(max_workers=2).run(tasks, ["results"], intermediates, {})["results"]
+        assert "Intermediate broken failed" in results["c0"]["error"]
+        assert results["free"] == {"agent_id": "free"}
+
+        cyclic = {"a": Intermediate("a", lambda context, b: b, ("b",)),
+                  "b": Intermediate("b", lambda context, a: a, ("a",))}
+        ConsumerAgent.inputs = ("a",)
+        with pytest.raises(ValueError):
+            AgentExecutor().run(tasks, ["results"], cyclic, {})
+
+    def test_partner_scores_match_scalar_evaluation(self):
+        orchestrator = OrionOrchestrator()
+        create_sample_data(orchestrator)
+        agents = orchestrator.recommendation_service.agent_orchestrator
+        stores = list(orchestrator.dna_service.stores_db.values())
+
+        pipeline = agents.execute_full_analysis({"stores": stores})
+        for partner_id, agent in agents.partner_agents.items():
+            standalone = agent.execute_action({"stores": stores})  # Sem intermediários
+            assert pipeline["partner_results"][partner_id]["evaluations"] == standalone["evaluations"]
+
+            scalar = [agents.scoring_service.calculate_compatibility_score(store, agent.partner).total_score
+                      for store in stores]
+            assert [e["compatibility_score"] for e in standalone["evaluations"]] == scalar
+
+        # partner_scores calculado uma única vez para todos os agentes de parceiros
+        calls = []
+        partner_scores = agents._partner_scores
+        agents._partner_scores = lambda context: calls.append(1) or partner_scores(context)
+        for agent in agents.partner_agents.values():
+            agent.score_stores = None  # Os agentes devem consumir o intermediário, não pontuar sozinhos
+        for scope in ("store", "ecosystem"):
+            calls.clear()
+            result = orchestrator.run_full_analysis("loja_fashion_001", scope=scope)
+            partner_results = result["agent_analysis"]["partner_results"]
+            assert len(partner_results) == len(agents.partner_agents) > 1
+            assert all("error" not in r for r in partner_results.values())
+            assert len(calls) == 1
+
+        market = pipeline["market_intelligence"]
+        assert market["market_overview"]["total_stores"] == len(stores)
+        assert market["segment_distribution"] == agents.market_agent.segment_distribution({})
+
+    def test_partner_analysis_pages(self):
+        orchestrator = OrionOrchestrator()
+        create_sample_data(orchestrator)
+        service = orchestrator.recommendation_service
+        partner_id = next(iter(service.partners_db))
+
+        full = service.get_partner_performance_analysis(partner_id)
+        levels = [e["fit_level"] for e in full["evaluations"]]
+        assert full["summary"]["high_fit_stores"] == levels.count("high")
+        assert full["summary"]["medium_fit_stores"] == levels.count("medium")
+        assert full["summary"]["low_fit_stores"] == levels.count("low")
+
+        page = service.get_partner_performance_analysis(partner_id, offset=1, limit=2)
+        assert page["evaluations"] == full["evaluations"][1:3]
+        assert page["summary"] == full["summary"]
+        assert page["pagination"] == {"offset": 1, "limit": 2, "total": len(full["evaluations"])}
+        assert service.get_partner_performance_analysis(partner_id, offset=10, limit=2)["evaluations"] == []
+
 class TestOrchestrator:
     """Testa orquestrador principal"""
 
@@ -188,6 +1152,59 @@ class TestOrchestrator:
         assert "identified_gaps" in result
         assert "initial_recommendations" in result
 
+    def test_full_analysis_scores_once(self):
+        orchestrator = OrionOrchestrator()
+        create_sample_data(orchestrator)
+        service = orchestrator.recommendation_service
+
+        # Todos os pontos de entrada do scoring vetorizado e escalar
+        calls = {}
+        scoring = service.scoring_service
+        for name in ["compile_store_features", "score_store_against_catalog", "score_features_against_catalog",
+                     "score_catalog_row_against_stores", "score_catalog_rows_against_stores",
+                     "calculate_compatibility_score", "calculate_profitability_score"]:
+            method = getattr(scoring, name)
+            setattr(scoring, name, lambda *args, _name=name, _method=method, **kwargs:
+                    calls.update({_name: calls.get(_name, 0) + 1}) or _method(*args, **kwargs))
+
+        analysis = orchestrator.run_full_analysis("loja_casa_003")
+        assert calls == {"compile_store_features": 1, "score_features_against_catalog": 1}
+
+        # Avaliações dos agentes de parceiros derivadas dos scores da análise
+        store_dna = orchestrator.dna_service.get_store_dna("loja_casa_003")
+        for partner_id, result in analysis["agent_analysis"]["partner_results"].items():
+            scalar = scoring.calculate_compatibility_score(store_dna, service.partners_db[partner_id])
+            assert [e["compatibility_score"] for e in result["evaluations"]] == [scalar.total_score]
+
+        # Todas as seções derivam da mesma maturidade/gaps
+        master = analysis["agent_analysis"]["master_agent_results"]["loja_casa_003"]
+        assert list(analysis["priority_recommendations_by_area"]) == \
+            [gap["stage"] for gap in master["identified_gaps"][:3]]
+
+        expected = service.get_recommendations_for_store("loja_casa_003", limit=8)
+        assert [(r["partner_id"], r["final_score"]) for r in analysis["current_recommendations"]] == \
+            [(r.partner_id, r.final_score) for r in expected]
+
+    def test_store_scoped_analysis(self):
+        orchestrator = OrionOrchestrator()
+        create_sample_data(orchestrator)
+        for stage in EcommerceStage:
+            orchestrator.agent_orchestrator.register_specialist_agent(stage)
+        for store_dna in orchestrator.dna_service.stores_db.values():
+            orchestrator.agent_orchestrator.register_master_agent(store_dna.store_id)
+
+        result = orchestrator.run_full_analysis("loja_saude_004")
+        agents = result["agent_analysis"]
+        assert list(agents["master_agent_results"]) == ["loja_saude_004"]
+        assert list(agents["specialist_results"]) == list(result["priority_recommendations_by_area"])
+        assert len(agents["partner_results"]) == len(orchestrator.repository.partners)
+        for partner_result in agents["partner_results"].values():
+            assert [e["store_id"] for e in partner_result["evaluations"]] == ["loja_saude_004"]
+
+        full = orchestrator.run_full_analysis("loja_saude_004", scope="ecosystem")["agent_analysis"]
+        assert len(full["master_agent_results"]) == len(orchestrator.dna_service.stores_db)
+        assert len(full["specialist_results"]) == len(EcommerceStage)
+
     def test_ecosystem_dashboard(self):
         orchestrator = OrionOrchestrator()
 
@@ -205,5 +1222,111 @@ class TestOrchestrator:
         assert dashboard["ecosystem_overview"]["total_stores"] > 0
         assert dashboard["ecosystem_overview"]["total_partners"] > 0
 
+    def test_bulk_onboarding(self):
+        orchestrator = OrionOrchestrator()
+        create_sample_data(orchestrator)
+
+        records = [
+            {"store_id": f"bulk_store_{i}", "name": f"Bulk {i}", "segment": "fashion",
+             "size": ["pequena", "media"][i % 2], "pain_points": ["alto_cac", "seo"][:i % 3]}
+            for i in range(12)
+        ]
+        records[3] = {"store_id": "bad_segment", "name": "Bad", "segment": "unknown", "size": "pequena"}
+        records[8] = {"name": "Missing id", "segment": "fashion", "size": "pequena"}
+
+        statuses = list(orchestrator.onboard_stores(records, chunk_size=5))
+
+        assert [status["line"] for status in statuses[:-1]] == list(range(12))
+        assert [status["status"] for status in statuses[:-1]].count("error") == 2
+        assert statuses[-1] == {"summary": {"received": 12, "created": 10, "failed": 2}}
+        assert "bad_segment" not in orchestrator.repository.stores
+        assert "bulk_store_11" in orchestrator.agent_orchestrator.master_agents
+
+        # Status "created" só depois da gravação: se ela falha, o bloco recebe o erro
+        def failing_save(stores):
+            raise RuntimeError("disk full")
+        save_store_dnas = orchestrator.dna_service.save_store_dnas
+        orchestrator.dna_service.save_store_dnas = failing_save
+        summary = {"received": 0, "created": 0, "failed": 0}
+        failed = orchestrator.onboard_store_chunk(records[:2], summary)
+        orchestrator.dna_service.save_store_dnas = save_store_dnas
+        assert [(status["status"], status["error"]) for status in failed] == [("error", "disk full")] * 2
+        assert summary == {"received": 2, "created": 0, "failed": 2}
+
+        # Matriz recalculada em lote ao final, idêntica ao caminho escalar
+        for store_id in orchestrator.repository.stores:
+            recommendations = orchestrator.recommendation_service.get_recommendations_for_store(store_id)
+            assert [(r.partner_id, r.final_score) for r in recommendations] == \
+                scalar_recommendations(orchestrator, store_id)
+
+    def test_bulk_partner_import(self):
+        orchestrator = OrionOrchestrator()
+        create_sample_data(orchestrator)
+        stages = list(EcommerceStage)
+
+        partners_data = [
+            {
+                "partner_id": f"bulk_partner_{i}",
+                "name": f"Bulk Partner {i}",
+                "category": stages[i % len(stages)].value,
+                "target_segments": [s.value for s in list(StoreSegment)[i % 3:i % 5]],
+                "target_sizes": [s.value for s in list(StoreSize)[i % 2:]],
+                "integration_complexity": 1 + (i * 7) % 10,
+                "commission_rate": 0.05 * (i % 6)
+            }
+            for i in range(20)
+        ]
+        partners_data[4]["category"] = "unknown"
+
+        result = orchestrator.add_partners_to_ecosystem(partners_data)
+
+        assert [failure["line"] for failure in result["failed"]] == [4]
+        assert len(result["added"]) == 19
+        for added in result["added"]:
+            partner = orchestrator.recommendation_service.partners_db[added["partner_id"]]
+            assert added["market_impact"] == orchestrator._analyze_partner_market_impact(partner)
+
+        for store_id in orchestrator.repository.stores:
+            recommendations = orchestrator.recommendation_service.get_recommendations_for_store(store_id)
+            assert [(r.partner_id, r.final_score) for r in recommendations] == \
+                scalar_recommendations(orchestrator, store_id)
+
+    def test_concurrent_writes_are_serialized(self):
+        orchestrator = OrionOrchestrator()
+        create_sample_data(orchestrator)
+        stages = list(EcommerceStage)
+
+        def import_partners(worker):
+            orchestrator.add_partners_to_ecosystem([
+                {
+                    "partner_id": f"thread_partner_{worker}_{i}",
+                    "name": f"Thread Partner {worker}-{i}",
+                    "category": stages[(worker + i) % len(stages)].value,
+                    "target_segments": [StoreSegment.FASHION.value],
+                    "target_sizes": [StoreSize.PEQUENA.value],
+                    "integration_complexity": 1 + i % 10,
+                    "commission_rate": 0.1
+                }
+                for i in range(25)
+            ])
+
+        def read_recommendations(_):
+            for store_id in list(orchestrator.repository.stores):
+                orchestrator.recommendation_service.get_recommendations_for_store(store_id)
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            futures = [pool.submit(import_partners, worker) for worker in range(4)]
+            futures += [pool.submit(read_recommendations, worker) for worker in range(4)]
+            for future in futures:
+                future.result()
+
+        repository = orchestrator.repository
+        assert repository.check_market_aggregates()["consistent"]
+        assert sum(pid.startswith("thread_partner_") for pid in repository.partners) == 100
+        for store_id in repository.stores:
+            recommendations = orchestrator.recommendation_service.get_recommendations_for_store(store_id)
+            assert [(r.partner_id, r.final_score) for r in recommendations] == \
+                scalar_recommendations(orchestrator, store_id)
+
 if __name__ == "__main__":
     pytest.main([__file__])